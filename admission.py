@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Admission Control
+Caps concurrent upstream transcriptions per worker process and across every
+worker sharing a directory, with a short bounded wait queue in front of each cap
+Requests that would wait longer than max_wait (estimated from the measured
+service time) are refused at once with a Retry-After, so admitted requests keep
+a flat latency instead of everyone queueing into the gunicorn timeout together
+Across workers, slots are flock'ed files: a crashed worker's slots free themselves
+"""
+
+import fcntl
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from upstream import CircuitOpenError
+
+
+class AdmissionRejected(CircuitOpenError):
+    """Raised when a call is shed instead of queued; retry_after is in seconds"""
+
+    def __init__(self, name, retry_after, reason):
+        super().__init__(name, retry_after)
+        self.args = (f'{name} is overloaded ({reason})',)
+        self.reason = reason
+
+
+class _SlotFiles:
+    """
+    A fixed set of lock files; each one held is one slot taken
+    A holder can stamp its slot (e.g. with its arrival time) for the others to read
+    """
+
+    def __init__(self, directory, prefix, count):
+        self.paths = [os.path.join(directory, f'{prefix}-{index}.lock') for index in range(count)]
+        self._files = {}
+        self._stamps = {}  # index -> stamp of slots held by this process
+        self._lock = threading.Lock()
+
+    def _file(self, index):
+        """The slot's lock file, opened once per process (call with the lock held)"""
+        lock_file = self._files.get(index)
+        if lock_file is None:
+            lock_file = self._files[index] = open(self.paths[index], 'a+')
+        return lock_file
+
+    def try_acquire(self, stamp=0.0):
+        """Take the lowest free slot without blocking; returns its index or None"""
+        for index in range(len(self.paths)):
+            with self._lock:
+                if index in self._stamps:
+                    continue  # flock can't tell threads of one process apart
+                self._stamps[index] = stamp
+                lock_file = self._file(index)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                with self._lock:
+                    del self._stamps[index]
+                continue
+            if stamp:
+                os.ftruncate(lock_file.fileno(), 0)
+                os.pwrite(lock_file.fileno(), repr(stamp).encode(), 0)
+            return index
+        return None
+
+    def holders(self):
+        """Stamps of every taken slot, in this process or any other"""
+        stamps = []
+        for index in range(len(self.paths)):
+            with self._lock:
+                if index in self._stamps:
+                    stamps.append(self._stamps[index])
+                    continue
+                lock_file = self._file(index)
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    continue  # Free
+                except BlockingIOError:
+                    pass
+            try:
+                stamps.append(float(os.pread(lock_file.fileno(), 32, 0) or 0))
+            except ValueError:
+                stamps.append(0.0)  # Stamp being rewritten
+        return stamps
+
+    def release(self, index):
+        with self._lock:
+            fcntl.flock(self._files[index], fcntl.LOCK_UN)
+            del self._stamps[index]
+
+
+class AdmissionController:
+    """
+    Bounded concurrency for one upstream, in this process and (with shared_dir)
+    across processes
+    acquire() waits at most max_wait for a slot, or raises AdmissionRejected when
+    the queue is full or the expected wait is already too long; release() frees it
+    Service time is an exponentially weighted moving average of admitted calls
+    """
+
+    def __init__(self, name, max_concurrent=32, max_queue=32, max_wait=10.0, shared_dir=None,
+                 cluster_max_concurrent=0, cluster_max_queue=0, initial_service_time=2.0,
+                 smoothing=0.2, poll_interval=0.01, on_decision=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.smoothing = smoothing
+        self.poll_interval = poll_interval
+        self.on_decision = on_decision  # on_decision(name, 'admitted' or 'rejected'), e.g. a metrics hook
+        self.service_time = initial_service_time
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+        self._slots = None
+        self._queue_slots = None
+        if shared_dir and cluster_max_concurrent:
+            os.makedirs(shared_dir, exist_ok=True)
+            self._slots = _SlotFiles(shared_dir, 'slot', cluster_max_concurrent)
+            self._queue_slots = _SlotFiles(shared_dir, 'queue', cluster_max_queue)
+        self.cluster_max_concurrent = cluster_max_concurrent if self._slots else 0
+
+    def _estimated_wait(self, ahead, capacity):
+        """Seconds until a slot frees up with ahead callers queued in front of us"""
+        return self.service_time * (ahead + 1) / max(1, capacity)
+
+    def _reject(self, reason, estimate):
+        """Count and raise a refusal (call with the condition held)"""
+        self.rejected += 1
+        if self.on_decision:
+            self.on_decision(self.name, 'rejected')
+        raise AdmissionRejected(self.name, max(1, math.ceil(estimate)), reason)
+
+    def acquire(self, max_wait=None):
+        """
+        Wait for a slot in this process, then one shared with the other workers
+        Returns: a ticket for release()
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+
+        with self._condition:
+            if self.active >= self.max_concurrent:
+                estimate = self._estimated_wait(self.waiting, self.max_concurrent)
+                if self.waiting >= self.max_queue:
+                    self._reject('queue full', estimate)
+                if estimate > max_wait:
+                    self._reject('expected wait too long', estimate)
+
+                self.waiting += 1
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject('wait timed out', estimate)
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+
+        try:
+            slot = self._acquire_shared(deadline) if self._slots else None
+        except AdmissionRejected:
+            self._release_local()
+            raise
+
+        with self._condition:
+            self.admitted += 1
+        if self.on_decision:
+            self.on_decision(self.name, 'admitted')
+        return slot, time.monotonic()
+
+    def _acquire_shared(self, deadline):
+        """Take a cluster slot, queueing on a shared queue slot while all are busy"""
+        arrived = time.time()
+        ahead = len(self._queue_slots.holders())
+        if not ahead:
+            # Nobody is waiting, so a free slot is ours; otherwise queue behind them
+            slot = self._slots.try_acquire()
+            if slot is not None:
+                return slot
+
+        # A freed slot takes up to a poll interval to change hands; don't mistake that for a full queue
+        handoff = time.monotonic() + 3 * self.poll_interval
+        position = self._queue_slots.try_acquire(stamp=arrived)
+        while position is None and time.monotonic() < handoff:
+            time.sleep(self.poll_interval)
+            position = self._queue_slots.try_acquire(stamp=arrived)
+        with self._condition:
+            if position is None:
+                self._reject('cluster queue full', self._estimated_wait(
+                    len(self._queue_slots.paths), self.cluster_max_concurrent
+                ))
+            estimate = self._estimated_wait(ahead, self.cluster_max_concurrent)
+            if estimate > deadline - time.monotonic():
+                self._queue_slots.release(position)
+                self._reject('expected cluster wait too long', estimate)
+
+        try:
+            while True:
+                # First come, first served: only try while fewer waiters arrived earlier than slots are free
+                older = sum(1 for stamp in self._queue_slots.holders() if stamp < arrived)
+                if older < self.cluster_max_concurrent - len(self._slots.holders()):
+                    slot = self._slots.try_acquire()
+                    if slot is not None:
+                        return slot
+                if time.monotonic() >= deadline:
+                    with self._condition:
+                        self._reject('cluster wait timed out', estimate)
+                time.sleep(self.poll_interval)
+        finally:
+            self._queue_slots.release(position)
+
+    def _release_local(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def release(self, ticket):
+        """Free the slots taken by acquire() and feed the call's duration into the estimate"""
+        slot, started = ticket
+        if slot is not None:
+            self._slots.release(slot)
+        with self._condition:
+            elapsed = time.monotonic() - started
+            self.service_time += self.smoothing * (elapsed - self.service_time)
+        self._release_local()
+
+    @contextmanager
+    def admit(self, max_wait=None):
+        """Hold a slot for the duration of the block"""
+        ticket = self.acquire(max_wait)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Return slot usage and counters for this process"""
+        with self._condition:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'cluster_max_concurrent': self.cluster_max_concurrent,
+                'service_time': round(self.service_time, 3),
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
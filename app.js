@@ -104,7 +104,37 @@ function formatFileSize(bytes) {
     return Math.round(bytes / Math.pow(k, i) * 100) / 100 + ' ' + sizes[i];
 }
 
-// Translate audio
+// Display names for detected and target language codes
+const languageNames = {
+    'en': 'English',
+    'yo': 'Yoruba',
+    'ig': 'Igbo',
+    'ha': 'Hausa',
+    'pidgin': 'Nigerian Pidgin',
+    'fr': 'French',
+    'ar': 'Arabic',
+    'es': 'Spanish',
+    'pt': 'Portuguese',
+    'de': 'German',
+    'sw': 'Swahili'
+};
+
+// Progress messages for streamed pipeline stages
+const stageMessages = {
+    'received': 'Voice note received...',
+    'trimmed': 'Trimming silence...',
+    'normalized': 'Preparing audio...',
+    'transcribing': 'Transcribing with Whisper...'
+};
+
+// "Translating to English and French..." for the targets whose translation has started
+function translatingMessage(targets) {
+    const names = targets.map(code => languageNames[code] || code);
+    const list = names.length > 1 ? names.slice(0, -1).join(', ') + ' and ' + names[names.length - 1] : names[0];
+    return `Translating to ${list}...`;
+}
+
+// Translate audio (streams progress and partial transcript via Server-Sent Events)
 async function translateAudio() {
     if (!selectedFile) {
         showToast('Please select an audio file first', 'error');
@@ -112,6 +142,7 @@ async function translateAudio() {
     }
     
     // Show processing status
+    document.getElementById('statusText').textContent = 'Uploading your voice note...';
     document.getElementById('processingStatus').classList.remove('hidden');
     document.getElementById('resultsSection').classList.add('hidden');
     document.getElementById('translateBtn').disabled = true;
@@ -122,14 +153,40 @@ async function translateAudio() {
     
     try {
         // Call API
-        const response = await fetch(`${API_URL}/api/translate`, {
+        const response = await fetch(`${API_URL}/api/translate/stream`, {
             method: 'POST',
             body: formData
         });
         
-        const data = await response.json();
+        // Validation errors come back as plain JSON
+        if (!response.ok || !response.body) {
+            const error = await response.json();
+            throw new Error(error.error || 'Translation failed');
+        }
+        
+        let data = null;
+        const translatingTo = [];
         
-        if (data.success) {
+        await readEventStream(response, (event, payload) => {
+            if (event === 'stage' && payload.stage === 'translating') {
+                // One event per target language, all running at once
+                translatingTo.push(payload.target_language || 'en');
+                document.getElementById('statusText').textContent = translatingMessage(translatingTo);
+            } else if (event === 'stage') {
+                document.getElementById('statusText').textContent =
+                    stageMessages[payload.stage] || 'Processing your voice note...';
+            } else if (event === 'segment') {
+                showPartialTranscript(payload.text);
+            } else if (event === 'transcript') {
+                showTranscript(payload);
+            } else if (event === 'result') {
+                data = payload;
+            } else if (event === 'error') {
+                throw new Error(payload.error || 'Translation failed');
+            }
+        });
+        
+        if (data && data.success) {
             // Store translation
             currentTranslation = data;
             
@@ -142,7 +199,7 @@ async function translateAudio() {
             
             showToast('Translation complete!', 'success');
         } else {
-            throw new Error(data.error || 'Translation failed');
+            throw new Error('Translation failed');
         }
     } catch (error) {
         console.error('Translation error:', error);
@@ -152,6 +209,60 @@ async function translateAudio() {
     }
 }
 
+// Read a Server-Sent Events response, calling onEvent(event, data) per message
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Messages are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Append a transcript segment as soon as Whisper returns it
+function showPartialTranscript(text) {
+    const resultsSection = document.getElementById('resultsSection');
+    const originalText = document.getElementById('originalText');
+    
+    if (resultsSection.classList.contains('hidden')) {
+        originalText.textContent = '';
+        document.getElementById('translatedText').textContent = 'Translating...';
+        document.getElementById('translationNote').classList.add('hidden');
+        resultsSection.classList.remove('hidden');
+    }
+    
+    originalText.textContent = (originalText.textContent + ' ' + text).trim();
+}
+
+// Show the full transcript while the translation is still running
+function showTranscript(data) {
+    document.getElementById('originalText').textContent = data.original_text;
+    document.getElementById('langName').textContent = data.detected_language_name || data.detected_language;
+    document.getElementById('translatedText').textContent = 'Translating...';
+    document.getElementById('translationNote').classList.add('hidden');
+    document.getElementById('resultsSection').classList.remove('hidden');
+}
+
 // Display results
 function displayResults(data) {
     // Original text
@@ -161,14 +272,6 @@ function displayResults(data) {
     document.getElementById('translatedText').textContent = data.translated_text;
     
     // Detected language
-    const languageNames = {
-        'en': 'English',
-        'yo': 'Yoruba',
-        'ig': 'Igbo',
-        'ha': 'Hausa',
-        'pidgin': 'Nigerian Pidgin'
-    };
-    
     const langName = languageNames[data.detected_language] || data.detected_language;
     document.getElementById('langName').textContent = langName;
     
@@ -207,7 +310,7 @@ Language: ${currentTranslation.detected_language}
 ${'-'.repeat(60)}
 ${currentTranslation.original_text}
 
-ENGLISH TRANSLATION
+${(languageNames[currentTranslation.target_language] || 'English').toUpperCase()} TRANSLATION
 ${'-'.repeat(60)}
 ${currentTranslation.translated_text}
 
@@ -5,18 +5,47 @@ Flask backend for web application
 Upgraded to use OpenAI Whisper API for superior transcription accuracy
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, g, request, jsonify
 from flask_cors import CORS
-from openai import OpenAI
-from googletrans import Translator
+import hmac
+import io
+import json
 import os
+import queue
 import tempfile
+import threading
+import time
+import contextvars
 from werkzeug.utils import secure_filename
-import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed, wait
 from pydub import AudioSegment
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
+from transcription_cache import TranscriptionCache, hash_audio, make_cache_key
+from translation_memory import TranslationMemory
+from jobs import JobRunner, JobStore, JOB_QUEUED
+from history import HistoryStore
+from long_audio import segment_dicts, transcribe_long_audio
+from audio_normalizer import decode_speech, normalize_audio
+from audio_fingerprint import FingerprintIndex, fingerprint_audio
+from voice_activity import restore_timestamps, trim_silence
+from single_flight import SingleFlight
+from admission import AdmissionController, AdmissionRejected
+from whatsapp import (
+    GRAPH_API_URL, RECEIVED_BUSY, GraphClient, MessageLog, WhatsAppBot, audio_messages, verify_signature
+)
+from language_id import canonical_language, resolve_language
+from languages import LANGUAGE_MAP, LANGUAGE_NAMES, TARGET_LANGUAGES
+from transcription_engines import create_engine
+import metrics
+from metrics import stage_timer
+from tracing import Tracer, annotate, configure_logging, incoming_trace, log
+from upstream import (
+    CircuitOpenError, GoogleTranslateClient, LibreTranslateClient, ResilientTranslator, Upstream,
+    build_async_openai_client, build_openai_client
+)
 
 # Load environment variables
 load_dotenv()
@@ -35,11 +64,149 @@ CORS(app)  # Enable CORS for all routes
 UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'ogg', 'flac', 'webm', 'opus'}
 MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB (Whisper API supports up to 25MB)
+UPLOAD_SPOOL_MAX_SIZE = int(os.getenv('UPLOAD_SPOOL_MAX_SIZE', str(8 * 1024 * 1024)))  # Larger uploads spill to disk
+
+# Long audio: larger uploads are split at silences and transcribed in parallel chunks
+LONG_AUDIO_MAX_FILE_SIZE = int(os.getenv('LONG_AUDIO_MAX_FILE_SIZE', str(200 * 1024 * 1024)))
+LONG_AUDIO_CHUNK_SECONDS = int(os.getenv('LONG_AUDIO_CHUNK_SECONDS', '600'))
+LONG_AUDIO_CONCURRENCY = int(os.getenv('LONG_AUDIO_CONCURRENCY', '4'))
+
+# Re-encode bulky uploads as mono 16 kHz speech audio before calling Whisper
+AUDIO_NORMALIZE = os.getenv('AUDIO_NORMALIZE', 'true').lower() in ('1', 'true', 'yes')
+AUDIO_NORMALIZE_FORMAT = os.getenv('AUDIO_NORMALIZE_FORMAT', 'opus')  # opus or mp3
+AUDIO_NORMALIZE_MIN_BITRATE = int(os.getenv('AUDIO_NORMALIZE_MIN_BITRATE', '64000'))  # bits/second
+AUDIO_NORMALIZE_MIN_BYTES = int(os.getenv('AUDIO_NORMALIZE_MIN_BYTES', str(256 * 1024)))
+# Uploads are decoded once, as mono 16 kHz; longer notes are decoded only this far (~57 MB of samples)
+AUDIO_DECODE_MAX_SECONDS = float(os.getenv('AUDIO_DECODE_MAX_SECONDS', '1800'))
+
+# Voice activity detection - cut leading/trailing silence and long pauses before upload
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+VAD_MAX_GAP_MS = int(os.getenv('VAD_MAX_GAP_MS', '1000'))  # Longer pauses are shortened to this
+VAD_MIN_SAVED_SECONDS = float(os.getenv('VAD_MIN_SAVED_SECONDS', '1'))  # Re-encode only if this much goes
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_FILE_SIZE, LONG_AUDIO_MAX_FILE_SIZE)
+
+class SpooledUploadRequest(Request):
+    """Keep uploads in memory up to UPLOAD_SPOOL_MAX_SIZE, then spill to an anonymous temp file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE, dir=UPLOAD_FOLDER)
+
+app.request_class = SpooledUploadRequest
+
+# Transcription cache (set TRANSCRIPTION_CACHE_DIR to share results across workers)
+TRANSCRIPTION_CACHE_SIZE = int(os.getenv('TRANSCRIPTION_CACHE_SIZE', '512'))
+TRANSCRIPTION_CACHE_TTL = int(os.getenv('TRANSCRIPTION_CACHE_TTL', '86400'))  # 24 hours
+TRANSCRIPTION_CACHE_DIR = os.getenv('TRANSCRIPTION_CACHE_DIR')
+
+# Near-duplicate detection - re-encoded or trimmed copies reuse the cached transcript
+FINGERPRINT_ENABLED = os.getenv('FINGERPRINT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+FINGERPRINT_INDEX_PATH = os.getenv('FINGERPRINT_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'voice_translator_fingerprints.sqlite3'))
+FINGERPRINT_MAX_SECONDS = float(os.getenv('FINGERPRINT_MAX_SECONDS', '120'))  # Audio fingerprinted per note
+FINGERPRINT_MIN_MATCHES = int(os.getenv('FINGERPRINT_MIN_MATCHES', '20'))  # Time-aligned landmarks for a match
+FINGERPRINT_MIN_SCORE = float(os.getenv('FINGERPRINT_MIN_SCORE', '0.2'))  # Share of landmarks that must line up
+
+# Silence trimming needs the whole note; without it the decode only feeds the fingerprint
+DECODE_SECONDS = AUDIO_DECODE_MAX_SECONDS if VAD_ENABLED else min(AUDIO_DECODE_MAX_SECONDS, FINGERPRINT_MAX_SECONDS)
+
+# Sentence-level translation memory (set TRANSLATION_MEMORY_PATH to persist it)
+TRANSLATION_MEMORY_SIZE = int(os.getenv('TRANSLATION_MEMORY_SIZE', '5000'))
+TRANSLATION_MEMORY_PATH = os.getenv('TRANSLATION_MEMORY_PATH')
+TRANSLATE_BATCH_CHARS = int(os.getenv('TRANSLATE_BATCH_CHARS', '4500'))  # Largest single translate request
+TRANSLATE_CONCURRENCY = int(os.getenv('TRANSLATE_CONCURRENCY', '4'))  # Batches translated at once
+
+# Several target languages per request: one transcription, translated into each target concurrently
+TRANSLATE_MAX_TARGETS = int(os.getenv('TRANSLATE_MAX_TARGETS', '5'))  # Target languages per request
+TRANSLATE_TARGET_CONCURRENCY = int(os.getenv('TRANSLATE_TARGET_CONCURRENCY', '8'))  # Per worker process
+
+# Background jobs (/api/jobs); the job store must be on a path all workers share
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(tempfile.gettempdir(), 'voice_translator_jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '16'))
+JOB_TTL = int(os.getenv('JOB_TTL', '86400'))  # Keep finished jobs for 24 hours
+
+# Translation history (SQLite, shared by all workers; written off the request path)
+HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+HISTORY_PATH = os.getenv('HISTORY_PATH', os.path.join(tempfile.gettempdir(), 'voice_translator_history.sqlite3'))
+HISTORY_QUEUE_SIZE = int(os.getenv('HISTORY_QUEUE_SIZE', '1000'))  # Pending writes before entries are dropped
+HISTORY_RETENTION_DAYS = float(os.getenv('HISTORY_RETENTION_DAYS', '30'))  # Older entries are pruned (0 = keep forever)
+HISTORY_API_KEY = os.getenv('HISTORY_API_KEY')  # Required to read /api/history; unset = history is write-only
+
+# Speech-to-text backend: openai (Whisper API), local (faster-whisper on CPU) or fake (tests)
+TRANSCRIPTION_ENGINE = os.getenv('TRANSCRIPTION_ENGINE', 'openai').lower()
+
+# Upstream clients: keep-alive pools, per-call timeouts, retries and circuit breakers
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # e.g. a local fake Whisper server
+WHISPER_TIMEOUT = float(os.getenv('WHISPER_TIMEOUT', '60'))  # seconds per call
+TRANSLATE_BASE_URL = os.getenv('TRANSLATE_BASE_URL')  # LibreTranslate-compatible API instead of Google
+TRANSLATE_API_KEY = os.getenv('TRANSLATE_API_KEY')
+TRANSLATE_TIMEOUT = float(os.getenv('TRANSLATE_TIMEOUT', '10'))  # seconds per call
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', '20'))
+ASYNC_POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', '100'))  # Connections per upstream in ASGI mode
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '3'))
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.5'))
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '8'))
+# Whole-call budgets, retries included; with ADMISSION_MAX_WAIT they must fit in GUNICORN_TIMEOUT (120)
+WHISPER_DEADLINE = float(os.getenv('WHISPER_DEADLINE', '80'))  # seconds, 0 = no cap
+TRANSLATE_DEADLINE = float(os.getenv('TRANSLATE_DEADLINE', '20'))  # seconds, 0 = no cap
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+
+# Local language identification overrides Whisper's label at or above this confidence
+LANGUAGE_ID_MIN_CONFIDENCE = float(os.getenv('LANGUAGE_ID_MIN_CONFIDENCE', '0.6'))
 
-# Initialize rate limiter for API security
+# Coalesce concurrent identical uploads; the directory must be shared by all workers
+SINGLE_FLIGHT_DIR = os.getenv('SINGLE_FLIGHT_DIR', os.path.join(tempfile.gettempdir(), 'voice_translator_single_flight'))
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', '100'))  # seconds, under GUNICORN_TIMEOUT
+SINGLE_FLIGHT_RESULT_TTL = float(os.getenv('SINGLE_FLIGHT_RESULT_TTL', '5'))  # seconds a result is kept for workers queued on it
+
+# Admission control: concurrent transcriptions per worker process and across workers
+# sharing ADMISSION_DIR; excess requests wait up to ADMISSION_MAX_WAIT, then get a 503
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '32'))  # Per worker process
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '32'))
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '10'))  # seconds, well under the gunicorn timeout
+ADMISSION_DIR = os.getenv('ADMISSION_DIR', os.path.join(tempfile.gettempdir(), 'voice_translator_admission'))
+ADMISSION_CLUSTER_MAX_CONCURRENT = int(os.getenv('ADMISSION_CLUSTER_MAX_CONCURRENT', '64'))  # 0 = no shared cap
+ADMISSION_CLUSTER_MAX_QUEUE = int(os.getenv('ADMISSION_CLUSTER_MAX_QUEUE', '64'))
+ADMISSION_JOB_MAX_WAIT = float(os.getenv('ADMISSION_JOB_MAX_WAIT', '600'))  # Background jobs wait their turn
+
+# WhatsApp Cloud API webhook (/api/whatsapp/webhook); off unless a token and app secret are set
+WHATSAPP_ACCESS_TOKEN = os.getenv('WHATSAPP_ACCESS_TOKEN')
+WHATSAPP_APP_SECRET = os.getenv('WHATSAPP_APP_SECRET')  # Verifies X-Hub-Signature-256 on every delivery
+WHATSAPP_VERIFY_TOKEN = os.getenv('WHATSAPP_VERIFY_TOKEN')  # Echoed back in Meta's subscription handshake
+WHATSAPP_GRAPH_URL = os.getenv('WHATSAPP_GRAPH_URL', GRAPH_API_URL)  # e.g. a local fake Graph API
+WHATSAPP_SOURCE_LANGUAGE = os.getenv('WHATSAPP_SOURCE_LANGUAGE', 'auto')
+WHATSAPP_WORKERS = int(os.getenv('WHATSAPP_WORKERS', '2'))  # Voice notes answered at once per worker process
+WHATSAPP_QUEUE_SIZE = int(os.getenv('WHATSAPP_QUEUE_SIZE', '64'))  # Waiting notes before Meta is asked to redeliver
+WHATSAPP_MESSAGE_LOG_PATH = os.getenv('WHATSAPP_MESSAGE_LOG_PATH', os.path.join(tempfile.gettempdir(), 'voice_translator_whatsapp.sqlite3'))
+
+# Structured logs (JSON lines on stdout) and request tracing
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Records waiting for the log writer before drops
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))  # Share of requests whose spans are logged
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '20'))  # Always log spans past this; 0 = off
+
+# Batch endpoint (/api/translate/batch)
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '50'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))  # In-flight notes per worker process
+# A batch is answered inside one sync request, so it must finish within GUNICORN_TIMEOUT (120)
+BATCH_SYNC_MAX_FILES = int(os.getenv('BATCH_SYNC_MAX_FILES', '8'))  # Larger batches are queued as jobs
+BATCH_TIME_BUDGET = float(os.getenv('BATCH_TIME_BUDGET', '90'))  # seconds; unfinished files are reported as 504
+
+SUPPORTED_LANGUAGES = [
+    {'code': 'pidgin', 'name': 'Nigerian Pidgin'},
+    {'code': 'yoruba', 'name': 'Yoruba'},
+    {'code': 'igbo', 'name': 'Igbo'},
+    {'code': 'hausa', 'name': 'Hausa'},
+    {'code': 'urhobo', 'name': 'Urhobo'},
+    {'code': 'en', 'name': 'English'},
+    {'code': 'auto', 'name': 'Auto-detect'}
+]
+
+# Initialize rate limiter for API security (RATELIMIT_ENABLED=false for load tests)
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
@@ -48,14 +215,203 @@ limiter = Limiter(
 )
 
 # Initialize services
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-translator = Translator()
+configure_logging(LOG_LEVEL, LOG_QUEUE_SIZE)
+tracer = Tracer(sample_rate=TRACE_SAMPLE_RATE, slow_seconds=SLOW_REQUEST_SECONDS)
+
+openai_client = None
+async_openai_client = None  # Used by the ASGI app (asgi.py); connects on first use
+if TRANSCRIPTION_ENGINE == 'openai':
+    openai_client = build_openai_client(
+        os.getenv('OPENAI_API_KEY'),
+        base_url=OPENAI_BASE_URL,
+        timeout=WHISPER_TIMEOUT,
+        pool_size=UPSTREAM_POOL_SIZE
+    )
+    async_openai_client = build_async_openai_client(
+        os.getenv('OPENAI_API_KEY'),
+        base_url=OPENAI_BASE_URL,
+        timeout=WHISPER_TIMEOUT,
+        pool_size=ASYNC_POOL_SIZE
+    )
+whisper_upstream = Upstream(
+    'Whisper API',
+    max_retries=UPSTREAM_MAX_RETRIES,
+    base_delay=UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=UPSTREAM_RETRY_MAX_DELAY,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    on_error=metrics.record_upstream_error,
+    deadline=WHISPER_DEADLINE,
+    attempt_timeout=WHISPER_TIMEOUT
+)
+translate_upstream = Upstream(
+    'Translation service',
+    max_retries=UPSTREAM_MAX_RETRIES,
+    base_delay=UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=UPSTREAM_RETRY_MAX_DELAY,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    trip_on_any_error=True,  # Google's web endpoint fails in many shapes when it is degraded
+    on_error=metrics.record_upstream_error,
+    deadline=TRANSLATE_DEADLINE,
+    attempt_timeout=TRANSLATE_TIMEOUT
+)
+transcription_engine = create_engine(
+    TRANSCRIPTION_ENGINE, openai_client=openai_client, upstream=whisper_upstream,
+    async_openai_client=async_openai_client
+)
+if hasattr(transcription_engine, 'warm_up'):
+    transcription_engine.warm_up()  # Load the local model before the first request needs it
+if TRANSLATE_BASE_URL:
+    translation_client = LibreTranslateClient(
+        TRANSLATE_BASE_URL,
+        api_key=TRANSLATE_API_KEY,
+        timeout=TRANSLATE_TIMEOUT,
+        pool_size=UPSTREAM_POOL_SIZE
+    )
+else:
+    translation_client = GoogleTranslateClient(timeout=TRANSLATE_TIMEOUT, pool_size=UPSTREAM_POOL_SIZE)
+translator = ResilientTranslator(translation_client, translate_upstream)
+transcription_admission = AdmissionController(
+    'Transcription',
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_wait=ADMISSION_MAX_WAIT,
+    shared_dir=ADMISSION_DIR,
+    cluster_max_concurrent=ADMISSION_CLUSTER_MAX_CONCURRENT,
+    cluster_max_queue=ADMISSION_CLUSTER_MAX_QUEUE,
+    on_decision=metrics.record_admission
+) if ADMISSION_ENABLED else None
+transcription_cache = TranscriptionCache(
+    max_entries=TRANSCRIPTION_CACHE_SIZE,
+    ttl=TRANSCRIPTION_CACHE_TTL,
+    disk_dir=TRANSCRIPTION_CACHE_DIR
+)
+fingerprint_index = FingerprintIndex(
+    FINGERPRINT_INDEX_PATH,
+    ttl=TRANSCRIPTION_CACHE_TTL,  # Matches are only useful while the transcript is cached
+    min_matches=FINGERPRINT_MIN_MATCHES,
+    min_score=FINGERPRINT_MIN_SCORE
+) if FINGERPRINT_ENABLED else None
+translation_memory = TranslationMemory(
+    max_entries=TRANSLATION_MEMORY_SIZE,
+    path=TRANSLATION_MEMORY_PATH,
+    on_lookup=lambda hit: metrics.record_cache_lookup('translation_memory', hit),
+    max_batch_chars=TRANSLATE_BATCH_CHARS,
+    workers=TRANSLATE_CONCURRENCY
+)
+voice_note_flight = SingleFlight(
+    shared_dir=SINGLE_FLIGHT_DIR,
+    wait_timeout=SINGLE_FLIGHT_WAIT_TIMEOUT,
+    result_ttl=SINGLE_FLIGHT_RESULT_TTL
+)
+job_store = JobStore(JOB_STORE_PATH, ttl=JOB_TTL)
+job_runner = JobRunner(job_store, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE)
+history_store = HistoryStore(
+    HISTORY_PATH, queue_size=HISTORY_QUEUE_SIZE, retention=HISTORY_RETENTION_DAYS * 86400
+) if HISTORY_ENABLED else None
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+
+# Fans a transcript out to its target languages (translation batches run on the memory's own pool)
+target_executor = ThreadPoolExecutor(max_workers=TRANSLATE_TARGET_CONCURRENCY, thread_name_prefix='target')
+
+def process_whatsapp_note(audio_file, filename):
+    """Pipeline entry for voice notes downloaded from WhatsApp"""
+    with stage_timer('receive'):
+        audio_hash = hash_audio(audio_file)
+    return coalesced_voice_note(audio_file, filename, audio_hash, WHATSAPP_SOURCE_LANGUAGE)
+
+whatsapp_bot = None
+if WHATSAPP_ACCESS_TOKEN and WHATSAPP_APP_SECRET:
+    whatsapp_bot = WhatsAppBot(
+        GraphClient(WHATSAPP_ACCESS_TOKEN, base_url=WHATSAPP_GRAPH_URL, pool_size=UPSTREAM_POOL_SIZE),
+        MessageLog(WHATSAPP_MESSAGE_LOG_PATH),
+        process_whatsapp_note,
+        Upstream(
+            'WhatsApp Graph API',
+            max_retries=UPSTREAM_MAX_RETRIES,
+            base_delay=UPSTREAM_RETRY_BASE_DELAY,
+            max_delay=UPSTREAM_RETRY_MAX_DELAY,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=CIRCUIT_RESET_TIMEOUT,
+            on_error=metrics.record_upstream_error
+        ),
+        workers=WHATSAPP_WORKERS,
+        queue_size=WHATSAPP_QUEUE_SIZE,
+        max_bytes=MAX_FILE_SIZE,
+        spool_size=UPLOAD_SPOOL_MAX_SIZE,
+        max_retry_wait=ADMISSION_JOB_MAX_WAIT,
+        on_result=metrics.record_whatsapp_message,
+        tracer=tracer
+    )
+elif WHATSAPP_ACCESS_TOKEN:
+    log('warning', 'WhatsApp webhook disabled: set WHATSAPP_APP_SECRET so deliveries can be verified')
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def form_flag(name):
+    """Read a boolean option from form data"""
+    return request.form.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+def requested_targets(values):
+    """
+    Target languages from 'target_language' form values (repeated and/or comma-separated codes)
+    Returns: (targets, None) if valid, otherwise (None, (error payload, status code)); English by default
+    """
+    targets = []
+    for value in values:
+        for code in value.split(','):
+            code = code.strip().lower()
+            if code and code not in targets:
+                targets.append(code)
+
+    unsupported = [code for code in targets if code not in TARGET_LANGUAGES]
+    if unsupported:
+        return None, ({
+            'success': False,
+            'error': f"Unsupported target language: {', '.join(unsupported)}",
+            'target_languages': list(TARGET_LANGUAGES)
+        }, 400)
+
+    if len(targets) > TRANSLATE_MAX_TARGETS:
+        return None, ({
+            'success': False,
+            'error': f'Too many target languages. Maximum per request: {TRANSLATE_MAX_TARGETS}'
+        }, 400)
+
+    return targets or ['en'], None
+
+@app.before_request
+def start_request_metrics():
+    """Track in-flight requests, start the latency clock and the request's trace"""
+    g.metrics_endpoint = request.endpoint or 'unknown'
+    g.request_started = time.perf_counter()
+    metrics.IN_FLIGHT.labels(g.metrics_endpoint).inc()
+    trace_id, sampled = incoming_trace(request.headers)
+    g.trace, g.trace_token = tracer.start(g.metrics_endpoint, trace_id, sampled)
+
+@app.after_request
+def add_trace_header(response):
+    """Return the trace id so clients can quote it in bug reports"""
+    if 'trace' in g:
+        response.headers['X-Trace-Id'] = g.trace.trace_id
+        g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    """Record end-to-end latency for the request and log its trace if sampled or slow"""
+    if 'request_started' in g:
+        metrics.IN_FLIGHT.labels(g.metrics_endpoint).dec()
+        metrics.REQUEST_LATENCY.labels(g.metrics_endpoint).observe(
+            time.perf_counter() - g.request_started
+        )
+    if 'trace' in g:
+        tracer.finish(g.trace, g.trace_token, g.get('response_status', 500 if error else None))
+
 @app.route('/')
 def index():
     """API status endpoint"""
@@ -63,10 +419,17 @@ def index():
         'status': 'online',
         'service': 'Voice Note Translator API - Powered by OpenAI Whisper',
         'version': '3.0',
-        'transcription_engine': 'OpenAI Whisper API',
+        'transcription_engine': transcription_engine.name,
         'endpoints': {
             '/api/translate': 'POST - Translate voice note',
+            '/api/translate/stream': 'POST - Translate voice note with streamed progress (SSE)',
+            '/api/translate/batch': 'POST - Translate many voice notes at once',
+            '/api/jobs': 'POST - Queue voice note for background translation',
+            '/api/jobs/<job_id>': 'GET - Job status and result',
+            '/api/history': 'GET - Past translations (paginated, searchable)',
+            '/api/history/<entry_id>': 'GET - One past translation with its full result',
             '/api/health': 'GET - Health check',
+            '/metrics': 'GET - Prometheus metrics',
             '/api/languages': 'GET - Get supported languages'
         },
         'features': [
@@ -80,175 +443,1042 @@ def index():
 @app.route('/api/health')
 def health():
     """Health check endpoint"""
-    # Check if OpenAI API key is configured
+    return jsonify(health_payload())
+
+def health_payload():
+    """Service, circuit and cache status (shared with the ASGI app)"""
+    # Check if OpenAI API key is configured (local engines don't need one)
     has_openai_key = bool(os.getenv('OPENAI_API_KEY'))
+    engine_ready = has_openai_key or not transcription_engine.remote
 
-    return jsonify({
-        'status': 'healthy' if has_openai_key else 'degraded',
+    whisper_circuit = whisper_upstream.breaker.snapshot()
+    translation_circuit = translate_upstream.breaker.snapshot()
+    circuits_closed = whisper_circuit['state'] == 'closed' and translation_circuit['state'] == 'closed'
+
+    return {
+        'status': 'healthy' if engine_ready and circuits_closed else 'degraded',
         'services': {
-            'whisper_api': 'active' if has_openai_key else 'missing API key',
-            'translation': 'active'
+            'whisper_api': 'active' if engine_ready else 'missing API key',
+            'translation': 'active' if translation_circuit['state'] == 'closed' else 'unavailable'
+        },
+        'circuits': {
+            'whisper_api': whisper_circuit,
+            'translation': translation_circuit
         },
-        'transcription_engine': 'OpenAI Whisper',
+        'transcription_engine': transcription_engine.name,
+        'transcription_cache': transcription_cache.stats(),
+        'fingerprint_index': fingerprint_index.stats() if fingerprint_index else None,
+        'translation_memory': translation_memory.stats(),
+        'single_flight': voice_note_flight.stats(),
+        'admission': transcription_admission.stats() if transcription_admission else None,
+        'history': history_store.stats() if history_store else None,
+        'whatsapp': whatsapp_bot.stats() if whatsapp_bot else None,
+        'tracing': tracer.stats(),
         'version': '3.0'
+    }
+
+def validate_audio_file(file):
+    """
+    Check a single uploaded audio file
+    Returns: None if valid, otherwise (error payload, status code)
+    """
+    # Check if file is selected
+    if file.filename == '':
+        return {
+            'success': False,
+            'error': 'No file selected'
+        }, 400
+
+    # Check if file type is allowed
+    if not allowed_file(file.filename):
+        return {
+            'success': False,
+            'error': f'File type not allowed. Supported: {", ".join(ALLOWED_EXTENSIONS)}'
+        }, 400
+
+    return None
+
+def validate_audio_upload():
+    """
+    Check the 'audio' file in the current request
+    Returns: (file, None) if valid, otherwise (None, (error payload, status code))
+    """
+    # Check if file is present
+    if 'audio' not in request.files:
+        return None, ({
+            'success': False,
+            'error': 'No audio file provided'
+        }, 400)
+
+    file = request.files['audio']
+    error = validate_audio_file(file)
+    if error:
+        return None, error
+
+    return file, None
+
+def upload_size(audio_file):
+    """Size in bytes of a seekable upload buffer (leaves it rewound)"""
+    audio_file.seek(0, os.SEEK_END)
+    size = audio_file.tell()
+    audio_file.seek(0)
+    return size
+
+def detach_upload(file):
+    """Take ownership of an upload buffer so it outlives the request"""
+    stream = file.stream
+    file.stream = io.BytesIO()  # Werkzeug closes this one at teardown instead
+    return stream
+
+def transcribe_audio(audio_file, whisper_language):
+    """Transcribe a (filename, file object or bytes) tuple with the configured engine"""
+    # Whisper API calls retry transient errors and fail fast while the circuit is open
+    with stage_timer('transcribe'):
+        return transcription_engine.transcribe(audio_file, whisper_language)
+
+def upstream_unavailable(error):
+    """Error payload for a request refused by an open circuit breaker or admission control"""
+    if isinstance(error, AdmissionRejected):
+        message = 'Server is busy, please try again shortly'
+    else:
+        message = f'{error.name} is temporarily unavailable, please retry shortly'
+    return {
+        'success': False,
+        'error': message,
+        'retry_after': error.retry_after
+    }, 503
+
+@contextmanager
+def admit_transcription():
+    """
+    Hold a transcription slot for the block, waiting at most ADMISSION_MAX_WAIT
+    Raises AdmissionRejected (a 503 with Retry-After) when shedding load
+    """
+    if transcription_admission is None:
+        yield
+        return
+
+    with stage_timer('admission'):
+        ticket = transcription_admission.acquire()
+    try:
+        yield
+    finally:
+        transcription_admission.release(ticket)
+
+def transcribe_admitted(audio_file, whisper_language):
+    """transcribe_audio() holding a transcription slot for the call"""
+    with admit_transcription():
+        return transcribe_audio(audio_file, whisper_language)
+
+def is_chunked(audio_bytes, long_audio=False):
+    """Whether a note is transcribed in chunks (over the engine's upload limit, or asked to)"""
+    max_file_size = transcription_engine.max_file_size
+    return bool(long_audio or (max_file_size and audio_bytes > max_file_size))
+
+def lookup_transcription(audio_file, audio_hash, whisper_language, chunked):
+    """
+    Find a previous transcription of this audio: same bytes, or the same speech re-encoded
+    Returns: (cached result or None, near_duplicate or None, decoded audio, fingerprint)
+    decoded audio and fingerprint are reused later to trim silence and index the note
+    """
+    cache_key = make_cache_key(audio_hash, whisper_language)
+    cached_result = transcription_cache.get(cache_key)
+    metrics.record_cache_lookup('transcription', bool(cached_result))
+
+    # Decode once (mono 16 kHz, capped) for fingerprinting, silence trimming and normalization
+    decoded = None
+    if not cached_result and not chunked and (fingerprint_index or VAD_ENABLED):
+        try:
+            with stage_timer('decode'):
+                decoded = decode_speech(audio_file, max_seconds=DECODE_SECONDS)
+        except Exception as e:
+            log('warning', 'audio decode failed', error=str(e))
+
+    # Same speech in different bytes (re-encoded, trimmed, converted): match it by sound
+    fingerprint = None
+    near_duplicate = None
+    if decoded is not None and fingerprint_index:
+        try:
+            with stage_timer('fingerprint'):
+                fingerprint = fingerprint_audio(decoded, max_seconds=FINGERPRINT_MAX_SECONDS)
+                match = fingerprint_index.match(*fingerprint)
+            if match:
+                matched_hash, score = match
+                cached_result = transcription_cache.get(make_cache_key(matched_hash, whisper_language))
+                if cached_result:
+                    near_duplicate = {'audio_hash': matched_hash, 'score': score}
+                    transcription_cache.set(cache_key, cached_result)  # Exact hits from now on
+        except Exception as e:
+            log('warning', 'audio fingerprinting skipped', error=str(e))
+        metrics.record_cache_lookup('fingerprint', bool(near_duplicate))
+
+    if near_duplicate:
+        annotate(cache='near_duplicate', near_duplicate_score=near_duplicate['score'])
+    elif cached_result:
+        annotate(cache='hit')
+
+    return cached_result, near_duplicate, decoded, fingerprint
+
+def prepare_upload(audio_file, decoded, emit):
+    """
+    Trim silence and shrink bulky audio before it is sent for transcription
+    Returns: (upload or None to send the original, speech pieces for restore_timestamps,
+              silence trimming stats, normalization stats)
+    """
+    # Drop dead air so Whisper neither bills for it nor hallucinates in it
+    upload = None
+    speech_pieces = None
+    vad = None
+    preprocessing = None
+    # A note cut off at the decode cap can only be fingerprinted: trimming it would drop its end
+    whole = decoded is not None and decoded.duration_seconds < DECODE_SECONDS
+    if whole and VAD_ENABLED:
+        try:
+            with stage_timer('vad'):
+                upload, speech_pieces, vad = trim_silence(
+                    decoded,
+                    output_format=AUDIO_NORMALIZE_FORMAT,
+                    max_gap_ms=VAD_MAX_GAP_MS,
+                    min_saved_seconds=VAD_MIN_SAVED_SECONDS
+                )
+            metrics.SILENCE_SECONDS.inc(vad['removed_seconds'])
+            if upload:
+                annotate(silence_trimmed_seconds=vad['removed_seconds'])
+            emit('stage', {'stage': 'trimmed', **vad})
+        except Exception as e:
+            log('warning', 'silence trimming skipped', error=str(e))
+
+    # Shrink bulky audio before upload (skipped for compact files, local engines
+    # and audio the trimming step already re-encoded)
+    if upload is None and AUDIO_NORMALIZE and transcription_engine.remote:
+        try:
+            with stage_timer('transcode'):
+                upload, preprocessing = normalize_audio(
+                    audio_file,
+                    output_format=AUDIO_NORMALIZE_FORMAT,
+                    min_bitrate=AUDIO_NORMALIZE_MIN_BITRATE,
+                    min_bytes=AUDIO_NORMALIZE_MIN_BYTES,
+                    decoded=decoded if whole else None
+                )
+            if upload:
+                annotate(normalized_bytes_saved=preprocessing['bytes_saved'])
+        except Exception as e:
+            log('warning', 'audio normalization skipped', error=str(e))
+
+    emit('stage', {'stage': 'normalized', **(preprocessing or {'applied': False})})
+    audio_file.seek(0)
+    return upload, speech_pieces, vad, preprocessing
+
+def read_transcription(response, speech_pieces=None):
+    """(text, language, segments) of an engine response, timestamps on the original recording"""
+    metrics.AUDIO_SECONDS.inc(getattr(response, 'duration', None) or 0)
+
+    segments = segment_dicts(getattr(response, 'segments', None))
+    if speech_pieces:
+        # Timestamps refer to the trimmed audio; report them on the original recording
+        segments = restore_timestamps(segments, speech_pieces)
+    return response.text, getattr(response, 'language', 'unknown'), segments
+
+def store_transcription(cache_key, audio_hash, fingerprint, original_text, detected_language,
+                        long_result, segments):
+    """Cache a usable transcription (and index its fingerprint) for later requests"""
+    # Sizes only: transcripts are user content and stay out of the logs
+    annotate(transcript_chars=len(original_text or ''), whisper_language=detected_language)
+
+    if not original_text or not original_text.strip():
+        return
+
+    transcription_cache.set(cache_key, {
+        'original_text': original_text,
+        'detected_language': detected_language,
+        'long_audio': long_result,
+        'segments': None if long_result else segments
+    })
+    if fingerprint is not None:
+        try:
+            fingerprint_index.add(audio_hash, *fingerprint)
+        except Exception as e:
+            log('warning', 'fingerprint indexing failed', error=str(e))
+
+def no_speech_detected():
+    """Error payload for audio that transcribed to nothing"""
+    return {
+        'success': False,
+        'error': 'Could not transcribe audio. Please ensure the audio contains clear speech.'
+    }, 400
+
+def identify_transcript_language(original_text, detected_language):
+    """
+    Whisper often labels Pidgin as English (or 'unknown'); check the text locally
+    Returns: (detected language, language_id payload)
+    """
+    with stage_timer('detect'):
+        detected_language, local_language, language_confidence = resolve_language(
+            original_text, detected_language, LANGUAGE_ID_MIN_CONFIDENCE
+        )
+    annotate(detected_language=detected_language)
+
+    return detected_language, {'language': local_language, 'confidence': language_confidence}
+
+def translate_transcript(original_text, segments, detected_language, emit, dest='en'):
+    """
+    Translate a transcript into dest (English by default) unless it already is in it
+    Returns: (translated text, translated segments or None, note)
+    """
+    try:
+        if canonical_language(detected_language) == dest:
+            return original_text, [{**segment, 'translation': segment['text']} for segment in segments], \
+                f'Text is already in {TARGET_LANGUAGES[dest]}'
+
+        # Translate using Google Translate (unseen sentences only)
+        emit('stage', {'stage': 'translating', 'target_language': dest})
+        with stage_timer('translate'):
+            if segments:
+                # Segment by segment, in concurrent size-bounded batches, keeping timestamps
+                translated_text, translated_segments = translation_memory.translate_segments(
+                    translator, segments, src=detected_language, dest=dest
+                )
+                return translated_text, translated_segments, None
+
+            return translation_memory.translate(
+                translator, original_text, src=detected_language, dest=dest
+            ), None, None
+
+    except Exception as e:
+        # If translation fails, return original text
+        log('warning', 'translation failed, returning the original text', target_language=dest, error=str(e))
+        return original_text, None, 'Translation service unavailable, showing original text only'
+
+def translate_targets(original_text, segments, detected_language, targets, emit):
+    """
+    Translate one transcript into every target language, concurrently when there are several
+    The translation memory caches sentences per (source, target) pair, so each target is cached on its own
+    Returns: {target: (translated text, translated segments or None, note)} in the order requested
+    """
+    if len(targets) == 1:
+        return {targets[0]: translate_transcript(original_text, segments, detected_language, emit, targets[0])}
+
+    # A copy of the caller's context per target, so each translation joins the request's trace
+    futures = {
+        dest: target_executor.submit(
+            contextvars.copy_context().run, translate_transcript,
+            original_text, segments, detected_language, emit, dest
+        )
+        for dest in targets
+    }
+    return {dest: future.result() for dest, future in futures.items()}
+
+def voice_note_payload(original_text, translations, detected_language, language_id, cached_result,
+                       near_duplicate=None, long_result=None, preprocessing=None, vad=None):
+    """
+    Assemble the /api/translate response body from the pipeline's results
+    translations maps each target language to its translation; the first one is the primary
+    """
+    target_language = next(iter(translations))
+    translated_text, translated_segments, note = translations[target_language]
+
+    payload = {
+        'success': True,
+        'original_text': original_text,
+        'translated_text': translated_text,
+        'target_language': target_language,
+        'detected_language': detected_language,
+        'detected_language_name': LANGUAGE_NAMES.get(detected_language, detected_language),
+        'language_id': language_id,
+        'note': note,
+        'transcription_engine': transcription_engine.name,
+        'cached': bool(cached_result),
+        'cache': transcription_cache.stats()
+    }
+
+    # Transcript reused from a re-encoded copy of the same voice note
+    if near_duplicate:
+        payload['near_duplicate'] = near_duplicate
+
+    # Several target languages: every translation, keyed by language code
+    if len(translations) > 1:
+        payload['translations'] = {}
+        for dest, (text, segments, target_note) in translations.items():
+            entry = {'language_name': TARGET_LANGUAGES[dest], 'text': text, 'note': target_note}
+            if segments is not None:
+                entry['segments'] = segments
+            payload['translations'][dest] = entry
+
+    # Long audio: per-segment timestamps across the whole recording
+    if long_result:
+        payload.update(long_result)
+
+    # Timestamped segments, each with its own translation
+    if translated_segments is not None:
+        payload['segments'] = translated_segments
+
+    # Bytes saved and time spent by audio normalization
+    if preprocessing:
+        payload['preprocessing'] = preprocessing
+
+    # Original vs. submitted audio duration after silence trimming
+    if vad:
+        payload['vad'] = vad
+
+    return payload
+
+def record_history(payload, audio_hash, filename, source_language):
+    """Queue a result for the history writer thread; the response doesn't wait on disk"""
+    if history_store:
+        history_store.record(
+            {key: value for key, value in payload.items() if key != 'cache'},
+            audio_hash=audio_hash, filename=filename, source_language=source_language
+        )
+
+def process_voice_note(audio_file, filename, audio_hash, source_language, long_audio=False,
+                       on_event=None, targets=None):
+    """
+    Transcribe an uploaded voice note with Whisper and translate it into each target
+    language (English by default)
+    audio_file is a seekable buffer; filename tells Whisper and ffmpeg the format
+    Files over the Whisper limit (or long_audio=True) are transcribed in chunks
+    on_event(event, data) receives progress: 'stage', 'segment' and 'transcript'
+    Returns: (JSON payload, HTTP status code)
+    """
+    def emit(event, data):
+        if on_event:
+            on_event(event, data)
+
+    audio_bytes = upload_size(audio_file)
+    metrics.AUDIO_BYTES.inc(audio_bytes)
+    annotate(audio_bytes=audio_bytes)
+    emit('stage', {'stage': 'received', 'bytes': audio_bytes})
+
+    # Get language code for Whisper
+    whisper_language = LANGUAGE_MAP.get(source_language, None)
+    cache_key = make_cache_key(audio_hash, whisper_language)
+    chunked = is_chunked(audio_bytes, long_audio)
+
+    # Reuse a previous transcription of the same audio if we have one
+    cached_result, near_duplicate, decoded, fingerprint = lookup_transcription(
+        audio_file, audio_hash, whisper_language, chunked
+    )
+    preprocessing = None
+    vad = None
+
+    if cached_result:
+        original_text = cached_result['original_text']
+        detected_language = cached_result['detected_language']
+        long_result = cached_result.get('long_audio')
+        segments = (long_result or {}).get('segments') or cached_result.get('segments') or []
+
+        for segment in segments:
+            emit('segment', segment)
+    else:
+        long_result = None
+
+        if chunked:
+            # Split at silences and transcribe chunks concurrently
+            emit('stage', {'stage': 'transcribing', 'long_audio': True})
+
+            def chunk_done(index, total, segments):
+                for segment in segments:
+                    emit('segment', {**segment, 'chunk': index, 'chunks': total})
+
+            # Every chunk in flight is a Whisper call, so each one holds its own transcription slot
+            result = transcribe_long_audio(
+                audio_file,
+                lambda chunk: transcribe_admitted(chunk, whisper_language),
+                max_chunk_seconds=LONG_AUDIO_CHUNK_SECONDS,
+                max_workers=LONG_AUDIO_CONCURRENCY,
+                on_chunk=chunk_done
+            )
+
+            original_text = result['text']
+            detected_language = result['language']
+            segments = result['segments']
+            metrics.AUDIO_SECONDS.inc(result['duration'])
+            long_result = {
+                'segments': result['segments'],
+                'duration': result['duration'],
+                'chunks': result['chunks']
+            }
+            annotate(chunks=result['chunks'], audio_seconds=result['duration'])
+        else:
+            # Wait for a transcription slot, or be refused before any upstream spend
+            with admit_transcription():
+                upload, speech_pieces, vad, preprocessing = prepare_upload(audio_file, decoded, emit)
+
+                # Transcribe audio with the configured engine (OpenAI Whisper API by default)
+                emit('stage', {'stage': 'transcribing', 'long_audio': False})
+
+                # Send the in-memory buffer straight to the client, no extra copy
+                response = transcribe_audio(upload or (filename, audio_file), whisper_language)
+                original_text, detected_language, segments = read_transcription(response, speech_pieces)
+
+                for segment in segments:
+                    emit('segment', segment)
+
+        store_transcription(cache_key, audio_hash, fingerprint, original_text, detected_language,
+                            long_result, segments)
+
+    if not original_text or original_text.strip() == '':
+        return no_speech_detected()
+
+    detected_language, language_id = identify_transcript_language(original_text, detected_language)
+
+    emit('transcript', {
+        'original_text': original_text,
+        'detected_language': detected_language,
+        'detected_language_name': LANGUAGE_NAMES.get(detected_language, detected_language),
+        'cached': bool(cached_result)
     })
 
+    translations = translate_targets(original_text, segments, detected_language, targets or ['en'], emit)
+
+    payload = voice_note_payload(
+        original_text, translations, detected_language, language_id, cached_result,
+        near_duplicate=near_duplicate, long_result=long_result, preprocessing=preprocessing, vad=vad
+    )
+    record_history(payload, audio_hash, filename, source_language)
+
+    return payload, 200
+
+def coalesced_voice_note(audio_file, filename, audio_hash, source_language, long_audio=False, targets=None):
+    """
+    process_voice_note, shared by every concurrent request for the same audio, language
+    and targets (in this worker or another), so duplicates cost one transcription and one translation
+    """
+    targets = targets or ['en']
+    key = f"{make_cache_key(audio_hash, LANGUAGE_MAP.get(source_language))}-{'long' if long_audio else 'single'}" \
+          f"-{'+'.join(targets)}"
+
+    (payload, status_code), shared = voice_note_flight.do(
+        key, lambda: process_voice_note(audio_file, filename, audio_hash, source_language, long_audio,
+                                        targets=targets)
+    )
+    metrics.record_cache_lookup('single_flight', shared)
+
+    if shared:
+        annotate(coalesced=True)
+        payload = {**payload, 'coalesced': True}
+    return payload, status_code
+
+def run_voice_note_job(audio_file, filename, audio_hash, source_language, long_audio=False, targets=None):
+    """Background job wrapper: process a detached upload, then release its buffer"""
+    deadline = time.monotonic() + ADMISSION_JOB_MAX_WAIT
+    try:
+        with tracer.trace('voice_note_job'):
+            while True:
+                try:
+                    return coalesced_voice_note(
+                        audio_file, filename, audio_hash, source_language, long_audio, targets
+                    )
+                except AdmissionRejected as e:
+                    # Nobody is waiting on the response: queue behind interactive requests instead of failing
+                    if time.monotonic() + e.retry_after > deadline:
+                        raise
+                    time.sleep(e.retry_after)
+                    audio_file.seek(0)
+    finally:
+        audio_file.close()
+
 @app.route('/api/translate', methods=['POST'])
 @limiter.limit("10 per minute")  # Rate limit: 10 translations per minute
 def translate_voice():
     """
-    Translate voice note to English using OpenAI Whisper API
-    Accepts: audio file and optional language parameter
-    Returns: JSON with original text, translation, and detected language
+    Translate voice note to English (or other target languages) using OpenAI Whisper API
+    Accepts: audio file, optional language, target_language (one or more codes) and long_audio parameters
+    Returns: JSON with original text, translation(s), and detected language
     """
     try:
-        # Check if file is present
-        if 'audio' not in request.files:
-            return jsonify({
-                'success': False,
-                'error': 'No audio file provided'
-            }), 400
+        file, error = validate_audio_upload()
+        if not error:
+            targets, error = requested_targets(request.form.getlist('target_language'))
+        if error:
+            payload, status_code = error
+            return jsonify(payload), status_code
+
+        # Get source language from form data (optional)
+        source_language = request.form.get('language', 'auto')
 
-        file = request.files['audio']
+        # Hash the upload so identical voice notes hit the cache
+        with stage_timer('receive'):
+            audio_hash = hash_audio(file.stream)
 
-        # Check if file is selected
-        if file.filename == '':
-            return jsonify({
-                'success': False,
-                'error': 'No file selected'
-            }), 400
+        # The upload is already spooled (memory, or an anonymous temp file when large)
+        # Identical uploads already in flight share their result
+        payload, status_code = coalesced_voice_note(
+            file.stream, secure_filename(file.filename), audio_hash,
+            source_language, form_flag('long_audio'), targets
+        )
+        return jsonify(payload), status_code
 
-        # Check if file type is allowed
-        if not allowed_file(file.filename):
-            return jsonify({
-                'success': False,
-                'error': f'File type not allowed. Supported: {", ".join(ALLOWED_EXTENSIONS)}'
-            }), 400
+    except CircuitOpenError as e:
+        payload, status_code = upstream_unavailable(e)
+        response = jsonify(payload)
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, status_code
 
-        # Get source language from form data (optional)
-        source_language = request.form.get('language', 'auto')
+    except Exception as e:
+        log('error', 'request failed', exc_info=True, error=str(e))
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
 
-        # Save file temporarily
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/translate/stream', methods=['POST'])
+@limiter.limit("10 per minute")  # Same budget as /api/translate
+def translate_voice_stream():
+    """
+    Streaming variant of /api/translate using Server-Sent Events
+    Emits 'stage' events (received, normalized, transcribing, translating),
+    'segment' events with partial transcript segments, a 'transcript' event,
+    then a final 'result' (or 'error') event with the usual JSON payload
+    """
+    file, error = validate_audio_upload()
+    if not error:
+        targets, error = requested_targets(request.form.getlist('target_language'))
+    if error:
+        payload, status_code = error
+        return jsonify(payload), status_code
 
+    # Get source language from form data (optional)
+    source_language = request.form.get('language', 'auto')
+    long_audio = form_flag('long_audio')
+    filename = secure_filename(file.filename)
+
+    # The pipeline runs while the response streams, so it owns the buffer
+    audio_file = detach_upload(file)
+    events = queue.Queue()
+
+    def run_pipeline():
         try:
-            # Map Nigerian languages to Whisper language codes
-            language_map = {
-                'pidgin': None,          # Auto-detect (Whisper handles Pidgin better in auto mode)
-                'yoruba': 'yo',          # Yoruba
-                'igbo': 'ig',            # Igbo
-                'hausa': 'ha',           # Hausa
-                'urhobo': None,          # Auto-detect (not officially supported, use auto)
-                'auto': None             # Auto-detect
-            }
+            with stage_timer('receive'):
+                audio_hash = hash_audio(audio_file)
+            payload, status_code = process_voice_note(
+                audio_file, filename, audio_hash, source_language, long_audio,
+                on_event=lambda event, data: events.put((event, data)), targets=targets
+            )
+            events.put(('result' if status_code < 400 else 'error', payload))
+        except CircuitOpenError as e:
+            events.put(('error', upstream_unavailable(e)[0]))
+        except Exception as e:
+            log('error', 'request failed', exc_info=True, error=str(e))
+            events.put(('error', {
+                'success': False,
+                'error': f'Server error: {str(e)}'
+            }))
+        finally:
+            audio_file.close()
+            events.put(None)
+
+    trace_id, sampled = g.trace.trace_id, g.trace.sampled
+
+    def traced_pipeline():
+        with tracer.trace('translate_voice_stream.pipeline', trace_id, sampled):
+            run_pipeline()
+
+    # The request's trace ends when the stream starts; the pipeline gets its own under the same id
+    threading.Thread(target=traced_pipeline, daemon=True).start()
+
+    def generate():
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            yield sse_event(*item)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+    })
+
+def translate_batch_item(index, audio_file, filename, source_language, targets=None):
+    """Process one file of a batch; failures are reported, never raised"""
+    try:
+        with stage_timer('receive'):
+            audio_hash = hash_audio(audio_file)
+        payload, status_code = coalesced_voice_note(
+            audio_file, filename, audio_hash, source_language, targets=targets
+        )
+    except CircuitOpenError as e:
+        payload, status_code = upstream_unavailable(e)
+    except Exception as e:
+        log('error', 'batch item failed', exc_info=True, index=index, error=str(e))
+        payload, status_code = {
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, 500
+    finally:
+        audio_file.close()
+
+    return {'index': index, 'filename': filename, 'status': status_code, **payload}
+
+def queue_batch(files, languages, targets):
+    """Queue every file of a batch too big to answer in one request as its own job"""
+    jobs = []
+    for index, (file, source_language) in enumerate(zip(files, languages)):
+        entry = {'index': index, 'filename': file.filename}
+        error = validate_audio_file(file)
+        if error:
+            payload, status_code = error
+            jobs.append({**entry, 'status': status_code, **payload})
+            continue
+
+        with stage_timer('receive'):
+            audio_hash = hash_audio(file.stream)
+        audio_file = detach_upload(file)
+        job_id = job_runner.submit(
+            run_voice_note_job, audio_file, secure_filename(file.filename), audio_hash,
+            source_language, False, targets
+        )
+        if job_id is None:
+            audio_file.close()
+            jobs.append({**entry, 'status': 503, 'success': False,
+                         'error': 'Server is busy, please try again shortly'})
+            continue
+
+        jobs.append({**entry, 'status': 202, 'success': True, 'job_id': job_id,
+                     'status_url': f'/api/jobs/{job_id}'})
+
+    queued = sum(1 for job in jobs if job['success'])
+    return jsonify({
+        'success': True,
+        'total': len(files),
+        'queued': queued,
+        'failed': len(jobs) - queued,
+        'jobs': jobs
+    }), 202
 
-            # Get language code for Whisper
-            whisper_language = language_map.get(source_language, None)
+@app.route('/api/translate/batch', methods=['POST'])
+@limiter.limit("5 per minute")  # Each batch carries up to BATCH_MAX_FILES notes
+def translate_batch():
+    """
+    Translate many voice notes in one request
+    Accepts: multiple 'audio' files, optional language (one for all, or one per file),
+             target_language (one or more codes, for every file)
+             and stream=true to receive each result as an NDJSON line as soon as it finishes
+    Returns: JSON with per-file results; failures don't affect the other files
+             Batches over BATCH_SYNC_MAX_FILES are queued instead: 202 with one job per file
+    """
+    files = request.files.getlist('audio')
+
+    if not files:
+        return jsonify({
+            'success': False,
+            'error': 'No audio files provided'
+        }), 400
+
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({
+            'success': False,
+            'error': f'Too many files. Maximum per batch: {BATCH_MAX_FILES}'
+        }), 400
+
+    targets, error = requested_targets(request.form.getlist('target_language'))
+    if error:
+        payload, status_code = error
+        return jsonify(payload), status_code
 
-            # Transcribe audio using OpenAI Whisper API
-            print(f"Transcribing audio with Whisper API...")
+    # One language for the whole batch, or one per file in the same order
+    languages = request.form.getlist('language') or ['auto']
+    if len(languages) != len(files):
+        languages = [languages[0]] * len(files)
 
-            with open(filepath, 'rb') as audio_file:
-                # Use Whisper API for transcription
-                transcription_params = {
-                    'file': audio_file,
-                    'model': 'whisper-1',
-                    'response_format': 'verbose_json',
-                }
+    if len(files) > BATCH_SYNC_MAX_FILES:
+        return queue_batch(files, languages, targets)
 
-                # Add language parameter if specified (not auto)
-                if whisper_language:
-                    transcription_params['language'] = whisper_language
+    results = []
+    futures = {}  # future -> (index, filename)
+    deadline = time.monotonic() + BATCH_TIME_BUDGET
 
-                # Call Whisper API
-                response = openai_client.audio.transcriptions.create(**transcription_params)
+    for index, (file, source_language) in enumerate(zip(files, languages)):
+        error = validate_audio_file(file)
+        if error:
+            payload, status_code = error
+            results.append({'index': index, 'filename': file.filename, 'status': status_code, **payload})
+            continue
 
-                original_text = response.text
-                detected_language = getattr(response, 'language', 'unknown')
+        # Workers own the buffers; they may still be running after this view returns
+        # A copy of the request's context per item, so item timings join its trace
+        filename = secure_filename(file.filename)
+        futures[batch_executor.submit(
+            contextvars.copy_context().run, translate_batch_item, index, detach_upload(file),
+            filename, source_language, targets
+        )] = (index, filename)
 
-                print(f"Transcription successful: {original_text[:100]}...")
-                print(f"Detected language: {detected_language}")
+    def summary(items):
+        succeeded = sum(1 for item in items if item['success'])
+        return {'total': len(files), 'succeeded': succeeded, 'failed': len(items) - succeeded}
 
-            if not original_text or original_text.strip() == '':
-                return jsonify({
-                    'success': False,
-                    'error': 'Could not transcribe audio. Please ensure the audio contains clear speech.'
-                }), 400
+    def timed_out(future):
+        # The note keeps going in the background and lands in the cache, so a retry is cheap
+        index, filename = futures[future]
+        return {
+            'index': index, 'filename': filename, 'status': 504, 'success': False,
+            'error': 'Not finished within the batch time budget, please retry this file'
+        }
 
-            # Detect language and translate to English
+    if form_flag('stream'):
+        def generate():
+            streamed = list(results)
+            for item in results:
+                yield json.dumps(item) + '\n'
+            remaining = set(futures)
             try:
-                # Map Whisper language codes to full names
-                language_names = {
-                    'en': 'English',
-                    'yo': 'Yoruba',
-                    'ig': 'Igbo',
-                    'ha': 'Hausa',
-                    'pcm': 'Nigerian Pidgin'
-                }
-
-                detected_lang_name = language_names.get(detected_language, detected_language)
-
-                # Check if already in English
-                if detected_language == 'en' or detected_language == 'english':
-                    translated_text = original_text
-                    note = 'Text is already in English'
-                else:
-                    # Translate to English using Google Translate
-                    translation = translator.translate(original_text, dest='en')
-                    translated_text = translation.text
-                    note = None
-
-                return jsonify({
-                    'success': True,
-                    'original_text': original_text,
-                    'translated_text': translated_text,
-                    'detected_language': detected_language,
-                    'detected_language_name': detected_lang_name,
-                    'note': note,
-                    'transcription_engine': 'OpenAI Whisper'
-                })
-
-            except Exception as e:
-                # If translation fails, return original text
-                print(f"Translation error: {str(e)}")
-                return jsonify({
-                    'success': True,
-                    'original_text': original_text,
-                    'translated_text': original_text,
-                    'detected_language': detected_language,
-                    'detected_language_name': detected_lang_name,
-                    'note': 'Translation service unavailable, showing original text only',
-                    'transcription_engine': 'OpenAI Whisper'
-                })
+                for future in as_completed(futures, timeout=max(0, deadline - time.monotonic())):
+                    remaining.discard(future)
+                    item = future.result()
+                    streamed.append(item)
+                    yield json.dumps(item) + '\n'
+            except FuturesTimeoutError:
+                for future in remaining:
+                    item = timed_out(future)
+                    streamed.append(item)
+                    yield json.dumps(item) + '\n'
+            yield json.dumps({'done': True, **summary(streamed)}) + '\n'
 
-        finally:
-            # Clean up temporary files
-            if os.path.exists(filepath):
-                os.remove(filepath)
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    done, not_done = wait(futures, timeout=max(0, deadline - time.monotonic()))
+    results.extend(future.result() for future in done)
+    results.extend(timed_out(future) for future in not_done)
+    results.sort(key=lambda item: item['index'])
+
+    return jsonify({
+        'success': True,
+        **summary(results),
+        'results': results
+    })
+
+@app.route('/api/jobs', methods=['POST'])
+@limiter.limit("10 per minute")  # Same budget as /api/translate
+def create_job():
+    """
+    Queue a voice note for background translation
+    Accepts: audio file, optional language, target_language and long_audio parameters
+    Returns: job id immediately; poll /api/jobs/<job_id> for the result
+    """
+    try:
+        file, error = validate_audio_upload()
+        if not error:
+            targets, error = requested_targets(request.form.getlist('target_language'))
+        if error:
+            payload, status_code = error
+            return jsonify(payload), status_code
+
+        # Get source language from form data (optional)
+        source_language = request.form.get('language', 'auto')
+
+        with stage_timer('receive'):
+            audio_hash = hash_audio(file.stream)
+
+        # The upload outlives this request, so the job takes over its buffer
+        audio_file = detach_upload(file)
+
+        job_id = job_runner.submit(
+            run_voice_note_job, audio_file, secure_filename(file.filename), audio_hash,
+            source_language, form_flag('long_audio'), targets
+        )
+
+        if job_id is None:
+            audio_file.close()
+            response = jsonify({
+                'success': False,
+                'error': 'Server is busy, please try again shortly'
+            })
+            response.headers['Retry-After'] = '30'
+            return response, 503
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
 
     except Exception as e:
-        print(f"Error: {str(e)}")
-        print(traceback.format_exc())
+        log('error', 'request failed', exc_info=True, error=str(e))
         return jsonify({
             'success': False,
             'error': f'Server error: {str(e)}'
         }), 500
 
+@app.route('/api/jobs/<job_id>')
+@limiter.limit("120 per minute")  # Clients poll this endpoint
+def get_job(job_id):
+    """Get the status of a queued job, and its result once finished"""
+    job = job_store.get(job_id)
+
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        **job
+    })
+
+def history_access_error():
+    """
+    History holds every user's transcripts: only callers with HISTORY_API_KEY may read it
+    Returns: an error response, or None if the request may proceed
+    """
+    if history_store is None:
+        return jsonify({
+            'success': False,
+            'error': 'Translation history is disabled'
+        }), 404
+
+    if not HISTORY_API_KEY:
+        return jsonify({
+            'success': False,
+            'error': 'Translation history API is disabled (set HISTORY_API_KEY)'
+        }), 403
+
+    key = request.headers.get('X-API-Key', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        key = authorization[len('Bearer '):].strip()
+    if not hmac.compare_digest(key.encode('utf-8'), HISTORY_API_KEY.encode('utf-8')):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid or missing API key'
+        }), 401, {'WWW-Authenticate': 'Bearer'}
+
+    return None
+
+@app.route('/api/history')
+@limiter.limit("60 per minute")
+def list_history():
+    """
+    Past translations, newest first (requires HISTORY_API_KEY)
+    Accepts: limit, cursor (next_cursor from the previous page), q (full-text search
+             over original and translated text), language and audio_hash filters
+    """
+    error = history_access_error()
+    if error:
+        return error
+
+    try:
+        limit = int(request.args.get('limit', '20'))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'limit and cursor must be integers'
+        }), 400
+
+    entries, next_cursor = history_store.page(
+        limit=limit,
+        cursor=cursor,
+        search=request.args.get('q'),
+        language=request.args.get('language'),
+        audio_hash=request.args.get('audio_hash')
+    )
+
+    return jsonify({
+        'success': True,
+        'entries': entries,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/history/<int:entry_id>')
+@limiter.limit("60 per minute")
+def get_history_entry(entry_id):
+    """One past translation with its full result payload (segments included; requires HISTORY_API_KEY)"""
+    error = history_access_error()
+    if error:
+        return error
+
+    entry = history_store.get(entry_id)
+
+    if entry is None:
+        return jsonify({
+            'success': False,
+            'error': 'History entry not found'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        **entry
+    })
+
+@app.route('/api/whatsapp/webhook', methods=['GET'])
+@limiter.exempt
+def verify_whatsapp_webhook():
+    """Meta's subscription handshake: echo hub.challenge when hub.verify_token matches"""
+    token = request.args.get('hub.verify_token', '')
+    if request.args.get('hub.mode') == 'subscribe' and WHATSAPP_VERIFY_TOKEN and \
+            hmac.compare_digest(token, WHATSAPP_VERIFY_TOKEN):
+        return Response(request.args.get('hub.challenge', ''), content_type='text/plain')
+
+    return jsonify({
+        'success': False,
+        'error': 'Webhook verification failed'
+    }), 403
+
+@app.route('/api/whatsapp/webhook', methods=['POST'])
+@limiter.exempt  # Meta retries throttled deliveries, which only adds load
+def whatsapp_webhook():
+    """
+    WhatsApp message notifications
+    Verifies the signature, skips message ids already seen and queues voice notes,
+    then acknowledges at once; the translation is sent back as a chat reply
+    Returns: 200 when every voice note is queued (or a duplicate), 503 when the
+             queue is full so Meta redelivers the rest later
+    """
+    if whatsapp_bot is None:
+        return jsonify({
+            'success': False,
+            'error': 'WhatsApp integration is not configured'
+        }), 404
+
+    body = request.get_data()
+    if not verify_signature(body, request.headers.get('X-Hub-Signature-256'), WHATSAPP_APP_SECRET):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid signature'
+        }), 401
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid JSON'
+        }), 400
+
+    results = [whatsapp_bot.receive(message) for message in audio_messages(payload)]
+    if RECEIVED_BUSY in results:
+        response = jsonify({
+            'success': False,
+            'error': 'Server is busy, please try again shortly'
+        })
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    return jsonify({
+        'success': True,
+        'received': len(results)
+    })
+
+@app.route('/metrics')
+@limiter.exempt
+def prometheus_metrics():
+    """Prometheus metrics (aggregated across gunicorn workers)"""
+    body, content_type = metrics.render_metrics()
+    return Response(body, content_type=content_type)
+
 @app.route('/api/languages')
 def get_languages():
     """Get supported languages"""
     return jsonify({
-        'supported_languages': [
-            {'code': 'pidgin', 'name': 'Nigerian Pidgin'},
-            {'code': 'yoruba', 'name': 'Yoruba'},
-            {'code': 'igbo', 'name': 'Igbo'},
-            {'code': 'hausa', 'name': 'Hausa'},
-            {'code': 'urhobo', 'name': 'Urhobo'},
-            {'code': 'en', 'name': 'English'},
-            {'code': 'auto', 'name': 'Auto-detect'}
-        ]
+        'supported_languages': SUPPORTED_LANGUAGES,
+        'target_languages': [{'code': code, 'name': name} for code, name in TARGET_LANGUAGES.items()]
     })
 
 if __name__ == '__main__':
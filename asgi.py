@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Voice Note Translator API - ASGI mode
+/api/translate, /api/health and /api/languages on an event loop: Whisper and
+translation calls are awaited instead of blocking a worker, so one worker keeps
+hundreds of voice notes in flight. Caches, fingerprints, silence trimming and
+language ID are shared with app.py; their CPU-bound work runs on threads
+
+Run with:
+    gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from limits import parse_many
+from limits.storage import MemoryStorage
+from limits.strategies import MovingWindowRateLimiter
+from starlette.applications import Starlette
+from starlette.datastructures import Headers, MutableHeaders, UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from werkzeug.utils import secure_filename
+
+import app as api
+import metrics
+from language_id import canonical_language
+from languages import LANGUAGE_MAP, TARGET_LANGUAGES
+from metrics import stage_timer
+from tracing import annotate, incoming_trace, log
+from transcription_cache import hash_audio, make_cache_key
+from upstream import AsyncGoogleTranslateClient, AsyncLibreTranslateClient, AsyncResilientTranslator, CircuitOpenError
+
+ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', '500'))  # Notes per worker before 503
+
+# Same budgets as the Flask app (flask-limiter uses the same limits library)
+DEFAULT_LIMITS = parse_many('200 per day; 50 per hour')
+TRANSLATE_LIMITS = parse_many('10 per minute')
+
+# Flask endpoint names, so metrics line up whichever server is running
+ENDPOINTS = {
+    '/api/translate': 'translate_voice',
+    '/api/health': 'health',
+    '/api/languages': 'get_languages',
+    '/metrics': 'prometheus_metrics'
+}
+
+if api.TRANSLATE_BASE_URL:
+    async_translation_client = AsyncLibreTranslateClient(
+        api.TRANSLATE_BASE_URL,
+        api_key=api.TRANSLATE_API_KEY,
+        timeout=api.TRANSLATE_TIMEOUT,
+        pool_size=api.ASYNC_POOL_SIZE
+    )
+else:
+    async_translation_client = AsyncGoogleTranslateClient(timeout=api.TRANSLATE_TIMEOUT, pool_size=api.ASYNC_POOL_SIZE)
+async_translator = AsyncResilientTranslator(async_translation_client, api.translate_upstream)
+
+rate_limiter = MovingWindowRateLimiter(MemoryStorage())
+in_flight_notes = asyncio.Semaphore(ASYNC_MAX_IN_FLIGHT)
+notes_in_flight = 0  # in_flight_notes slots taken (the semaphore doesn't expose its count)
+in_flight_calls = {}  # coalescing key -> task processing that note
+
+# Waiting for a transcription slot blocks a thread; keep those off the default pool
+admission_executor = ThreadPoolExecutor(
+    max_workers=api.ADMISSION_MAX_CONCURRENT + api.ADMISSION_MAX_QUEUE, thread_name_prefix='admission'
+) if api.transcription_admission else None
+
+
+class NoteSlot:
+    """
+    One in_flight_notes slot, taken by a request
+    A request that starts the pipeline task for its note hands the slot over, so it
+    stays taken until the pipeline ends even if the client disconnects first
+    """
+
+    def __init__(self):
+        self.task = None
+
+    async def __aenter__(self):
+        global notes_in_flight
+        await in_flight_notes.acquire()
+        notes_in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.task is None:
+            self.release()
+        else:
+            self.task.add_done_callback(self.release)
+
+    def hand_over(self, task):
+        """Release the slot when task finishes instead of when the request does"""
+        self.task = task
+
+    def release(self, _task=None):
+        global notes_in_flight
+        notes_in_flight -= 1
+        in_flight_notes.release()
+
+
+def rate_limited(request, limits):
+    """Count a request against each limit for its client; True once any is exhausted"""
+    if not api.app.config['RATELIMIT_ENABLED']:
+        return False
+    client = request.client.host if request.client else 'unknown'
+    scope = ENDPOINTS.get(request.url.path, request.url.path)
+    return not all([rate_limiter.hit(limit, scope, client) for limit in limits])
+
+
+def too_many_requests():
+    return JSONResponse({
+        'success': False,
+        'error': 'Rate limit exceeded, please slow down'
+    }, status_code=429)
+
+
+async def translate_transcript_async(original_text, segments, detected_language, dest='en'):
+    """
+    translate_transcript() with the translator awaited
+    Returns: (translated text, translated segments or None, note)
+    """
+    try:
+        if canonical_language(detected_language) == dest:
+            return original_text, [{**segment, 'translation': segment['text']} for segment in segments], \
+                f'Text is already in {TARGET_LANGUAGES[dest]}'
+
+        with stage_timer('translate'):
+            if segments:
+                translated_text, translated_segments = await api.translation_memory.translate_segments_async(
+                    async_translator, segments, src=detected_language, dest=dest
+                )
+                return translated_text, translated_segments, None
+
+            return await api.translation_memory.translate_async(
+                async_translator, original_text, src=detected_language, dest=dest
+            ), None, None
+
+    except Exception as e:
+        # If translation fails, return original text
+        log('warning', 'translation failed, returning the original text', target_language=dest, error=str(e))
+        return original_text, None, 'Translation service unavailable, showing original text only'
+
+
+async def translate_targets_async(original_text, segments, detected_language, targets):
+    """
+    translate_targets() on the event loop: every target language translated concurrently
+    Returns: {target: (translated text, translated segments or None, note)} in the order requested
+    """
+    translations = await asyncio.gather(*(
+        translate_transcript_async(original_text, segments, detected_language, dest) for dest in targets
+    ))
+    return dict(zip(targets, translations))
+
+
+def release_abandoned_slot(future):
+    """Done-callback: give back a slot acquired for a request that was cancelled while it waited"""
+    if not future.cancelled() and future.exception() is None:
+        api.transcription_admission.release(future.result())
+
+
+async def acquire_transcription_slot():
+    """
+    Wait for a transcription slot on the admission pool
+    The wait runs on a thread that can't be interrupted: if this coroutine is
+    cancelled (client gone), the slot is released as soon as the thread gets it
+    """
+    future = asyncio.get_running_loop().run_in_executor(admission_executor, api.transcription_admission.acquire)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(release_abandoned_slot)
+        raise
+
+
+async def process_voice_note_async(audio_file, filename, audio_hash, source_language, long_audio=False,
+                                   targets=None):
+    """
+    process_voice_note() for the event loop
+    Long audio is chunked on the sync pipeline in a thread (it has its own chunk pool)
+    Returns: (JSON payload, HTTP status code)
+    """
+    audio_bytes = api.upload_size(audio_file)
+    if api.is_chunked(audio_bytes, long_audio):
+        return await asyncio.to_thread(
+            api.process_voice_note, audio_file, filename, audio_hash, source_language, long_audio,
+            targets=targets
+        )
+
+    metrics.AUDIO_BYTES.inc(audio_bytes)
+    annotate(audio_bytes=audio_bytes)
+    whisper_language = LANGUAGE_MAP.get(source_language, None)
+    cache_key = make_cache_key(audio_hash, whisper_language)
+
+    # Cache lookups, decoding and fingerprinting touch disk and CPU: keep them off the loop
+    cached_result, near_duplicate, decoded, fingerprint = await asyncio.to_thread(
+        api.lookup_transcription, audio_file, audio_hash, whisper_language, False
+    )
+    preprocessing = None
+    vad = None
+
+    if cached_result:
+        original_text = cached_result['original_text']
+        detected_language = cached_result['detected_language']
+        long_result = cached_result.get('long_audio')
+        segments = (long_result or {}).get('segments') or cached_result.get('segments') or []
+    else:
+        long_result = None
+        ticket = None
+        if api.transcription_admission:
+            # Wait for a transcription slot, or be refused before any upstream spend
+            with stage_timer('admission'):
+                ticket = await acquire_transcription_slot()
+        try:
+            upload, speech_pieces, vad, preprocessing = await asyncio.to_thread(
+                api.prepare_upload, audio_file, decoded, lambda event, data: None
+            )
+
+            with stage_timer('transcribe'):
+                response = await api.transcription_engine.transcribe_async(
+                    upload or (filename, audio_file), whisper_language
+                )
+        finally:
+            if ticket:
+                api.transcription_admission.release(ticket)
+        original_text, detected_language, segments = api.read_transcription(response, speech_pieces)
+
+        await asyncio.to_thread(
+            api.store_transcription, cache_key, audio_hash, fingerprint, original_text,
+            detected_language, long_result, segments
+        )
+
+    if not original_text or original_text.strip() == '':
+        return api.no_speech_detected()
+
+    detected_language, language_id = api.identify_transcript_language(original_text, detected_language)
+    translations = await translate_targets_async(original_text, segments, detected_language, targets or ['en'])
+
+    payload = api.voice_note_payload(
+        original_text, translations, detected_language, language_id, cached_result,
+        near_duplicate=near_duplicate, long_result=long_result, preprocessing=preprocessing, vad=vad
+    )
+    api.record_history(payload, audio_hash, filename, source_language)
+
+    return payload, 200
+
+
+async def coalesced_voice_note_async(audio_file, filename, audio_hash, source_language, long_audio=False,
+                                    targets=None, slot=None):
+    """
+    process_voice_note_async, shared by concurrent requests for the same audio, language and targets
+    Coalescing is per worker here: one ASGI worker already holds most of the in-flight notes
+    Takes ownership of audio_file: the task that processes it closes it, a follower's copy
+    is closed at once. A leader's slot is handed to the task for as long as it runs
+    """
+    targets = targets or ['en']
+    key = f"{make_cache_key(audio_hash, LANGUAGE_MAP.get(source_language))}-{'long' if long_audio else 'single'}" \
+          f"-{'+'.join(targets)}"
+
+    task = in_flight_calls.get(key)
+    shared = task is not None
+    if shared:
+        audio_file.close()  # The leader's upload is the one being processed
+    else:
+        task = asyncio.ensure_future(
+            process_voice_note_async(audio_file, filename, audio_hash, source_language, long_audio, targets)
+        )
+        in_flight_calls[key] = task
+        task.add_done_callback(lambda _: in_flight_calls.pop(key, None))
+        task.add_done_callback(lambda _: audio_file.close())
+        if slot:
+            slot.hand_over(task)
+    metrics.record_cache_lookup('single_flight', shared)
+
+    # A disconnecting follower must not cancel the work other requests wait on
+    payload, status_code = await asyncio.shield(task)
+    if shared:
+        annotate(coalesced=True)
+        payload = {**payload, 'coalesced': True}
+    return payload, status_code
+
+
+async def translate_voice(request):
+    """
+    Translate voice note to English (same contract as the Flask endpoint)
+    Accepts: audio file, optional language, target_language (one or more codes) and long_audio parameters
+    Returns: JSON with original text, translation(s), and detected language
+    """
+    if rate_limited(request, TRANSLATE_LIMITS):
+        return too_many_requests()
+
+    content_length = int(request.headers.get('content-length') or 0)
+    if content_length > api.app.config['MAX_CONTENT_LENGTH']:
+        return JSONResponse({
+            'success': False,
+            'error': 'File too large'
+        }, status_code=413)
+
+    if in_flight_notes.locked():
+        return JSONResponse({
+            'success': False,
+            'error': 'Server is busy, please try again shortly'
+        }, status_code=503, headers={'Retry-After': '5'})
+
+    async with NoteSlot() as slot:
+        return await translate_note(request, slot)
+
+
+async def translate_note(request, slot):
+    """translate_voice() once the request holds one of the worker's in-flight note slots"""
+    form = await request.form()
+    try:
+        file = form.get('audio')
+        if not isinstance(file, UploadFile):
+            return JSONResponse({
+                'success': False,
+                'error': 'No audio file provided'
+            }, status_code=400)
+
+        error = api.validate_audio_file(file)
+        if not error:
+            targets, error = api.requested_targets(form.getlist('target_language'))
+        if error:
+            payload, status_code = error
+            return JSONResponse(payload, status_code=status_code)
+
+        # Get source language from form data (optional)
+        source_language = form.get('language', 'auto')
+        long_audio = str(form.get('long_audio', '')).lower() in ('1', 'true', 'yes', 'on')
+
+        # The pipeline may outlive this request (client gone, followers waiting on it),
+        # so it takes the upload over; form.close() closes an empty stand-in
+        audio_file = file.file
+        file.file = io.BytesIO()
+
+        # Hash the upload so identical voice notes hit the cache
+        try:
+            with stage_timer('receive'):
+                audio_hash = await asyncio.to_thread(hash_audio, audio_file)
+        except BaseException:
+            audio_file.close()
+            raise
+
+        payload, status_code = await coalesced_voice_note_async(
+            audio_file, secure_filename(file.filename), audio_hash, source_language, long_audio, targets, slot
+        )
+        return JSONResponse(payload, status_code=status_code)
+
+    except CircuitOpenError as e:
+        payload, status_code = api.upstream_unavailable(e)
+        return JSONResponse(payload, status_code=status_code, headers={'Retry-After': str(e.retry_after)})
+
+    except Exception as e:
+        log('error', 'request failed', exc_info=True, error=str(e))
+        return JSONResponse({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status_code=500)
+
+    finally:
+        await form.close()
+
+
+async def health(request):
+    """Health check endpoint"""
+    if rate_limited(request, DEFAULT_LIMITS):
+        return too_many_requests()
+    payload = api.health_payload()
+    payload['server'] = {
+        'mode': 'asgi',
+        'in_flight_notes': notes_in_flight,
+        'max_in_flight_notes': ASYNC_MAX_IN_FLIGHT
+    }
+    return JSONResponse(payload)
+
+
+async def get_languages(request):
+    """Get supported languages"""
+    if rate_limited(request, DEFAULT_LIMITS):
+        return too_many_requests()
+    return JSONResponse({
+        'supported_languages': api.SUPPORTED_LANGUAGES,
+        'target_languages': [{'code': code, 'name': name} for code, name in TARGET_LANGUAGES.items()]
+    })
+
+
+async def prometheus_metrics(request):
+    """Prometheus metrics (aggregated across gunicorn workers)"""
+    body, content_type = metrics.render_metrics()
+    return Response(body, headers={'Content-Type': content_type})
+
+
+class RequestMetrics:
+    """ASGI middleware: in-flight gauge, end-to-end latency and a trace per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        endpoint = ENDPOINTS.get(scope['path'], 'unknown')
+        started = time.perf_counter()
+        metrics.IN_FLIGHT.labels(endpoint).inc()
+        trace_id, sampled = incoming_trace(Headers(scope=scope))
+        trace, token = api.tracer.start(endpoint, trace_id, sampled)
+        status = {}
+
+        async def send_with_trace_id(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                MutableHeaders(scope=message)['X-Trace-Id'] = trace.trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            metrics.IN_FLIGHT.labels(endpoint).dec()
+            metrics.REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+            api.tracer.finish(trace, token, status.get('code', 500))
+
+
+app = Starlette(
+    routes=[
+        Route('/api/translate', translate_voice, methods=['POST']),
+        Route('/api/health', health),
+        Route('/api/languages', get_languages),
+        Route('/metrics', prometheus_metrics)
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(RequestMetrics)
+    ]
+)
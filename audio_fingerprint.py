@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Audio Fingerprint
+Recognizes the same voice note after it was re-encoded, trimmed or converted
+(ogg <-> m4a, WhatsApp recompression), which changes every byte of the file
+Spectrogram peaks are paired into landmark hashes (frequency, frequency, time gap);
+an inverted index maps each hash to the recordings and offsets it occurs at, and a
+match needs many hashes agreeing on the same time offset
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+SAMPLE_RATE = 8000          # Speech energy sits well below 4 kHz
+FFT_SIZE = 512              # 64 ms window, 15.6 Hz bins
+HOP_SIZE = 128              # 16 ms between frames
+PEAK_FREQ_RADIUS = 8        # A peak is the loudest bin within +/- this many bins...
+PEAK_TIME_RADIUS = 4        # ...and +/- this many frames
+PEAK_MIN_DB = 10.0          # Peaks must stand this far above the median level
+PEAKS_PER_SECOND = 30       # Keep the strongest peaks only
+PAIR_LOOKAHEAD = 8          # Pair each peak with the next few peaks...
+PAIR_MAX_FRAMES = 63        # ...up to ~1 s later
+PAIR_MAX_BINS = 128         # ...and within 2 kHz
+QUERY_CHUNK = 500           # Hashes per SQL IN (...) lookup
+PURGE_EVERY = 100           # Drop expired recordings after this many additions
+
+
+def audio_samples(audio, max_seconds=None):
+    """Mono float samples at SAMPLE_RATE from a decoded pydub AudioSegment"""
+    if max_seconds:
+        audio = audio[:int(max_seconds * 1000)]
+    audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE)
+    return np.array(audio.get_array_of_samples(), dtype=np.float32)
+
+
+def _local_max(values, radius, axis):
+    """Running maximum over +/- radius along one axis"""
+    result = values.copy()
+    length = values.shape[axis]
+    for shift in range(1, min(radius, length - 1) + 1):
+        ahead = [slice(None)] * values.ndim
+        behind = [slice(None)] * values.ndim
+        ahead[axis] = slice(shift, None)
+        behind[axis] = slice(None, -shift)
+        np.maximum(result[tuple(behind)], values[tuple(ahead)], out=result[tuple(behind)])
+        np.maximum(result[tuple(ahead)], values[tuple(behind)], out=result[tuple(ahead)])
+    return result
+
+
+def spectrogram(samples):
+    """Log-magnitude spectrogram in dB, shape (frames, FFT_SIZE // 2 + 1)"""
+    if len(samples) < FFT_SIZE:
+        return np.zeros((0, FFT_SIZE // 2 + 1), dtype=np.float32)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE).astype(np.float32), axis=1))
+    return 20 * np.log10(spectrum + 1e-6)
+
+
+def find_peaks(spectrum):
+    """(frame, bin) of the strongest local maxima, sorted by time"""
+    if spectrum.size == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    neighborhood = _local_max(_local_max(spectrum, PEAK_FREQ_RADIUS, 1), PEAK_TIME_RADIUS, 0)
+    floor = np.median(spectrum) + PEAK_MIN_DB
+    frames, bins = np.nonzero((spectrum == neighborhood) & (spectrum > floor))
+
+    # Limit density so loud and quiet recordings index a similar number of hashes
+    seconds = spectrum.shape[0] * HOP_SIZE / SAMPLE_RATE
+    keep = max(1, int(seconds * PEAKS_PER_SECOND))
+    if len(frames) > keep:
+        strongest = np.argsort(spectrum[frames, bins])[-keep:]
+        frames, bins = frames[strongest], bins[strongest]
+
+    order = np.lexsort((bins, frames))
+    return np.stack([frames[order], bins[order]], axis=1).astype(np.int64)
+
+
+def landmarks(peaks):
+    """
+    Pair nearby peaks into hashes
+    Returns: (hashes, offsets) - hash of (bin, bin, frame gap) and the anchor frame
+    """
+    hashes = []
+    offsets = []
+    for step in range(1, PAIR_LOOKAHEAD + 1):
+        anchors, targets = peaks[:-step], peaks[step:]
+        gap = targets[:, 0] - anchors[:, 0]
+        valid = (gap > 0) & (gap <= PAIR_MAX_FRAMES) & \
+            (np.abs(targets[:, 1] - anchors[:, 1]) <= PAIR_MAX_BINS)
+        hashes.append((anchors[valid, 1] << 15) | (targets[valid, 1] << 6) | gap[valid])
+        offsets.append(anchors[valid, 0])
+
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+
+def fingerprint_samples(samples):
+    """Landmark (hashes, offsets) of mono samples at SAMPLE_RATE"""
+    return landmarks(find_peaks(spectrogram(samples)))
+
+
+def fingerprint_audio(audio, max_seconds=None):
+    """Landmark (hashes, offsets) of a decoded pydub AudioSegment"""
+    return fingerprint_samples(audio_samples(audio, max_seconds))
+
+
+class FingerprintIndex:
+    """
+    Inverted index of landmark hashes in SQLite, shared by every worker process
+    on the host; recordings older than ttl seconds are forgotten
+    """
+
+    def __init__(self, path, ttl=86400, min_matches=20, min_score=0.2):
+        self.path = path
+        self.ttl = ttl
+        self.min_matches = min_matches
+        self.min_score = min_score
+        self.matches = 0
+        self.misses = 0
+        self._additions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS recordings ('
+                'id INTEGER PRIMARY KEY, audio_hash TEXT NOT NULL UNIQUE, '
+                'landmarks INTEGER NOT NULL, created_at REAL NOT NULL)'
+            )
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS landmarks ('
+                'hash INTEGER NOT NULL, recording INTEGER NOT NULL, offset INTEGER NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS landmarks_hash ON landmarks (hash)')
+            db.execute('CREATE INDEX IF NOT EXISTS landmarks_recording ON landmarks (recording)')
+            db.execute('CREATE INDEX IF NOT EXISTS recordings_created_at ON recordings (created_at)')
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection (safe across threads and processes)"""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def add(self, audio_hash, hashes, offsets):
+        """Index a recording's landmarks under its exact audio hash"""
+        if len(hashes) < self.min_matches:
+            return  # Too little audio to ever match reliably
+
+        with self._connect() as db:
+            if db.execute('SELECT 1 FROM recordings WHERE audio_hash = ?', (audio_hash,)).fetchone():
+                return
+            recording = db.execute(
+                'INSERT INTO recordings (audio_hash, landmarks, created_at) VALUES (?, ?, ?)',
+                (audio_hash, len(hashes), time.time())
+            ).lastrowid
+            db.executemany(
+                'INSERT INTO landmarks (hash, recording, offset) VALUES (?, ?, ?)',
+                zip(hashes.tolist(), [recording] * len(hashes), offsets.tolist())
+            )
+
+        with self._lock:
+            self._additions += 1
+            purge = self._additions % PURGE_EVERY == 0
+        if purge:
+            self._purge()
+
+    def match(self, hashes, offsets):
+        """
+        Find an indexed recording that shares enough time-aligned landmarks
+        Returns: (audio_hash, score) of the best match, or None
+        score is the share of the shorter recording's landmarks that line up
+        """
+        query = {}
+        for landmark, offset in zip(hashes.tolist(), offsets.tolist()):
+            query.setdefault(landmark, []).append(offset)
+
+        # Votes per (recording, time shift); a true match piles up on one shift
+        votes = Counter()
+        cutoff = time.time() - self.ttl
+        with self._connect() as db:
+            unique = list(query)
+            for start in range(0, len(unique), QUERY_CHUNK):
+                chunk = unique[start:start + QUERY_CHUNK]
+                rows = db.execute(
+                    f"SELECT l.hash, l.recording, l.offset FROM landmarks l "
+                    f"JOIN recordings r ON r.id = l.recording "
+                    f"WHERE l.hash IN ({', '.join('?' * len(chunk))}) AND r.created_at > ?",
+                    chunk + [cutoff]
+                )
+                for landmark, recording, offset in rows:
+                    for query_offset in query[landmark]:
+                        votes[recording, offset - query_offset] += 1
+
+            best = None
+            if votes:
+                # Re-encoding can move a peak by a frame; count the neighbouring shifts too
+                (recording, shift), _ = max(
+                    votes.items(),
+                    key=lambda item: item[1] + votes.get((item[0][0], item[0][1] - 1), 0)
+                    + votes.get((item[0][0], item[0][1] + 1), 0)
+                )
+                aligned = sum(votes.get((recording, shift + delta), 0) for delta in (-1, 0, 1))
+                row = db.execute(
+                    'SELECT audio_hash, landmarks FROM recordings WHERE id = ?', (recording,)
+                ).fetchone()
+                score = aligned / max(1, min(len(hashes), row[1]))
+                if aligned >= self.min_matches and score >= self.min_score:
+                    best = (row[0], round(score, 3))
+
+        with self._lock:
+            if best:
+                self.matches += 1
+            else:
+                self.misses += 1
+        return best
+
+    def _purge(self):
+        """Forget recordings older than ttl"""
+        cutoff = time.time() - self.ttl
+        with self._connect() as db:
+            db.execute(
+                'DELETE FROM landmarks WHERE recording IN '
+                '(SELECT id FROM recordings WHERE created_at <= ?)', (cutoff,)
+            )
+            db.execute('DELETE FROM recordings WHERE created_at <= ?', (cutoff,))
+
+    def stats(self):
+        """Return match counters for this process"""
+        with self._lock:
+            return {
+                'matches': self.matches,
+                'misses': self.misses
+            }
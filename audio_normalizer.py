@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Audio Normalizer
+Re-encodes bulky uploads (e.g. 48 kHz stereo WAV/FLAC) as mono 16 kHz speech
+audio before they are sent to Whisper
+Uploads are decoded straight to mono 16 kHz by ffmpeg, so a long or high-rate
+note never expands to full-rate PCM in memory
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from pydub import AudioSegment
+from pydub.exceptions import CouldntDecodeError
+from pydub.utils import mediainfo_json
+
+SPEECH_SAMPLE_RATE = 16000  # Whisper resamples to 16 kHz internally
+
+# Output formats Whisper accepts: (file extension, pydub export options)
+OUTPUT_FORMATS = {
+    'opus': ('ogg', {'format': 'ogg', 'codec': 'libopus', 'bitrate': '24k'}),
+    'mp3': ('mp3', {'format': 'mp3', 'bitrate': '32k'}),
+}
+
+
+def decode_speech(audio_file, max_seconds=None):
+    """
+    Decode an uploaded audio buffer to a mono 16 kHz AudioSegment, at most max_seconds long
+    Raises CouldntDecodeError when ffmpeg can't read it
+    """
+    # ffmpeg gets a real file: MP4/M4A keep their index at the end, which a pipe can't seek to
+    with tempfile.NamedTemporaryFile(prefix='decode-') as source:
+        try:
+            shutil.copyfileobj(audio_file, source)
+        finally:
+            audio_file.seek(0)
+        source.flush()
+
+        command = [AudioSegment.converter, '-nostdin', '-loglevel', 'error', '-i', source.name, '-vn',
+                   '-ac', '1', '-ar', str(SPEECH_SAMPLE_RATE)]
+        if max_seconds:
+            command += ['-t', str(max_seconds)]
+        command += ['-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1']
+        process = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True)
+    if process.returncode != 0:
+        raise CouldntDecodeError(process.stderr.decode('utf-8', 'replace').strip() or 'ffmpeg failed')
+    return AudioSegment(data=process.stdout, sample_width=2, frame_rate=SPEECH_SAMPLE_RATE, channels=1)
+
+
+def probe_bitrate(audio_file):
+    """Return the container bitrate in bits/second via ffprobe, or None if unknown"""
+    try:
+        return int(mediainfo_json(audio_file).get('format', {}).get('bit_rate', 0)) or None
+    except (ValueError, OSError):
+        return None
+    finally:
+        audio_file.seek(0)
+
+
+def normalize_audio(audio_file, output_format='opus', min_bitrate=64000, min_bytes=256 * 1024, decoded=None):
+    """
+    Convert an uploaded audio buffer to mono 16 kHz speech-optimized Opus/MP3
+    Skipped when the input is already compact (small, or at/below min_bitrate)
+    decoded is the whole upload from decode_speech(), if the caller already has it
+    Returns: (upload, stats) - upload is a (filename, bytes) tuple for Whisper,
+             or None to send the original file
+    """
+    started = time.perf_counter()
+    audio_file.seek(0, os.SEEK_END)
+    bytes_in = audio_file.tell()
+    audio_file.seek(0)
+    stats = {
+        'applied': False,
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_in,
+        'bytes_saved': 0,
+        'seconds': 0.0
+    }
+
+    bitrate = probe_bitrate(audio_file) if bytes_in >= min_bytes else None
+    if bitrate is None or bitrate <= min_bitrate:
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        return None, stats
+
+    extension, export_options = OUTPUT_FORMATS[output_format]
+
+    audio = decoded if decoded is not None else decode_speech(audio_file)
+    data = audio.export(io.BytesIO(), **export_options).getvalue()
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+
+    # Never send something bigger than what we were given
+    if len(data) >= bytes_in:
+        return None, stats
+
+    stats.update({
+        'applied': True,
+        'bytes_out': len(data),
+        'bytes_saved': bytes_in - len(data)
+    })
+    return (f'normalized.{extension}', data), stats
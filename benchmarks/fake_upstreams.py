@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Fake Upstreams
+Local stand-ins for the Whisper API, a LibreTranslate-compatible
+translation API and the WhatsApp Cloud (Graph) API, with configurable
+latency and error profiles
+
+Point the app at them with:
+    OPENAI_BASE_URL=http://127.0.0.1:8081/v1
+    TRANSLATE_BASE_URL=http://127.0.0.1:8082
+    WHATSAPP_GRAPH_URL=http://127.0.0.1:8083/v20.0
+
+Run standalone:
+    python benchmarks/fake_upstreams.py --whisper-latency 1.5 --error-rate 0.02
+"""
+
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from corpus import synth_speech, write_wav
+
+# Phrases the fake Whisper "hears" - repeated greetings, like real voice notes
+PHRASES = [
+    "How far, my brother?",
+    "Wetin dey happen for your side?",
+    "I dey come now now.",
+    "Abeg call me when you reach house.",
+    "E ku aaro, se daadaa ni?",
+    "Nna, kedu ka i mere?",
+    "Ina kwana, yaya aiki?",
+    "Make we see for evening.",
+    "No wahala, everything dey kampe.",
+    "Oga say make you send the document."
+]
+LANGUAGES = ['yoruba', 'igbo', 'hausa', 'english']
+
+
+class LatencyProfile:
+    """Base latency + per-megabyte cost + uniform jitter, and an error rate"""
+
+    def __init__(self, latency=0.5, per_mb=0.0, jitter=0.1, error_rate=0.0):
+        self.latency = latency
+        self.per_mb = per_mb
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def wait(self, body_bytes=0):
+        delay = self.latency + self.per_mb * body_bytes / (1024 * 1024)
+        delay += random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Shared plumbing for the fake servers"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real upstreams
+    profile = LatencyProfile()
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_failure(self):
+        # Mix of rate limiting and server errors, both retryable
+        status = random.choice([429, 500, 503])
+        self.send_json(status, {'error': {'message': 'fake upstream failure', 'code': status}})
+
+
+class FakeWhisperHandler(FakeHandler):
+    """POST /v1/audio/transcriptions returning a verbose_json response"""
+
+    def do_POST(self):
+        body = self.read_body()
+
+        if not self.path.rstrip('/').endswith('/audio/transcriptions'):
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        self.profile.wait(len(body))
+        if self.profile.should_fail():
+            self.send_failure()
+            return
+
+        # Roughly one phrase per two seconds of 16 kHz 16-bit mono audio
+        duration = max(1.0, len(body) / 32000.0)
+        count = max(1, int(duration / 2))
+        rng = random.Random(len(body))
+        phrases = [rng.choice(PHRASES) for _ in range(count)]
+
+        segments = []
+        for index, phrase in enumerate(phrases):
+            start = index * duration / count
+            segments.append({
+                'id': index,
+                'start': round(start, 2),
+                'end': round(start + duration / count, 2),
+                'text': ' ' + phrase
+            })
+
+        self.send_json(200, {
+            'task': 'transcribe',
+            'language': rng.choice(LANGUAGES),
+            'duration': round(duration, 2),
+            'text': ' '.join(phrases),
+            'segments': segments
+        })
+
+
+class FakeTranslateHandler(FakeHandler):
+    """LibreTranslate-compatible POST /translate and POST /detect"""
+
+    def do_POST(self):
+        body = self.read_body()
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': 'invalid json'})
+            return
+
+        self.profile.wait(len(body))
+        if self.profile.should_fail():
+            self.send_failure()
+            return
+
+        path = self.path.rstrip('/')
+        if path == '/translate':
+            texts = payload.get('q', '')
+            target = payload.get('target', 'en')
+            translate = lambda text: f'[{target}] ' + re.sub(r'\s+', ' ', text).strip()
+            if isinstance(texts, list):
+                self.send_json(200, {'translatedText': [translate(t) for t in texts]})
+            else:
+                self.send_json(200, {'translatedText': translate(texts)})
+        elif path == '/detect':
+            self.send_json(200, [{'language': 'yo', 'confidence': 90.0}])
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+
+class FakeGraphHandler(FakeHandler):
+    """
+    WhatsApp Cloud API: GET /<version>/<media id> (media URL), GET /media/<media id>
+    (the audio), POST /<version>/<phone number id>/messages (recorded in sent)
+    Register audio in media[media id] = (mime type, bytes); unknown ids get a synthetic clip
+    """
+
+    media = {}
+    sent = []
+    sent_lock = threading.Lock()
+
+    def authorized(self):
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.send_json(401, {'error': {'message': 'missing access token', 'code': 190}})
+            return False
+        return True
+
+    def media_entry(self, media_id):
+        if media_id not in self.media:
+            buffer = io.BytesIO()
+            write_wav(buffer, synth_speech(5, seed=sum(media_id.encode())))
+            self.media[media_id] = ('audio/wav', buffer.getvalue())
+        return self.media[media_id]
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if not self.authorized():
+            return
+        if len(parts) != 2:
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        self.profile.wait()
+        if self.profile.should_fail():
+            self.send_failure()
+            return
+
+        mime_type, data = self.media_entry(parts[1])
+        if parts[0] == 'media':
+            self.send_response(200)
+            self.send_header('Content-Type', mime_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            host, port = self.server.server_address[:2]
+            self.send_json(200, {
+                'id': parts[1],
+                'url': f'http://{host}:{port}/media/{parts[1]}',
+                'mime_type': mime_type,
+                'file_size': len(data),
+                'messaging_product': 'whatsapp'
+            })
+
+    def do_POST(self):
+        body = self.read_body()
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if not self.authorized():
+            return
+        if len(parts) != 3 or parts[2] != 'messages':
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        self.profile.wait(len(body))
+        if self.profile.should_fail():
+            self.send_failure()
+            return
+
+        message = json.loads(body or b'{}')
+        with self.sent_lock:
+            self.sent.append({'phone_number_id': parts[1], 'received_at': time.time(), **message})
+            message_id = f'wamid.fake.{len(self.sent)}'
+        self.send_json(200, {
+            'messaging_product': 'whatsapp',
+            'contacts': [{'input': message.get('to'), 'wa_id': message.get('to')}],
+            'messages': [{'id': message_id}]
+        })
+
+
+def start_server(handler, profile, host='127.0.0.1', port=0):
+    """Start a fake server on a background thread; returns the server (port 0 = any free port)"""
+    handler_class = type(handler.__name__, (handler,), {'profile': profile})
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_url(server, path=''):
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}{path}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run fake Whisper and translation servers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--whisper-port', type=int, default=8081)
+    parser.add_argument('--translate-port', type=int, default=8082)
+    parser.add_argument('--graph-port', type=int, default=8083)
+    parser.add_argument('--whisper-latency', type=float, default=1.0, help='base seconds per call')
+    parser.add_argument('--whisper-per-mb', type=float, default=0.5, help='extra seconds per MB uploaded')
+    parser.add_argument('--translate-latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 429/5xx')
+    args = parser.parse_args()
+
+    whisper = start_server(
+        FakeWhisperHandler,
+        LatencyProfile(args.whisper_latency, args.whisper_per_mb, args.jitter, args.error_rate),
+        args.host, args.whisper_port
+    )
+    translate = start_server(
+        FakeTranslateHandler,
+        LatencyProfile(args.translate_latency, 0.0, args.jitter, args.error_rate),
+        args.host, args.translate_port
+    )
+
+    graph = start_server(
+        FakeGraphHandler,
+        LatencyProfile(0.05, 0.0, args.jitter, args.error_rate),
+        args.host, args.graph_port
+    )
+
+    print(f"Fake Whisper:    OPENAI_BASE_URL={server_url(whisper, '/v1')}")
+    print(f"Fake translator: TRANSLATE_BASE_URL={server_url(translate)}")
+    print(f"Fake Graph API:  WHATSAPP_GRAPH_URL={server_url(graph, '/v20.0')}")
+    print("Press CTRL+C to stop")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
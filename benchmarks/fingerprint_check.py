@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Fingerprint Check
+Indexes a few synthetic voice notes with the default match thresholds, then
+fails if a different recording is taken for one of them (which would hand its
+caller someone else's transcript), or if a trimmed, quieter copy of an indexed
+note is no longer recognized
+
+Examples:
+    python benchmarks/fingerprint_check.py
+"""
+
+import os
+import sys
+import tempfile
+
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_fingerprint import FingerprintIndex, fingerprint_audio  # noqa: E402
+from corpus import SAMPLE_RATE, synth_speech  # noqa: E402
+
+INDEXED_SEEDS = range(5)
+DISTINCT_SEEDS = range(100, 110)
+SECONDS = 20
+
+
+def voice_note(seed):
+    """A synthetic recording as a decoded AudioSegment, like the app gets from pydub"""
+    return AudioSegment(
+        data=synth_speech(SECONDS, seed).tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=1
+    )
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        index = FingerprintIndex(os.path.join(directory, 'fingerprints.sqlite3'))
+        notes = {}
+        for seed in INDEXED_SEEDS:
+            notes[seed] = voice_note(seed)
+            index.add(f'note-{seed}', *fingerprint_audio(notes[seed]))
+
+        print('=' * 70)
+        print(f'min_matches={index.min_matches} min_score={index.min_score}')
+        for seed in DISTINCT_SEEDS:
+            match = index.match(*fingerprint_audio(voice_note(seed)))
+            if match:
+                failures.append(f'distinct recording {seed} matched {match[0]} ({match[1]})')
+            print(f"{'FAIL' if match else 'ok  '} distinct seed={seed}  match={match}")
+
+        for seed, note in notes.items():
+            # Another app cut the first 370 ms and normalized the volume down
+            match = index.match(*fingerprint_audio(note[370:] - 6))
+            ok = bool(match) and match[0] == f'note-{seed}'
+            if not ok:
+                failures.append(f'copy of note-{seed} not recognized ({match})')
+            print(f"{'ok  ' if ok else 'FAIL'} copy     seed={seed}  match={match}")
+        print('=' * 70)
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
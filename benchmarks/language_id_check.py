@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Language ID Check
+Runs the bundled n-gram model on transcripts in languages it was not trained on
+(with the label Whisper gives them) and on Nigerian languages Whisper mislabels;
+fails if a foreign transcript would be treated as English, or if the local
+classifier stops correcting Whisper where it should
+
+Examples:
+    python benchmarks/language_id_check.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_id import canonical_language, identify_language, resolve_language  # noqa: E402
+
+# (transcript, Whisper's label, language the pipeline must settle on)
+CASES = [
+    ("Bonjour, je voulais savoir si tu es bien rentré à la maison hier soir.", 'french', 'fr'),
+    ("Hola, quería saber si llegaste bien a casa anoche, llámame cuando puedas.", 'spanish', 'es'),
+    ("Ciao, volevo sapere se sei arrivato a casa ieri sera, chiamami quando puoi.", 'italian', 'it'),
+    ("Olá, queria saber se chegaste bem a casa ontem à noite, liga-me quando puderes.", 'portuguese', 'pt'),
+    ("Habari yako, nilitaka kujua kama ulifika nyumbani salama jana usiku.", 'swahili', 'sw'),
+    ("Guten Abend, ich wollte fragen, ob du gestern gut nach Hause gekommen bist.", 'german', 'de'),
+    ("How you dey? I wan confirm say you don reach house, abeg call me when you fit.", 'english', 'pcm'),
+    ("Hello, I wanted to check that you got home safely last night. Call me later.", 'english', 'en'),
+]
+
+
+def main():
+    failures = []
+    print('=' * 70)
+    for text, whisper_language, expected in CASES:
+        local_language, confidence = identify_language(text)
+        language, _, _ = resolve_language(text, whisper_language)
+        resolved = canonical_language(language)
+        ok = resolved == expected
+        if not ok:
+            failures.append(f'{whisper_language} -> {resolved} (expected {expected})')
+        print(f"{'ok  ' if ok else 'FAIL'} whisper={whisper_language:<10} model={local_language} {confidence:.2f}"
+              f"  resolved={resolved}")
+    print('=' * 70)
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
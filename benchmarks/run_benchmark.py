@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Voice Note Translator Benchmark
+Runs app.py under gunicorn against local fake Whisper/translation servers,
+replays a synthetic audio corpus and reports throughput, latency percentiles
+and memory per worker - no API keys, no API spend
+
+Examples:
+    python benchmarks/run_benchmark.py
+    python benchmarks/run_benchmark.py --workers 4 --concurrency 32 --requests 500
+    python benchmarks/run_benchmark.py --error-rate 0.05 --json-out results.json
+    python benchmarks/run_benchmark.py --baseline results.json --max-regression 0.10
+    python benchmarks/run_benchmark.py --asgi --workers 1 --concurrency 200
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import build_corpus  # noqa: E402
+from fake_upstreams import (  # noqa: E402
+    FakeTranslateHandler, FakeWhisperHandler, LatencyProfile, server_url, start_server
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def multipart_body(field, filename, data, fields=None):
+    """Encode a multipart/form-data body; returns (body, content type)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: audio/wav\r\n\r\n'.encode()
+    )
+    parts.append(data)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def perturb(data, rng):
+    """Flip one sample in the WAV data so every request misses the content-addressed caches"""
+    data = bytearray(data)
+    offset = 44 + 2 * rng.randrange((len(data) - 44) // 2)
+    data[offset:offset + 2] = rng.randrange(-200, 200).to_bytes(2, 'little', signed=True)
+    return bytes(data)
+
+
+def worker_pids(master_pid):
+    """PIDs of the gunicorn workers (children of the master process)"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            if int(fields[1]) == master_pid:
+                pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return pids
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+class MemorySampler(threading.Thread):
+    """Samples the peak RSS of each gunicorn worker while the load runs"""
+
+    def __init__(self, master_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            for pid in worker_pids(self.master_pid):
+                self.peak[pid] = max(self.peak.get(pid, 0.0), rss_mb(pid))
+            self.stopped.wait(self.interval)
+
+
+def start_gunicorn(args, port, env):
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--config', os.path.join(REPO_ROOT, 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers),
+        '--worker-class', args.worker_class,
+        '--log-level', 'warning',
+        args.app
+    ]
+    if args.threads:
+        command[-1:-1] = ['--threads', str(args.threads)]
+
+    log = open(os.path.join(env['BENCH_TMP'], 'gunicorn.log'), 'wb')
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup (see gunicorn.log)')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError('gunicorn did not become ready in time')
+
+
+def run_load(args, port, corpus):
+    """Fire args.requests uploads with args.concurrency clients; returns per-request records"""
+    local = threading.local()
+    rng_lock = threading.Lock()
+    rng = random.Random(args.seed)
+    records = []
+
+    def one_request(index):
+        with rng_lock:
+            path, data = corpus[index % len(corpus)]
+            if not args.allow_cache_hits:
+                data = perturb(data, rng)
+
+        body, content_type = multipart_body('audio', os.path.basename(path), data, {'language': 'auto'})
+
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=args.timeout)
+
+        started = time.perf_counter()
+        try:
+            local.connection.request('POST', args.endpoint, body=body, headers={
+                'Content-Type': content_type,
+                'Content-Length': str(len(body))
+            })
+            response = local.connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            local.connection.close()
+            del local.connection
+            status = 0
+        return {'latency': time.perf_counter() - started, 'status': status, 'bytes': len(data)}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        records = list(executor.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return records, elapsed
+
+
+def summarize(args, records, elapsed, memory):
+    ok = [r['latency'] for r in records if r['status'] == 200]
+    statuses = {}
+    for record in records:
+        statuses[str(record['status'])] = statuses.get(str(record['status']), 0) + 1
+
+    return {
+        'config': {
+            'app': args.app,
+            'worker_class': args.worker_class,
+            'workers': args.workers,
+            'threads': args.threads,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'endpoint': args.endpoint,
+            'whisper_latency': args.whisper_latency,
+            'translate_latency': args.translate_latency,
+            'error_rate': args.error_rate
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'requests_per_second_per_worker': round(len(ok) / elapsed / args.workers, 2) if elapsed else 0.0,
+        'latency_p50': round(percentile(ok, 0.50), 4),
+        'latency_p95': round(percentile(ok, 0.95), 4),
+        'latency_p99': round(percentile(ok, 0.99), 4),
+        'status_counts': statuses,
+        'audio_mb_sent': round(sum(r['bytes'] for r in records) / (1024 * 1024), 2),
+        'worker_peak_rss_mb': sorted(round(v, 1) for v in memory.values()),
+        'worker_mean_rss_mb': round(sum(memory.values()) / len(memory), 1) if memory else 0.0
+    }
+
+
+def print_report(result):
+    config = result['config']
+    print('=' * 70)
+    print(f"Benchmark: {config['app']} ({config['worker_class']}, {config['workers']} workers) "
+          f"-> {config['endpoint']}")
+    print(f"Load: {config['requests']} requests, concurrency {config['concurrency']}")
+    print('-' * 70)
+    print(f"Throughput:   {result['requests_per_second']} req/s (successful), "
+          f"{result['requests_per_second_per_worker']} req/s per worker")
+    print(f"Latency:      p50 {result['latency_p50']}s   p95 {result['latency_p95']}s   "
+          f"p99 {result['latency_p99']}s")
+    print(f"Status codes: {result['status_counts']}")
+    print(f"Worker RSS:   mean {result['worker_mean_rss_mb']} MB, peak per worker "
+          f"{result['worker_peak_rss_mb']}")
+    print('=' * 70)
+
+
+def check_regression(result, baseline_path, max_regression):
+    """Compare against a previous --json-out file; returns a list of failures"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    failures = []
+    if result['requests_per_second'] < baseline['requests_per_second'] * (1 - max_regression):
+        failures.append(f"throughput {result['requests_per_second']} < baseline "
+                        f"{baseline['requests_per_second']}")
+    for key in ('latency_p50', 'latency_p95', 'latency_p99'):
+        if result[key] > baseline[key] * (1 + max_regression):
+            failures.append(f"{key} {result[key]} > baseline {baseline[key]}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API against fake upstreams')
+    parser.add_argument('--app', default='app:app', help='WSGI/ASGI application to serve')
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--asgi', action='store_true',
+                        help='serve asgi:app on uvicorn workers (same as --app asgi:app '
+                             '--worker-class uvicorn.workers.UvicornWorker)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=0, help='gunicorn --threads (gthread workers)')
+    parser.add_argument('--endpoint', default='/api/translate')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--durations', default='5,10,20,40,90',
+                        help='comma-separated corpus clip lengths in seconds')
+    parser.add_argument('--whisper-latency', type=float, default=1.0)
+    parser.add_argument('--whisper-per-mb', type=float, default=0.5)
+    parser.add_argument('--translate-latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--allow-cache-hits', action='store_true',
+                        help='replay identical bytes (measures the caches instead of the pipeline)')
+    parser.add_argument('--no-normalize', action='store_true', help='set AUDIO_NORMALIZE=false')
+    parser.add_argument('--timeout', type=float, default=180)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'voice_translator_corpus'))
+    parser.add_argument('--json-out', help='write the results as JSON')
+    parser.add_argument('--baseline', help='previous --json-out file to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.10)
+    args = parser.parse_args()
+    if args.asgi:
+        args.app = 'asgi:app'
+        args.worker_class = 'uvicorn.workers.UvicornWorker'
+
+    durations = [float(d) for d in args.durations.split(',') if d]
+    print(f"Building corpus ({len(durations)} clips) in {args.corpus_dir}...")
+    corpus = []
+    for path in build_corpus(args.corpus_dir, durations):
+        with open(path, 'rb') as f:
+            corpus.append((path, f.read()))
+
+    whisper = start_server(FakeWhisperHandler, LatencyProfile(
+        args.whisper_latency, args.whisper_per_mb, args.jitter, args.error_rate))
+    translate = start_server(FakeTranslateHandler, LatencyProfile(
+        args.translate_latency, 0.0, args.jitter, args.error_rate))
+
+    bench_tmp = tempfile.mkdtemp(prefix='voice_translator_bench_')
+    env = dict(os.environ)
+    env.update({
+        'BENCH_TMP': bench_tmp,
+        'OPENAI_API_KEY': 'benchmark-key',
+        'OPENAI_BASE_URL': server_url(whisper, '/v1'),
+        'TRANSLATE_BASE_URL': server_url(translate),
+        'RATELIMIT_ENABLED': 'false',
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(bench_tmp, 'metrics'),
+        'JOB_STORE_PATH': os.path.join(bench_tmp, 'jobs.sqlite3'),
+        'HISTORY_PATH': os.path.join(bench_tmp, 'history.sqlite3'),
+        'FINGERPRINT_INDEX_PATH': os.path.join(bench_tmp, 'fingerprints.sqlite3'),
+        'SINGLE_FLIGHT_DIR': os.path.join(bench_tmp, 'single_flight'),
+        'ADMISSION_DIR': os.path.join(bench_tmp, 'admission'),
+    })
+    env.pop('TRANSCRIPTION_CACHE_DIR', None)
+    env.pop('TRANSLATION_MEMORY_PATH', None)
+    if args.no_normalize:
+        env['AUDIO_NORMALIZE'] = 'false'
+    if not args.allow_cache_hits:
+        # Perturbed uploads sound identical, so the fingerprint index would serve them all
+        env['FINGERPRINT_ENABLED'] = 'false'
+
+    port = free_port()
+    process = start_gunicorn(args, port, env)
+    try:
+        wait_until_ready(port, process)
+
+        sampler = MemorySampler(process.pid)
+        sampler.start()
+        records, elapsed = run_load(args, port, corpus)
+        sampler.stopped.set()
+        sampler.join()
+
+        result = summarize(args, records, elapsed, sampler.peak)
+        print_report(result)
+
+        if args.json_out:
+            with open(args.json_out, 'w') as f:
+                json.dump(result, f, indent=2)
+
+        if args.baseline:
+            failures = check_regression(result, args.baseline, args.max_regression)
+            if failures:
+                print('REGRESSION: ' + '; '.join(failures))
+                sys.exit(1)
+            print(f"No regression beyond {int(args.max_regression * 100)}% of baseline")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        whisper.shutdown()
+        translate.shutdown()
+        shutil.rmtree(bench_tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Translation Batch Check
+Translates long transcripts (one huge unpunctuated segment, many sentences, a
+single giant word) through the translation memory with a recording fake
+translator; fails if any request exceeds the batch size limit, if a text comes
+back out of order, or if a translator that merges lines in big batches makes it
+fall back to one request per text
+
+Examples:
+    python benchmarks/translation_batch_check.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translation_memory import TranslationMemory  # noqa: E402
+from upstream import TranslatedText  # noqa: E402
+
+LIMIT = 200
+
+
+class RecordingTranslator:
+    """Upper-cases text and records each request; merges two lines of batches over merge_over lines"""
+
+    def __init__(self, merge_over=0):
+        self.merge_over = merge_over
+        self.requests = []
+
+    def translate(self, text, dest='en', src='auto'):
+        self.requests.append(text)
+        lines = text.upper().split('\n')
+        if self.merge_over and len(lines) > self.merge_over:
+            lines[:2] = [lines[0] + ' ' + lines[1]]
+        return TranslatedText('\n'.join(lines), src, dest, text)
+
+
+def words(rng, count):
+    return ' '.join(''.join(rng.choice('abcdefghij') for _ in range(rng.randint(2, 9))) for _ in range(count))
+
+
+def main():
+    rng = random.Random(0)
+    cases = {
+        'unpunctuated segment': [{'text': words(rng, 400)}],
+        'many sentences': [{'text': '. '.join(words(rng, 12) for _ in range(60)) + '.'}],
+        'giant word': [{'text': 'x' * (LIMIT * 3 + 7)}, {'text': 'short one'}],
+        'many segments': [{'text': words(rng, rng.randint(1, 30))} for _ in range(80)],
+        'many short segments': [{'text': words(rng, rng.randint(1, 4))} for _ in range(200)],
+    }
+
+    failures = []
+    print('=' * 70)
+    for name, segments in cases.items():
+        clean_requests = 0
+        for merge_over in (0, 8):
+            translator = RecordingTranslator(merge_over)
+            memory = TranslationMemory(max_batch_chars=LIMIT)
+            _, translated = memory.translate_segments(translator, segments)
+
+            longest = max(len(request) for request in translator.requests)
+            # Pieces of a cut word are rejoined with a space, so compare without whitespace
+            texts_ok = all(
+                ''.join(item['translation'].split()) == ''.join(item['text'].upper().split())
+                for item in translated
+            )
+            ok = longest <= LIMIT and texts_ok
+            if merge_over:
+                # Halving a merged batch costs a few extra requests, not one per text
+                ok = ok and len(translator.requests) <= 3 * clean_requests
+            else:
+                clean_requests = len(translator.requests)
+            if not ok:
+                failures.append(f'{name} (merge_over={merge_over})')
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<22} merge={merge_over}  requests={len(translator.requests):>3}"
+                  f"  longest={longest:>3}/{LIMIT}  in order={texts_ok}")
+    print('=' * 70)
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Webhook Flow Test
+Runs app.py under gunicorn against fake Whisper, translation and Graph API
+servers, delivers signed webhook notifications for synthetic voice notes
+(with Meta-style redeliveries) and checks that every note gets exactly one reply
+Reports webhook ack latency and time until the reply was sent
+
+Examples:
+    python benchmarks/whatsapp_flow.py
+    python benchmarks/whatsapp_flow.py --messages 200 --redeliveries 0.5 --concurrency 32
+"""
+
+import argparse
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import build_corpus  # noqa: E402
+from fake_upstreams import (  # noqa: E402
+    FakeGraphHandler, FakeTranslateHandler, FakeWhisperHandler, LatencyProfile, server_url, start_server
+)
+from run_benchmark import free_port, percentile, perturb, start_gunicorn, wait_until_ready  # noqa: E402
+
+APP_SECRET = 'flow-app-secret'
+VERIFY_TOKEN = 'flow-verify-token'
+PHONE_NUMBER_ID = '100000000000001'
+
+
+def notification(message_id, sender, media_id):
+    """Webhook body for one incoming voice note, shaped like the Cloud API's"""
+    return {
+        'object': 'whatsapp_business_account',
+        'entry': [{
+            'id': 'WHATSAPP_BUSINESS_ACCOUNT_ID',
+            'changes': [{
+                'field': 'messages',
+                'value': {
+                    'messaging_product': 'whatsapp',
+                    'metadata': {'display_phone_number': '15550000000', 'phone_number_id': PHONE_NUMBER_ID},
+                    'contacts': [{'profile': {'name': 'Test'}, 'wa_id': sender}],
+                    'messages': [{
+                        'from': sender,
+                        'id': message_id,
+                        'timestamp': str(int(time.time())),
+                        'type': 'audio',
+                        'audio': {'id': media_id, 'mime_type': 'audio/wav', 'voice': True}
+                    }]
+                }
+            }]
+        }]
+    }
+
+
+def deliver(port, payload, secret=APP_SECRET):
+    """POST a signed notification; returns (status, seconds until the ack)"""
+    body = json.dumps(payload).encode('utf-8')
+    signature = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('POST', '/api/whatsapp/webhook', body=body, headers={
+        'Content-Type': 'application/json',
+        'X-Hub-Signature-256': signature
+    })
+    status = connection.getresponse().status
+    connection.close()
+    return status, time.perf_counter() - started
+
+
+def check_handshake(port):
+    """Meta's GET verification must echo the challenge, and refuse a wrong token"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('GET', f'/api/whatsapp/webhook?hub.mode=subscribe&hub.verify_token={VERIFY_TOKEN}'
+                              f'&hub.challenge=1158201444')
+    response = connection.getresponse()
+    echoed = response.status == 200 and response.read() == b'1158201444'
+    connection.request('GET', '/api/whatsapp/webhook?hub.mode=subscribe&hub.verify_token=wrong&hub.challenge=1')
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return echoed and response.status == 403
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end WhatsApp webhook test against fake upstreams')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--messages', type=int, default=40, help='distinct voice notes')
+    parser.add_argument('--redeliveries', type=float, default=0.3,
+                        help='fraction of notifications delivered a second time')
+    parser.add_argument('--concurrency', type=int, default=8, help='webhook deliveries in flight')
+    parser.add_argument('--whisper-latency', type=float, default=1.0)
+    parser.add_argument('--translate-latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--reply-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'voice_translator_corpus'))
+    args = parser.parse_args()
+    args.app = 'app:app'
+    rng = random.Random(args.seed)
+
+    with open(build_corpus(args.corpus_dir, [5.0])[0], 'rb') as f:
+        clip = f.read()
+
+    whisper = start_server(FakeWhisperHandler, LatencyProfile(args.whisper_latency, 0.0, args.jitter, args.error_rate))
+    translate = start_server(FakeTranslateHandler, LatencyProfile(args.translate_latency, 0.0, args.jitter, args.error_rate))
+    graph = start_server(FakeGraphHandler, LatencyProfile(0.05, 0.0, args.jitter, args.error_rate))
+
+    # Every note has different bytes so it is really transcribed
+    deliveries = []
+    for index in range(args.messages):
+        message_id = f'wamid.flow.{index}'
+        FakeGraphHandler.media[f'media-{index}'] = ('audio/wav', perturb(clip, rng))
+        deliveries.append(notification(message_id, f'234800000{index:04d}', f'media-{index}'))
+    redelivered = rng.sample(deliveries, int(len(deliveries) * args.redeliveries))
+    deliveries += redelivered
+    rng.shuffle(deliveries)
+
+    bench_tmp = tempfile.mkdtemp(prefix='voice_translator_whatsapp_')
+    env = dict(os.environ)
+    env.update({
+        'BENCH_TMP': bench_tmp,
+        'OPENAI_API_KEY': 'flow-key',
+        'OPENAI_BASE_URL': server_url(whisper, '/v1'),
+        'TRANSLATE_BASE_URL': server_url(translate),
+        'WHATSAPP_GRAPH_URL': server_url(graph, '/v20.0'),
+        'WHATSAPP_ACCESS_TOKEN': 'flow-access-token',
+        'WHATSAPP_APP_SECRET': APP_SECRET,
+        'WHATSAPP_VERIFY_TOKEN': VERIFY_TOKEN,
+        'WHATSAPP_MESSAGE_LOG_PATH': os.path.join(bench_tmp, 'whatsapp.sqlite3'),
+        'RATELIMIT_ENABLED': 'false',
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(bench_tmp, 'metrics'),
+        'JOB_STORE_PATH': os.path.join(bench_tmp, 'jobs.sqlite3'),
+        'HISTORY_PATH': os.path.join(bench_tmp, 'history.sqlite3'),
+        'FINGERPRINT_ENABLED': 'false',
+        'SINGLE_FLIGHT_DIR': os.path.join(bench_tmp, 'single_flight'),
+        'ADMISSION_DIR': os.path.join(bench_tmp, 'admission'),
+    })
+    env.pop('TRANSCRIPTION_CACHE_DIR', None)
+
+    port = free_port()
+    process = start_gunicorn(args, port, env)
+    failures = []
+    try:
+        wait_until_ready(port, process)
+        if not check_handshake(port):
+            failures.append('verification handshake')
+        if deliver(port, deliveries[0], secret='wrong-secret')[0] != 401:
+            failures.append('unsigned delivery was accepted')
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            acks = list(pool.map(lambda payload: deliver(port, payload), deliveries))
+
+        statuses = {}
+        for status, _ in acks:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        # Replies arrive asynchronously; wait for one per distinct note
+        deadline = time.time() + args.reply_timeout
+        while len(FakeGraphHandler.sent) < args.messages and time.time() < deadline:
+            time.sleep(0.25)
+        time.sleep(1.0)  # Give stray duplicate replies a chance to show up
+
+        replied = {}
+        for message in FakeGraphHandler.sent:
+            replied.setdefault(message.get('context', {}).get('message_id'), []).append(message)
+        reply_seconds = [messages[0]['received_at'] - started for messages in replied.values()]
+        duplicates = sum(len(messages) - 1 for messages in replied.values())
+        missing = args.messages - len(replied)
+        if missing:
+            failures.append(f'{missing} notes got no reply')
+        if duplicates:
+            failures.append(f'{duplicates} duplicate replies')
+
+        ack_seconds = [seconds for _, seconds in acks]
+        print('=' * 70)
+        print(f"WhatsApp flow: {args.messages} notes, {len(redelivered)} redelivered, "
+              f"{args.workers} {args.worker_class} workers")
+        print('-' * 70)
+        print(f"Webhook acks: {statuses}  p50 {percentile(ack_seconds, 0.5) * 1000:.1f}ms  "
+              f"p99 {percentile(ack_seconds, 0.99) * 1000:.1f}ms")
+        print(f"Replies:      {len(replied)}/{args.messages}  duplicates {duplicates}  "
+              f"last after {max(reply_seconds or [0]):.1f}s")
+        print(f"Sample reply: {FakeGraphHandler.sent[0]['text']['body'] if FakeGraphHandler.sent else '-'}")
+        print('=' * 70)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        whisper.shutdown()
+        translate.shutdown()
+        graph.shutdown()
+        shutil.rmtree(bench_tmp, ignore_errors=True)
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
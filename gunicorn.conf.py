@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for the Voice Note Translator API
+Prepares the shared Prometheus metrics directory so /metrics aggregates every worker
+"""
+
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+
+def on_starting(server):
+    """Start every deployment with an empty metrics directory"""
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop live gauges of workers that have exited"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
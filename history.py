@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Translation History
+Every translation result, kept in SQLite so past voice notes can be listed and
+searched without re-uploading them
+Writes are queued and committed in batches by a background thread, off the
+request path; reads page through results by id (keyset pagination)
+Entries older than the retention period are pruned by the same thread
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import log
+
+MAX_PAGE_SIZE = 100
+PRUNE_INTERVAL = 3600  # seconds between retention sweeps
+
+# Columns returned in history listings (the full payload is only returned per entry)
+SUMMARY_COLUMNS = (
+    'id', 'created_at', 'audio_hash', 'filename', 'source_language',
+    'detected_language', 'original_text', 'translated_text'
+)
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class HistoryStore:
+    """
+    Translation results in SQLite, shared by every worker process on the host
+    record() only queues the entry; a writer thread commits up to batch_size
+    entries per transaction. Entries are dropped (and counted) when the queue is full
+    retention is in seconds (0 = keep forever)
+    """
+
+    def __init__(self, path, queue_size=1000, batch_size=100, retention=0):
+        self.path = path
+        self.batch_size = batch_size
+        self.retention = retention
+        self.written = 0
+        self.dropped = 0
+        self.pruned = 0
+        self._last_prune = 0.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS history ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, '
+                'audio_hash TEXT, filename TEXT, source_language TEXT, detected_language TEXT, '
+                'original_text TEXT NOT NULL, translated_text TEXT, payload TEXT NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS history_audio_hash ON history (audio_hash)')
+            db.execute('CREATE INDEX IF NOT EXISTS history_language ON history (detected_language, id)')
+            db.execute('CREATE INDEX IF NOT EXISTS history_created_at ON history (created_at)')
+
+            # Full-text index over both texts, kept in sync by triggers
+            db.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5('
+                'original_text, translated_text, content=history, content_rowid=id, '
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            db.execute(
+                'CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN '
+                'INSERT INTO history_fts (rowid, original_text, translated_text) '
+                'VALUES (new.id, new.original_text, new.translated_text); END'
+            )
+            db.execute(
+                'CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN '
+                "INSERT INTO history_fts (history_fts, rowid, original_text, translated_text) "
+                "VALUES ('delete', old.id, old.original_text, old.translated_text); END"
+            )
+
+        self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self._writer.start()
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection (safe across threads and processes)"""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def record(self, payload, audio_hash=None, filename=None, source_language=None):
+        """Queue a successful translation payload for storage; never blocks"""
+        entry = (
+            time.time(), audio_hash, filename, source_language,
+            payload.get('detected_language'), payload.get('original_text') or '',
+            payload.get('translated_text'), json.dumps(payload, ensure_ascii=False)
+        )
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until queued entries are written (e.g. at shutdown)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _write_loop(self):
+        """Commit queued entries in batches, one transaction per batch"""
+        while True:
+            try:
+                batch = [self._queue.get(timeout=PRUNE_INTERVAL)]
+            except queue.Empty:
+                self._maybe_prune()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self._connect() as db:
+                    db.executemany(
+                        'INSERT INTO history (created_at, audio_hash, filename, source_language, '
+                        'detected_language, original_text, translated_text, payload) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        batch
+                    )
+                with self._lock:
+                    self.written += len(batch)
+            except sqlite3.Error as e:
+                log('warning', 'history write failed', entries=len(batch), error=str(e))
+                with self._lock:
+                    self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            self._maybe_prune()
+
+    def _maybe_prune(self):
+        """Run prune() at most once per PRUNE_INTERVAL"""
+        if self.retention and time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            self.prune()
+
+    def prune(self):
+        """Delete entries older than the retention period; returns how many were removed"""
+        if not self.retention:
+            return 0
+        try:
+            with self._connect() as db:
+                removed = db.execute(
+                    'DELETE FROM history WHERE created_at < ?', (time.time() - self.retention,)
+                ).rowcount
+        except sqlite3.Error as e:
+            log('warning', 'history prune failed', error=str(e))
+            return 0
+        with self._lock:
+            self.pruned += removed
+        return removed
+
+    def page(self, limit=20, cursor=None, search=None, language=None, audio_hash=None):
+        """
+        Newest entries first, limit per page
+        cursor is the next_cursor of the previous page; search is full-text over
+        the original and translated text
+        Returns: (entries, next_cursor or None on the last page)
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        columns = ', '.join(f'h.{column}' for column in SUMMARY_COLUMNS)
+        tables = 'history h'
+        conditions = []
+        params = []
+
+        if search and fts_query(search):
+            tables += ' JOIN history_fts ON history_fts.rowid = h.id'
+            conditions.append('history_fts MATCH ?')
+            params.append(fts_query(search))
+        if language:
+            conditions.append('h.detected_language = ?')
+            params.append(language)
+        if audio_hash:
+            conditions.append('h.audio_hash = ?')
+            params.append(audio_hash)
+        if cursor is not None:
+            conditions.append('h.id < ?')
+            params.append(cursor)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._connect() as db:
+            rows = db.execute(
+                f'SELECT {columns} FROM {tables} {where} ORDER BY h.id DESC LIMIT ?',
+                params + [limit + 1]
+            ).fetchall()
+
+        entries = [dict(zip(SUMMARY_COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = entries[-1]['id'] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def get(self, entry_id):
+        """Return one entry with its full translation payload, or None"""
+        with self._connect() as db:
+            row = db.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)}, payload FROM history WHERE id = ?",
+                (entry_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        entry = dict(zip(SUMMARY_COLUMNS, row))
+        entry['result'] = json.loads(row[-1])
+        return entry
+
+    def stats(self):
+        """Return write counters for this process"""
+        with self._lock:
+            return {
+                'written': self.written,
+                'dropped': self.dropped,
+                'pruned': self.pruned,
+                'retention_seconds': self.retention,
+                'queued': self._queue.qsize()
+            }
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Background Jobs
+Job store shared by all gunicorn workers (SQLite) and a bounded worker pool
+so long Whisper calls don't pin request workers
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from tracing import log
+
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class JobStore:
+    """Job status and results, visible to every worker process on the host"""
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL, result TEXT)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)')
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection (safe across threads and processes)"""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def create(self):
+        """Register a new queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._connect() as db:
+            # Drop finished jobs nobody came back for
+            db.execute('DELETE FROM jobs WHERE updated_at < ?', (now - self.ttl,))
+            db.execute(
+                'INSERT INTO jobs (id, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                (job_id, JOB_QUEUED, now, now)
+            )
+        return job_id
+
+    def update(self, job_id, status, result=None):
+        """Move a job to a new status, optionally storing its result payload"""
+        with self._connect() as db:
+            db.execute(
+                'UPDATE jobs SET status = ?, updated_at = ?, result = ? WHERE id = ?',
+                (status, time.time(), json.dumps(result) if result is not None else None, job_id)
+            )
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if unknown or expired"""
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT id, status, created_at, updated_at, result FROM jobs WHERE id = ?',
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            'job_id': row[0],
+            'status': row[1],
+            'created_at': row[2],
+            'updated_at': row[3],
+            'result': json.loads(row[4]) if row[4] else None
+        }
+
+
+class JobRunner:
+    """Bounded thread pool that runs jobs and records their outcome in a JobStore"""
+
+    def __init__(self, store, max_workers=2, max_pending=16):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        # Running + waiting jobs; beyond this we refuse new work
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, fn, *args):
+        """
+        Queue fn(*args) for background execution
+        fn must return (payload, status_code)
+        Returns: job id, or None when the queue is full
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        try:
+            job_id = self.store.create()
+            self._executor.submit(self._run, job_id, fn, args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        """Execute one job and store its result"""
+        try:
+            self.store.update(job_id, JOB_PROCESSING)
+            payload, status_code = fn(*args)
+            status = JOB_COMPLETED if status_code < 400 else JOB_FAILED
+            self.store.update(job_id, status, payload)
+        except Exception as e:
+            log('error', 'job failed', exc_info=True, job_id=job_id, error=str(e))
+            self.store.update(job_id, JOB_FAILED, {
+                'success': False,
+                'error': f'Server error: {str(e)}'
+            })
+        finally:
+            self._slots.release()
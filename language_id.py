@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Language Identification
+Local character n-gram classifier for English, Nigerian Pidgin, Yoruba, Igbo
+and Hausa, trained at import time on the samples in language_samples/
+Decides whether a transcript needs translating without a network round trip
+"""
+
+import math
+import os
+import re
+import unicodedata
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'language_samples')
+NGRAM_ORDERS = (1, 2, 3)
+MAX_CHARS = 240        # A couple of sentences are plenty to tell these languages apart
+MIN_CHARS = 12         # Below this the guess is not worth acting on
+SMOOTHING = 0.5
+
+# Names Whisper (verbose_json) and the UI use for the same languages
+LANGUAGE_ALIASES = {
+    'english': 'en',
+    'yoruba': 'yo',
+    'igbo': 'ig',
+    'hausa': 'ha',
+    'pidgin': 'pcm',
+    'nigerian pidgin': 'pcm',
+    'french': 'fr',
+    'arabic': 'ar',
+    'spanish': 'es',
+    'portuguese': 'pt',
+    'german': 'de',
+    'italian': 'it',
+    'swahili': 'sw'
+}
+
+NON_LETTERS = re.compile(r"[^\w']+|[\d_]+")
+
+
+def normalize_text(text):
+    """Lowercase, strip tone marks and underdots, and collapse everything but letters"""
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFD', text)
+        text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    return ' ' + NON_LETTERS.sub(' ', text).strip() + ' '
+
+
+def char_ngrams(text):
+    """Character n-grams of normalized text (word boundaries included as spaces)"""
+    return [text[i:i + n] for n in NGRAM_ORDERS for i in range(len(text) - n + 1)]
+
+
+def canonical_language(language):
+    """Map a Whisper/UI language name or code to the classifier's code"""
+    language = (language or '').strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+class LanguageIdentifier:
+    """Multinomial naive Bayes over character 1-3 grams"""
+
+    def __init__(self, samples_dir=SAMPLES_DIR):
+        self.languages = []
+        counts = {}
+
+        for name in sorted(os.listdir(samples_dir)):
+            if not name.endswith('.txt'):
+                continue
+            language = name[:-4]
+            with open(os.path.join(samples_dir, name), 'r', encoding='utf-8') as f:
+                grams = {}
+                for line in f:
+                    for gram in char_ngrams(normalize_text(line)):
+                        grams[gram] = grams.get(gram, 0) + 1
+            grams.pop(' ', None)  # Word boundaries alone carry no signal
+            self.languages.append(language)
+            counts[language] = grams
+
+        vocabulary = set()
+        for grams in counts.values():
+            vocabulary.update(grams)
+
+        # log P(gram | language), one table per language
+        self.tables = []
+        for language in self.languages:
+            grams = counts[language]
+            total = sum(grams.values()) + SMOOTHING * len(vocabulary)
+            self.tables.append({
+                gram: math.log((grams.get(gram, 0) + SMOOTHING) / total) for gram in vocabulary
+            })
+
+    def identify(self, text):
+        """
+        Guess the language of text
+        Returns: (language code, confidence 0-1); ('unknown', 0.0) for too little text
+        """
+        text = normalize_text(text[:MAX_CHARS])
+        if len(text.strip()) < MIN_CHARS:
+            return 'unknown', 0.0
+
+        # N-grams unseen in every language say nothing about the language
+        vocabulary = self.tables[0]
+        grams = [gram for gram in char_ngrams(text) if gram in vocabulary]
+        if not grams:
+            return 'unknown', 0.0
+
+        seen = len(grams)
+        scores = [sum(map(table.__getitem__, grams)) for table in self.tables]
+
+        # Per-n-gram average keeps confidence from saturating on long texts
+        best = max(scores)
+        weights = [math.exp((score - best) / math.sqrt(seen)) for score in scores]
+        index = scores.index(best)
+        return self.languages[index], round(weights[index] / sum(weights), 3)
+
+
+_identifier = None
+
+
+def _shared_identifier():
+    global _identifier
+    if _identifier is None:
+        _identifier = LanguageIdentifier()
+    return _identifier
+
+
+def identify_language(text):
+    """identify() on a shared identifier, trained on first use"""
+    return _shared_identifier().identify(text)
+
+
+def resolve_language(text, whisper_language, min_confidence=0.6):
+    """
+    Language of a transcript, from Whisper's label and the local classifier
+    The classifier only knows a handful of languages and its confidence is relative
+    among them (French comes out as confident English), so it may only overrule
+    Whisper when Whisper's label is one of those languages, or missing
+    Returns: (language, local guess, local confidence)
+    """
+    local_language, confidence = identify_language(text)
+    whisper_code = canonical_language(whisper_language)
+    known = whisper_code in _shared_identifier().languages or whisper_code in ('unknown', '')
+    if known and confidence >= min_confidence:
+        return local_language, local_language, confidence
+    return whisper_language, local_language, confidence
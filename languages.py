@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Languages
+Whisper language mapping and translation targets shared by the API, the desktop app and the CLI
+"""
+
+# Map Nigerian languages to Whisper language codes
+LANGUAGE_MAP = {
+    'pidgin': None,          # Auto-detect (Whisper handles Pidgin better in auto mode)
+    'yoruba': 'yo',          # Yoruba
+    'igbo': 'ig',            # Igbo
+    'hausa': 'ha',           # Hausa
+    'urhobo': None,          # Auto-detect (not officially supported, use auto)
+    'auto': None             # Auto-detect
+}
+
+# Desktop dropdown labels and the language code each one stands for
+DISPLAY_LANGUAGES = {
+    'Auto-detect': 'auto',
+    'Nigerian Pidgin': 'pidgin',
+    'Yoruba': 'yoruba',
+    'Igbo': 'igbo',
+    'Hausa': 'hausa',
+    'Urhobo': 'urhobo'
+}
+
+# Map Whisper language codes to full names
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'yo': 'Yoruba',
+    'ig': 'Igbo',
+    'ha': 'Hausa',
+    'pcm': 'Nigerian Pidgin'
+}
+
+# Languages a transcript can be translated into (codes both Google and LibreTranslate use)
+TARGET_LANGUAGES = {
+    'en': 'English',
+    'fr': 'French',
+    'ar': 'Arabic',
+    'es': 'Spanish',
+    'pt': 'Portuguese',
+    'de': 'German',
+    'sw': 'Swahili',
+    'yo': 'Yoruba',
+    'ig': 'Igbo',
+    'ha': 'Hausa'
+}
+
+
+def whisper_language_for(language):
+    """Whisper code for a language code ('yoruba') or dropdown label ('Yoruba'); None = auto-detect"""
+    code = DISPLAY_LANGUAGES.get(language, (language or 'auto').lower())
+    return LANGUAGE_MAP.get(code, None)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Long Audio Transcription
+Splits recordings beyond the Whisper upload limit at silence boundaries,
+transcribes the chunks concurrently and stitches the results back together
+"""
+
+import contextvars
+import io
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+
+WHISPER_MAX_FILE_SIZE = 25 * 1024 * 1024  # Whisper API per-request limit
+CHUNK_FORMAT = 'mp3'
+CHUNK_BITRATE = '64k'  # ~0.5 MB per minute of mono speech
+
+
+def find_chunk_boundaries(audio, max_chunk_ms, min_silence_ms=500, seek_step_ms=10):
+    """
+    Plan chunk boundaries that cover the whole recording
+    Each chunk is at most max_chunk_ms long and ends in a silence where possible
+    Returns: list of (start_ms, end_ms)
+    """
+    silence_thresh = audio.dBFS - 16
+    silences = detect_silence(
+        audio,
+        min_silence_len=min_silence_ms,
+        silence_thresh=silence_thresh,
+        seek_step=seek_step_ms
+    )
+    # Cut in the middle of each silent stretch
+    cut_points = [(start + end) // 2 for start, end in silences]
+
+    boundaries = []
+    position = 0
+    total = len(audio)
+
+    while total - position > max_chunk_ms:
+        limit = position + max_chunk_ms
+        # Latest silence in the second half of the window, else a hard cut
+        candidates = [p for p in cut_points if position + max_chunk_ms // 2 < p <= limit]
+        end = candidates[-1] if candidates else limit
+        boundaries.append((position, end))
+        position = end
+
+    boundaries.append((position, total))
+    return boundaries
+
+
+def export_chunk(chunk):
+    """Encode a chunk as compact mono MP3, halving it until it fits the Whisper limit"""
+    data = chunk.set_channels(1).export(
+        io.BytesIO(), format=CHUNK_FORMAT, bitrate=CHUNK_BITRATE
+    ).getvalue()
+
+    if len(data) <= WHISPER_MAX_FILE_SIZE:
+        return [(0, data)]
+
+    half = len(chunk) // 2
+    return export_chunk(chunk[:half]) + [
+        (half + offset, part) for offset, part in export_chunk(chunk[half:])
+    ]
+
+
+def _field(item, name, default=None):
+    """Read a field from an OpenAI response object or a plain dict"""
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+
+def segment_dicts(segments, offset=0.0, start_id=0):
+    """Convert Whisper verbose_json segments to dicts, shifted by offset seconds"""
+    return [
+        {
+            'id': start_id + index,
+            'start': round(offset + _field(segment, 'start', 0.0), 2),
+            'end': round(offset + _field(segment, 'end', 0.0), 2),
+            'text': _field(segment, 'text', '').strip()
+        }
+        for index, segment in enumerate(segments or [])
+    ]
+
+
+def transcribe_long_audio(audio_file, transcribe_chunk, max_chunk_seconds=600, max_workers=4,
+                          on_chunk=None):
+    """
+    Transcribe a long recording in parallel chunks
+    audio_file: seekable file object (or path) readable by pydub
+    transcribe_chunk: callable(file tuple) -> Whisper verbose_json response
+    on_chunk: optional callable(index, total, segments) run as each chunk finishes
+    Returns: dict with text, language, segments (offsets in seconds), duration, chunks
+    """
+    if hasattr(audio_file, 'seek'):
+        audio_file.seek(0)
+    audio = AudioSegment.from_file(audio_file)
+
+    chunks = []
+    for start_ms, end_ms in find_chunk_boundaries(audio, max_chunk_seconds * 1000):
+        for offset_ms, data in export_chunk(audio[start_ms:end_ms]):
+            chunks.append((start_ms + offset_ms, data))
+
+    def run(index):
+        offset_ms, data = chunks[index]
+        response = transcribe_chunk((f'chunk_{index:04d}.{CHUNK_FORMAT}', data))
+        if on_chunk:
+            # Partial results, in completion order
+            on_chunk(index, len(chunks), segment_dicts(_field(response, 'segments'), offset_ms / 1000.0))
+        return response
+
+    # Wall-clock time grows with len(chunks) / max_workers, not total duration
+    # Each chunk runs in a copy of the caller's context, so its timings land in the caller's trace
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chunk') as executor:
+        futures = [executor.submit(contextvars.copy_context().run, run, index) for index in range(len(chunks))]
+        responses = [future.result() for future in futures]
+
+    texts = []
+    segments = []
+    languages = Counter()
+
+    for (offset_ms, _), response in zip(chunks, responses):
+        offset = offset_ms / 1000.0
+        text = (_field(response, 'text') or '').strip()
+        if text:
+            texts.append(text)
+            languages[_field(response, 'language', 'unknown')] += len(text)
+
+        segments.extend(segment_dicts(_field(response, 'segments'), offset, len(segments)))
+
+    return {
+        'text': ' '.join(texts),
+        # The language that covers most of the transcript wins
+        'language': languages.most_common(1)[0][0] if languages else 'unknown',
+        'segments': segments,
+        'duration': round(len(audio) / 1000.0, 2),
+        'chunks': len(chunks)
+    }
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Metrics
+Prometheus metrics for the Voice Note Translator API
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) so every
+worker writes to a shared directory and /metrics aggregates all of them
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+import tracing
+
+# Pipeline stages are seconds long (Whisper), not milliseconds
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_LATENCY = Histogram(
+    'voice_translator_stage_seconds',
+    'Latency of each pipeline stage',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_LATENCY = Histogram(
+    'voice_translator_request_seconds',
+    'End-to-end latency of API requests',
+    ['endpoint'],
+    buckets=STAGE_BUCKETS
+)
+IN_FLIGHT = Gauge(
+    'voice_translator_in_flight_requests',
+    'Requests currently being handled',
+    ['endpoint'],
+    multiprocess_mode='livesum'
+)
+UPSTREAM_ERRORS = Counter(
+    'voice_translator_upstream_errors_total',
+    'Failed calls to upstream services',
+    ['upstream', 'kind']
+)
+CACHE_LOOKUPS = Counter(
+    'voice_translator_cache_lookups_total',
+    'Cache lookups by cache and result (hit ratio = hit / all)',
+    ['cache', 'result']
+)
+AUDIO_BYTES = Counter(
+    'voice_translator_audio_bytes_total',
+    'Audio bytes received for transcription'
+)
+AUDIO_SECONDS = Counter(
+    'voice_translator_audio_seconds_total',
+    'Seconds of audio transcribed'
+)
+SILENCE_SECONDS = Counter(
+    'voice_translator_silence_seconds_total',
+    'Seconds of silence trimmed before transcription'
+)
+ADMISSION_DECISIONS = Counter(
+    'voice_translator_admission_decisions_total',
+    'Upstream calls admitted or shed by admission control',
+    ['upstream', 'result']
+)
+WHATSAPP_MESSAGES = Counter(
+    'voice_translator_whatsapp_messages_total',
+    'WhatsApp voice notes by outcome',
+    ['result']
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block and record it under the given pipeline stage (and as a span of the current trace)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_LATENCY.labels(stage).observe(duration)
+        tracing.record_span(stage, started, duration)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_upstream_error(upstream, kind):
+    UPSTREAM_ERRORS.labels(upstream, kind).inc()
+
+
+def record_admission(upstream, result):
+    ADMISSION_DECISIONS.labels(upstream, result).inc()
+
+
+def record_whatsapp_message(result):
+    WHATSAPP_MESSAGES.labels(result).inc()
+
+
+def render_metrics():
+    """Return (body, content type) in Prometheus text format"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # Aggregate the files written by every gunicorn worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Single Flight
+Coalesces concurrent identical requests so only one of them does the work
+Threads in a worker wait on the leader in memory; workers on the same host
+take turns on a file lock and pick up the leader's result from a shared directory
+Only callers that actually waited behind a leader take its result; a caller that
+finds nothing in flight does the work itself (and so hits the caches as usual)
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from tracing import log
+
+PURGE_EVERY = 100  # Sweep stale result files after this many writes
+
+
+class _Call:
+    """One in-flight piece of work and the threads waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    do(key, fn) runs fn once per key at a time and hands its result to every
+    concurrent caller with the same key
+    With shared_dir, results are kept for result_ttl seconds so callers in other
+    worker processes that were queued behind the same leader reuse them
+    """
+
+    def __init__(self, shared_dir=None, wait_timeout=100.0, result_ttl=5.0, poll_interval=0.05):
+        self.shared_dir = shared_dir
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.leaders = 0
+        self.followers = 0
+        self._writes = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        """
+        Run fn() unless an identical call is already in flight
+        Returns: (result, shared) - shared is True when another caller did the work
+        fn's result must be JSON serializable to be shared across workers
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            with self._lock:
+                self.followers += 1
+            if not call.done.wait(self.wait_timeout):
+                # The leader is stuck; don't hold this request hostage
+                return fn(), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run_across_workers(key, fn)
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Return leader/follower counters for this process"""
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'in_flight': len(self._calls)
+            }
+
+    def _run_across_workers(self, key, fn):
+        """Serialize identical calls across processes with flock and a shared result file"""
+        if not self.shared_dir:
+            with self._lock:
+                self.leaders += 1
+            return fn(), False
+
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.shared_dir, f"{name}.lock")
+        result_path = os.path.join(self.shared_dir, f"{name}.json")
+
+        lock_file, locked, waited = self._open_locked(lock_path)
+        try:
+            # Another worker may have finished this exact call while we waited on it
+            shared = self._read_result(result_path, waited)
+            if shared is not None:
+                with self._lock:
+                    self.followers += 1
+                return shared['result'], True
+
+            with self._lock:
+                self.leaders += 1
+            generation = self._start_generation(lock_file) if locked else None
+            result = fn()
+            if locked:
+                self._write_result(result_path, {'generation': generation, 'result': result})
+                # Waiters notice the unlinked file and reopen it to find the result
+                os.unlink(lock_path)
+            return result, False
+        finally:
+            lock_file.close()  # Releases the lock
+
+    def _open_locked(self, lock_path):
+        """
+        Open and lock the key's lock file, retrying if it was unlinked meanwhile
+        Returns: (lock file, locked, generations of the leaders this caller waited behind)
+        """
+        waited = set()
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            lock_file = open(lock_path, 'a+')
+            acquired, blocked = self._acquire(lock_file, deadline)
+            if blocked:
+                # The leader we queued behind stamped this file; it is ours to read now
+                generation = os.pread(lock_file.fileno(), 64, 0).decode('ascii', 'ignore')
+                if generation:
+                    waited.add(generation)
+            if not acquired:
+                return lock_file, False, waited
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    return lock_file, True, waited
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+    def _acquire(self, lock_file, deadline):
+        """
+        Wait until deadline for the key's file lock
+        Returns: (acquired, blocked) - blocked is True if someone else held it first
+        """
+        blocked = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True, blocked
+            except BlockingIOError:
+                blocked = True
+                if time.monotonic() >= deadline:
+                    log('warning', 'single flight lock timed out', lock=lock_file.name)
+                    return False, blocked
+                time.sleep(self.poll_interval)
+
+    def _start_generation(self, lock_file):
+        """Stamp the held lock file with a fresh id that this leader's result will carry"""
+        generation = uuid.uuid4().hex
+        os.ftruncate(lock_file.fileno(), 0)
+        os.pwrite(lock_file.fileno(), generation.encode('ascii'), 0)
+        return generation
+
+    def _read_result(self, path, waited):
+        """Load the result of a leader this caller waited behind, if it is still fresh"""
+        if not waited:
+            return None  # Nothing was in flight when we arrived: do the work
+        try:
+            if os.path.getmtime(path) + self.result_ttl <= time.time():
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                shared = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return shared if shared.get('generation') in waited else None
+
+    def _write_result(self, path, result):
+        """Atomically publish a result for workers queued on the same key"""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.shared_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            log('warning', 'single flight result write failed', error=str(e))
+            return
+
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if purge:
+            self._purge()
+
+    def _purge(self):
+        """Delete published results and idle lock files nobody is waiting on any more"""
+        cutoff = time.time() - self.result_ttl
+        for entry in os.scandir(self.shared_dir):
+            try:
+                if entry.stat().st_mtime > cutoff:
+                    continue
+                if entry.name.endswith(('.json', '.tmp')):
+                    os.remove(entry.path)
+                elif entry.name.endswith('.lock'):
+                    self._remove_idle_lock(entry.path)
+            except OSError:
+                continue
+
+    def _remove_idle_lock(self, lock_path):
+        """Unlink a lock file only while holding it, so no leader loses its lock"""
+        with open(lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                os.unlink(lock_path)
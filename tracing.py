@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Tracing
+Per-request trace ids, span timings for each pipeline stage and structured logs
+Log records are JSON lines; request threads only put them on an in-memory queue
+and a listener thread formats and writes them, so logging never waits on stdout
+Sampled requests log their span breakdown when they finish; requests slower
+than the slow threshold always do, at WARNING
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger('voice_translator')
+
+_current = contextvars.ContextVar('voice_translator_trace', default=None)
+_listener = None
+_handler = None
+
+# W3C trace context: version-traceid-parentid-flags
+TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-([0-9a-f]{2})$')
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+class Trace:
+    """One request (or background job): its id, spans and a few attributes"""
+
+    def __init__(self, name, trace_id=None, sampled=False):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+
+    def add_span(self, name, started, duration):
+        """Record a finished stage; started is a perf_counter() reading"""
+        self.spans.append({
+            'name': name,
+            'start_ms': round((started - self.started) * 1000, 1),
+            'duration_ms': round(duration * 1000, 1)
+        })
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current_trace():
+    """The trace of the request being handled in this context, or None"""
+    return _current.get()
+
+
+def record_span(name, started, duration):
+    """Add a span to the current trace, if there is one"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, started, duration)
+
+
+def annotate(**attributes):
+    """Attach attributes (cache hit, audio size, ...) to the current trace"""
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def log(level, message, exc_info=False, **fields):
+    """Write a structured log line; fields become JSON keys next to the message"""
+    logger.log(logging.getLevelName(level.upper()), message, exc_info=exc_info, extra={'fields': fields})
+
+
+def incoming_trace(headers):
+    """
+    Trace id and sampling flag propagated by the caller
+    Returns: (trace id or None, True if the caller sampled it)
+    """
+    match = TRACEPARENT.match((headers.get('traceparent') or '').strip().lower())
+    if match:
+        return match.group(1), bool(int(match.group(2), 16) & 1)
+    request_id = (headers.get('X-Request-ID') or '').strip()
+    if REQUEST_ID.match(request_id):
+        return request_id, False
+    return None, False
+
+
+class Tracer:
+    """
+    Starts and finishes traces
+    sample_rate is the share of traces whose spans are logged; slow_seconds (0 = off)
+    logs the spans of every trace that took at least that long
+    """
+
+    def __init__(self, sample_rate=0.0, slow_seconds=0.0):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.started = 0
+        self.slow = 0
+        self._lock = threading.Lock()
+
+    def start(self, name, trace_id=None, sampled=False):
+        """
+        Make a new trace current in this context
+        Returns: (trace, token for finish())
+        """
+        sampled = sampled or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        trace = Trace(name, trace_id, sampled)
+        with self._lock:
+            self.started += 1
+        return trace, _current.set(trace)
+
+    def finish(self, trace, token=None, status=None):
+        """Log the trace if it was sampled or slow, and restore the previous one"""
+        duration = trace.elapsed()
+        slow = bool(self.slow_seconds) and duration >= self.slow_seconds
+        if slow or trace.sampled:
+            if slow:
+                with self._lock:
+                    self.slow += 1
+            log(
+                'warning' if slow else 'info', 'slow request' if slow else 'request',
+                name=trace.name, status=status, duration_ms=round(duration * 1000, 1),
+                spans=list(trace.spans), **trace.attributes
+            )
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)  # Finished from a different context than it started in
+
+    @contextmanager
+    def trace(self, name, trace_id=None, sampled=False):
+        """Trace a block, e.g. a background job outside any request"""
+        trace, token = self.start(name, trace_id, sampled)
+        status = 'ok'
+        try:
+            yield trace
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            self.finish(trace, token, status)
+
+    def stats(self):
+        """Return trace counters for this process"""
+        with self._lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'slow_seconds': self.slow_seconds,
+                'traces': self.started,
+                'slow': self.slow,
+                'log_records_dropped': _handler.dropped if _handler else 0
+            }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace id and fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TraceQueueHandler(logging.handlers.QueueHandler):
+    """
+    Stamps the trace id in the calling thread (the listener can't see its context)
+    and never blocks it: formatting and I/O happen on the listener thread, and
+    records are dropped, and counted, when the queue is full
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        trace = _current.get()
+        record.trace_id = trace.trace_id if trace else None
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level='INFO', queue_size=10000, stream=None):
+    """
+    Send the service's logs to stream (stdout) as JSON lines through a background thread
+    Safe to call more than once; only the first call installs the handlers
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _handler = _TraceQueueHandler(queue.Queue(maxsize=queue_size))
+    _listener = logging.handlers.QueueListener(_handler.queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    logger.addHandler(_handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logger.removeHandler(_handler)
+        _listener = None
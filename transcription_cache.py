@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Transcription Cache
+Content-addressed cache of Whisper results for the Voice Note Translator API
+In-process LRU tier with an optional on-disk tier shared by all gunicorn workers
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from tracing import log
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def hash_audio(stream):
+    """Return the SHA-256 hex digest of an audio stream and rewind it"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def make_cache_key(audio_hash, whisper_language):
+    """Combine the audio hash and the resolved Whisper language into a cache key"""
+    return f"{audio_hash}-{whisper_language or 'auto'}"
+
+
+class TranscriptionCache:
+    """Two-tier (memory + optional disk) cache of transcription results"""
+
+    def __init__(self, max_entries=512, ttl=86400, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(value)
+                # Expired - drop it and fall through to the disk tier
+                del self._entries[key]
+
+        value = self._read_disk(key, now)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store_memory(key, value, now)
+            return dict(value)
+
+    def set(self, key, value):
+        """Store a result in both tiers"""
+        with self._lock:
+            self._store_memory(key, value, time.time())
+        self._write_disk(key, value)
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries)
+            }
+
+    def _store_memory(self, key, value, now):
+        """Insert into the LRU tier and evict the oldest entries (lock held)"""
+        self._entries[key] = (now + self.ttl, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        """Shard cache files by the first two hex digits of the key"""
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key, now):
+        """Load an entry from the shared disk tier, honouring the TTL"""
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl <= now:
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        """Atomically write an entry so concurrent workers never see partial files"""
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log('warning', 'transcription cache write failed', error=str(e))
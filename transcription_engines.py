@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Transcription Engines
+One interface for every speech-to-text backend:
+    engine.transcribe((filename, file object or bytes), language) -> Transcription
+    await engine.transcribe_async(...) -> Transcription (ASGI mode)
+- openai: OpenAI Whisper API (default)
+- local:  faster-whisper on CPU, loaded once per process and run on a worker pool
+- fake:   canned transcripts with configurable latency, for tests and benchmarks
+Select one per deployment with TRANSCRIPTION_ENGINE
+"""
+
+import asyncio
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import log
+
+WHISPER_MAX_FILE_SIZE = 25 * 1024 * 1024  # Whisper API per-request limit
+
+# Local engine settings (faster-whisper / CTranslate2)
+LOCAL_WHISPER_MODEL = os.getenv('LOCAL_WHISPER_MODEL', 'small')  # tiny, base, small, medium, large-v3 or a path
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv('LOCAL_WHISPER_COMPUTE_TYPE', 'int8')
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv('LOCAL_WHISPER_CPU_THREADS', '0'))  # 0 = all cores
+LOCAL_WHISPER_WORKERS = int(os.getenv('LOCAL_WHISPER_WORKERS', '1'))  # Concurrent transcriptions per process
+LOCAL_WHISPER_BEAM_SIZE = int(os.getenv('LOCAL_WHISPER_BEAM_SIZE', '5'))
+LOCAL_WHISPER_MODEL_DIR = os.getenv('LOCAL_WHISPER_MODEL_DIR')  # Download/cache directory
+
+FAKE_TRANSCRIPTION_TEXT = os.getenv('FAKE_TRANSCRIPTION_TEXT', 'How you dey? I wan confirm say you don reach house.')
+FAKE_TRANSCRIPTION_LANGUAGE = os.getenv('FAKE_TRANSCRIPTION_LANGUAGE', 'english')
+FAKE_TRANSCRIPTION_LATENCY = float(os.getenv('FAKE_TRANSCRIPTION_LATENCY', '0'))
+
+
+class Transcription:
+    """Engine-neutral result with the fields of a Whisper verbose_json response"""
+
+    def __init__(self, text, language='unknown', duration=None, segments=None):
+        self.text = text
+        self.language = language
+        self.duration = duration
+        self.segments = segments or []
+
+
+def _rewind(audio_file):
+    """Seek an upload tuple's file object back to the start (bytes need nothing)"""
+    if isinstance(audio_file, tuple) and hasattr(audio_file[1], 'seek'):
+        audio_file[1].seek(0)
+
+
+def _read_upload(audio_file):
+    """Split a (filename, file object or bytes) tuple into (filename, seekable buffer)"""
+    filename, data = audio_file
+    if isinstance(data, (bytes, bytearray)):
+        return filename, io.BytesIO(data)
+    data.seek(0)
+    return filename, data
+
+
+class OpenAIWhisperEngine:
+    """
+    Whisper API; calls go through an Upstream (retries, circuit breaker) when given one
+    transcribe_async() uses async_client (AsyncOpenAI) when given one
+    """
+
+    name = 'OpenAI Whisper'
+    remote = True
+    max_file_size = WHISPER_MAX_FILE_SIZE
+
+    def __init__(self, client, upstream=None, model='whisper-1', async_client=None):
+        self.client = client
+        self.upstream = upstream
+        self.model = model
+        self.async_client = async_client
+
+    def _params(self, audio_file, language):
+        params = {
+            'file': audio_file,
+            'model': self.model,
+            'response_format': 'verbose_json',
+        }
+
+        # Add language parameter if specified (not auto)
+        if language:
+            params['language'] = language
+        return params
+
+    def transcribe(self, audio_file, language=None):
+        params = self._params(audio_file, language)
+
+        def attempt():
+            # A failed attempt may have consumed the buffer, so rewind before each try
+            _rewind(audio_file)
+            return self.client.audio.transcriptions.create(**params)
+
+        response = self.upstream.call(attempt) if self.upstream else attempt()
+        return self._transcription(response)
+
+    async def transcribe_async(self, audio_file, language=None):
+        if self.async_client is None:
+            return await asyncio.to_thread(self.transcribe, audio_file, language)
+
+        params = self._params(audio_file, language)
+
+        async def attempt():
+            _rewind(audio_file)
+            return await self.async_client.audio.transcriptions.create(**params)
+
+        response = await (self.upstream.call_async(attempt) if self.upstream else attempt())
+        return self._transcription(response)
+
+    def _transcription(self, response):
+        return Transcription(
+            response.text,
+            getattr(response, 'language', 'unknown'),
+            getattr(response, 'duration', None),
+            getattr(response, 'segments', None)
+        )
+
+
+class LocalWhisperEngine:
+    """
+    faster-whisper on CPU, no network and no per-minute cost
+    The model is loaded once per process (on first use, or by warm_up()) and
+    calls run on a fixed pool of `workers` threads, each with its own model replica
+    """
+
+    name = 'Local Whisper'
+    remote = False
+    max_file_size = None  # No upload limit; long recordings don't need chunking
+
+    def __init__(self, model=LOCAL_WHISPER_MODEL, compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                 cpu_threads=LOCAL_WHISPER_CPU_THREADS, workers=LOCAL_WHISPER_WORKERS,
+                 beam_size=LOCAL_WHISPER_BEAM_SIZE, model_dir=LOCAL_WHISPER_MODEL_DIR):
+        self.model_name = model
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.workers = workers
+        self.beam_size = beam_size
+        self.model_dir = model_dir
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='local-whisper')
+
+    def load(self):
+        """Load the model once per process; later calls return the same instance"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    try:
+                        from faster_whisper import WhisperModel
+                    except ImportError:
+                        raise RuntimeError(
+                            'TRANSCRIPTION_ENGINE=local needs faster-whisper: pip install faster-whisper'
+                        )
+
+                    started = time.perf_counter()
+                    self._model = WhisperModel(
+                        self.model_name,
+                        device='cpu',
+                        compute_type=self.compute_type,
+                        cpu_threads=self.cpu_threads,
+                        num_workers=self.workers,
+                        download_root=self.model_dir
+                    )
+                    log('info', 'loaded local Whisper model', model=self.model_name,
+                        seconds=round(time.perf_counter() - started, 1))
+        return self._model
+
+    def warm_up(self):
+        """Load the model in the background so the first request doesn't pay for it"""
+        thread = threading.Thread(target=self.load, daemon=True)
+        thread.start()
+        return thread
+
+    def transcribe(self, audio_file, language=None):
+        return self._executor.submit(self._transcribe, audio_file, language).result()
+
+    async def transcribe_async(self, audio_file, language=None):
+        # Waits on the model's own worker pool without holding an event loop thread
+        return await asyncio.wrap_future(self._executor.submit(self._transcribe, audio_file, language))
+
+    def _transcribe(self, audio_file, language):
+        model = self.load()
+        _, buffer = _read_upload(audio_file)
+
+        segments, info = model.transcribe(buffer, language=language, beam_size=self.beam_size)
+
+        # Segments are generated lazily while decoding; consume them on this worker
+        results = []
+        for segment in segments:
+            results.append({
+                'id': len(results),
+                'start': round(segment.start, 2),
+                'end': round(segment.end, 2),
+                'text': segment.text.strip()
+            })
+
+        return Transcription(
+            ' '.join(segment['text'] for segment in results if segment['text']),
+            info.language,
+            round(info.duration, 2),
+            results
+        )
+
+
+class FakeEngine:
+    """Canned transcript after an optional delay; duration assumes 16 kHz 16-bit mono"""
+
+    name = 'Fake'
+    remote = False
+    max_file_size = WHISPER_MAX_FILE_SIZE  # Behave like the API so chunking paths get exercised
+
+    def __init__(self, text=FAKE_TRANSCRIPTION_TEXT, language=FAKE_TRANSCRIPTION_LANGUAGE,
+                 latency=FAKE_TRANSCRIPTION_LATENCY):
+        self.text = text
+        self.language = language
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio_file, language=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._transcription(audio_file, language)
+
+    async def transcribe_async(self, audio_file, language=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._transcription(audio_file, language)
+
+    def _transcription(self, audio_file, language):
+        _, buffer = _read_upload(audio_file)
+        size = buffer.seek(0, os.SEEK_END)
+
+        with self._lock:
+            self.calls += 1
+
+        duration = round(size / 32000.0, 2)
+        return Transcription(
+            self.text,
+            language or self.language,
+            duration,
+            [{'id': 0, 'start': 0.0, 'end': duration, 'text': self.text}]
+        )
+
+
+def create_engine(name='openai', openai_client=None, upstream=None, async_openai_client=None):
+    """Build the engine selected for this deployment (openai, local or fake)"""
+    name = (name or 'openai').lower()
+    if name == 'openai':
+        if openai_client is None:
+            from upstream import build_openai_client
+            openai_client = build_openai_client(os.getenv('OPENAI_API_KEY'), base_url=os.getenv('OPENAI_BASE_URL'))
+        return OpenAIWhisperEngine(openai_client, upstream, async_client=async_openai_client)
+    if name == 'local':
+        return LocalWhisperEngine()
+    if name == 'fake':
+        return FakeEngine()
+    raise ValueError(f"Unknown transcription engine: {name} (expected openai, local or fake)")
+
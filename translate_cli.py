@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Voice Note Translator CLI
+Headless bulk transcription and translation for backfills
+Walks a directory, processes voice notes concurrently and appends one JSON line
+per file to the output as it goes; a manifest records finished files so an
+interrupted run resumes without redoing them
+
+Usage:
+    python translate_cli.py /data/voice_notes --output results.jsonl --workers 8
+    python translate_cli.py /data/voice_notes --output results.jsonl --language yoruba
+    (run the same command again to resume)
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+from language_id import canonical_language, resolve_language
+from languages import LANGUAGE_MAP, LANGUAGE_NAMES
+from long_audio import segment_dicts, transcribe_long_audio
+from transcription_engines import create_engine
+from translation_memory import TranslationMemory
+from upstream import (
+    CircuitOpenError, GoogleTranslateClient, LibreTranslateClient, ResilientTranslator, Upstream, build_openai_client
+)
+
+# Load environment variables
+load_dotenv()
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.ogg', '.flac', '.webm', '.opus')
+LANGUAGE_ID_MIN_CONFIDENCE = float(os.getenv('LANGUAGE_ID_MIN_CONFIDENCE', '0.6'))
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def find_audio_files(directory):
+    """All audio files under directory, as sorted paths relative to it"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in files:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(found)
+
+
+def file_fingerprint(path):
+    """Size and modification time - a changed file is processed again"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+class Manifest:
+    """
+    Append-only JSONL record of processed files (path, fingerprint, status)
+    Only the main thread writes it; the last entry for a path wins
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry['path']] = entry
+                    except (ValueError, KeyError):
+                        continue  # Torn last line from an interrupted run
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def is_done(self, path, fingerprint, retry_failed=True):
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != fingerprint['size'] or entry['mtime'] != fingerprint['mtime']:
+            return False
+        return entry['status'] == STATUS_DONE or not retry_failed
+
+    def record(self, path, fingerprint, status):
+        entry = {'path': path, 'status': status, **fingerprint}
+        self.entries[path] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class VoiceNoteProcessor:
+    """Whisper + translation pipeline without the web server or the GUI"""
+
+    def __init__(self, translate=True):
+        self.translate_enabled = translate
+        retry_settings = {
+            'max_retries': int(os.getenv('UPSTREAM_MAX_RETRIES', '5')),
+            'base_delay': float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '1')),
+            'max_delay': float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '30'))
+        }
+        engine_name = os.getenv('TRANSCRIPTION_ENGINE', 'openai').lower()
+        openai_client = None
+        if engine_name == 'openai':
+            openai_client = build_openai_client(
+                os.getenv('OPENAI_API_KEY'),
+                base_url=os.getenv('OPENAI_BASE_URL'),
+                timeout=float(os.getenv('WHISPER_TIMEOUT', '60'))
+            )
+        self.engine = create_engine(
+            engine_name, openai_client=openai_client, upstream=Upstream('whisper_api', **retry_settings)
+        )
+
+        translate_timeout = float(os.getenv('TRANSLATE_TIMEOUT', '10'))
+        if os.getenv('TRANSLATE_BASE_URL'):
+            client = LibreTranslateClient(
+                os.getenv('TRANSLATE_BASE_URL'),
+                api_key=os.getenv('TRANSLATE_API_KEY'),
+                timeout=translate_timeout
+            )
+        else:
+            client = GoogleTranslateClient(timeout=translate_timeout)
+        self.translator = ResilientTranslator(
+            client, Upstream('translation', trip_on_any_error=True, **retry_settings)
+        )
+        self.translation_memory = TranslationMemory(
+            max_entries=int(os.getenv('TRANSLATION_MEMORY_SIZE', '5000')),
+            path=os.getenv('TRANSLATION_MEMORY_PATH'),
+            max_batch_chars=int(os.getenv('TRANSLATE_BATCH_CHARS', '4500')),
+            workers=int(os.getenv('TRANSLATE_CONCURRENCY', '4'))
+        )
+
+    def process(self, path, whisper_language):
+        """Transcribe and translate one file; returns the result record"""
+        started = time.perf_counter()
+
+        max_file_size = self.engine.max_file_size
+        if max_file_size and os.path.getsize(path) > max_file_size:
+            # Split at silences and transcribe chunks concurrently
+            result = transcribe_long_audio(path, lambda chunk: self.engine.transcribe(chunk, whisper_language))
+            original_text = result['text']
+            detected_language = result['language']
+            segments = result['segments']
+            duration = result['duration']
+        else:
+            with open(path, 'rb') as audio_file:
+                response = self.engine.transcribe((os.path.basename(path), audio_file), whisper_language)
+            original_text = response.text
+            detected_language = response.language
+            segments = segment_dicts(response.segments)
+            duration = response.duration
+
+        if not original_text or original_text.strip() == '':
+            raise ValueError('No speech detected in audio')
+
+        # Whisper often labels Pidgin as English; check the text locally
+        detected_language, _, _ = resolve_language(original_text, detected_language, LANGUAGE_ID_MIN_CONFIDENCE)
+
+        note = None
+        error = None
+        translated_text = None
+        if canonical_language(detected_language) == 'en':
+            translated_text = original_text
+            segments = [{**segment, 'translation': segment['text']} for segment in segments]
+            note = 'Text is already in English'
+        elif self.translate_enabled:
+            try:
+                if segments:
+                    # Per-segment translations in concurrent size-bounded batches
+                    translated_text, segments = self.translation_memory.translate_segments(
+                        self.translator, segments, src=detected_language, dest='en'
+                    )
+                else:
+                    translated_text = self.translation_memory.translate(
+                        self.translator, original_text, src=detected_language, dest='en'
+                    )
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                # Keep the transcript, but record the file as failed so a resume retries it
+                error = f'Translation failed: {str(e)}'
+
+        result = {
+            'original_text': original_text,
+            'translated_text': translated_text,
+            'detected_language': detected_language,
+            'detected_language_name': LANGUAGE_NAMES.get(detected_language, detected_language),
+            'note': note,
+            'duration': duration,
+            'segments': segments,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        if error:
+            result['error'] = error
+        return result
+
+
+def run(args):
+    directory = os.path.abspath(args.directory)
+    manifest = Manifest(args.manifest or args.output + '.manifest')
+    whisper_language = LANGUAGE_MAP.get(args.language, None)
+
+    files = find_audio_files(directory)
+    todo = []
+    for relpath in files:
+        fingerprint = file_fingerprint(os.path.join(directory, relpath))
+        if not manifest.is_done(relpath, fingerprint, retry_failed=not args.skip_failed):
+            todo.append((relpath, fingerprint))
+    if args.limit:
+        todo = todo[:args.limit]
+
+    print(f"Found {len(files)} audio files, {len(files) - len(todo)} already processed, "
+          f"{len(todo)} to go ({args.workers} workers)")
+    if not todo:
+        manifest.close()
+        return 0
+
+    processor = VoiceNoteProcessor(translate=not args.no_translate)
+    stop = threading.Event()
+    counts = {STATUS_DONE: 0, STATUS_FAILED: 0}
+    started = time.time()
+
+    def work(relpath):
+        while not stop.is_set():
+            try:
+                return processor.process(os.path.join(directory, relpath), whisper_language)
+            except CircuitOpenError as e:
+                # An upstream is down: wait it out instead of failing the rest of the backlog
+                stop.wait(e.retry_after)
+        return None
+
+    output = open(args.output, 'a', encoding='utf-8')
+    executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='cli')
+    pending = {}
+    queued = iter(todo)
+
+    try:
+        while True:
+            # Keep a bounded number of files in flight instead of queueing them all
+            while len(pending) < args.workers * 2 and not stop.is_set():
+                item = next(queued, None)
+                if item is None:
+                    break
+                pending[executor.submit(work, item[0])] = item
+
+            if not pending:
+                break
+
+            try:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            except KeyboardInterrupt:
+                if stop.is_set():
+                    raise
+                # Let files already in progress finish and land in the manifest
+                stop.set()
+                print("\nInterrupted - finishing files in progress (Ctrl+C again to abandon them)...")
+                continue
+
+            for future in finished:
+                relpath, fingerprint = pending.pop(future)
+                try:
+                    result = future.result()
+                    if result is None:
+                        continue  # Skipped while stopping
+                    status = STATUS_FAILED if result.get('error') else STATUS_DONE
+                    record = {'file': relpath, 'status': status, **result}
+                except Exception as e:
+                    record = {'file': relpath, 'status': STATUS_FAILED, 'error': str(e)}
+
+                # Result first, then the manifest: a crash in between repeats a line, never loses one
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+                manifest.record(relpath, fingerprint, record['status'])
+
+                counts[record['status']] += 1
+                done = counts[STATUS_DONE] + counts[STATUS_FAILED]
+                suffix = f" - {record['error']}" if record['status'] == STATUS_FAILED else ''
+                print(f"[{done}/{len(todo)}] {record['status']}: {relpath}{suffix}")
+
+    except KeyboardInterrupt:
+        print("Abandoned files in progress; run the same command again to resume.")
+        return 130
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        output.close()
+        manifest.close()
+
+    if stop.is_set():
+        print(f"Stopped after {counts[STATUS_DONE]} done, {counts[STATUS_FAILED]} failed; "
+              f"run the same command again to resume.")
+        return 130
+
+    elapsed = time.time() - started
+    print(f"Finished: {counts[STATUS_DONE]} done, {counts[STATUS_FAILED]} failed in {elapsed:.1f}s")
+    return 1 if counts[STATUS_FAILED] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Transcribe and translate a directory of voice notes (resumable)'
+    )
+    parser.add_argument('directory', help='directory to walk (subdirectories included)')
+    parser.add_argument('--output', '-o', default='results.jsonl', help='JSONL file results are appended to')
+    parser.add_argument('--manifest', help='progress manifest (default: <output>.manifest)')
+    parser.add_argument('--workers', '-w', type=int, default=int(os.getenv('CLI_WORKERS', '4')),
+                        help='files processed concurrently')
+    parser.add_argument('--language', '-l', default='auto', choices=sorted(LANGUAGE_MAP),
+                        help='source language (same codes as the API)')
+    parser.add_argument('--no-translate', action='store_true', help='transcribe only')
+    parser.add_argument('--skip-failed', action='store_true', help="don't retry files that failed before")
+    parser.add_argument('--limit', type=int, default=0, help='process at most this many files')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f'not a directory: {args.directory}')
+    if os.getenv('TRANSCRIPTION_ENGINE', 'openai').lower() == 'openai' and not os.getenv('OPENAI_API_KEY'):
+        parser.error('OPENAI_API_KEY is not set (add it to .env)')
+
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Translation Memory
+Sentence-level cache in front of Google Translate
+Repeated greetings and phrases are served locally; only unseen sentences
+are sent to the translator, packed into size-bounded batches that are
+translated concurrently
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import log
+
+# Split after sentence punctuation or at line breaks, keeping the separators
+SENTENCE_BOUNDARY = re.compile(r'((?<=[.!?])\s+|\n+)')
+WHITESPACE = re.compile(r'\s+')
+
+# Google Translate rejects requests over ~5000 characters
+MAX_BATCH_CHARS = 4500
+
+
+def split_sentences(text):
+    """Split text into (sentences, separators) so it can be stitched back exactly"""
+    parts = SENTENCE_BOUNDARY.split(text)
+    return parts[0::2], parts[1::2]
+
+
+def join_sentences(sentences, separators):
+    """Stitch translated sentences back together with their original separators"""
+    pieces = []
+    for index, sentence in enumerate(sentences):
+        pieces.append(sentence)
+        if index < len(separators):
+            pieces.append(separators[index])
+    return ''.join(pieces)
+
+
+def segment_texts(segments):
+    """Whitespace-normalized text of each transcript segment"""
+    return [WHITESPACE.sub(' ', segment.get('text') or '').strip() for segment in segments]
+
+
+def translated_segments(segments, texts, translations):
+    """(full translated text, segments with an added 'translation')"""
+    return ' '.join(t for t in translations if t), [
+        {**segment, 'text': text, 'translation': translation}
+        for segment, text, translation in zip(segments, texts, translations)
+    ]
+
+
+def split_lines(translation, texts):
+    """Split a joined batch translation back into one line per text, or None if lines were merged"""
+    lines = translation.split('\n')
+    if len(lines) != len(texts):
+        return None
+    return [line.strip() for line in lines]
+
+
+def split_long_text(text, limit):
+    """
+    Cut a text longer than limit into pieces of at most limit characters, at sentence
+    boundaries where possible, else between words (a word longer than limit is cut)
+    """
+    if len(text) <= limit:
+        return [text]
+
+    words = []
+    for sentence in SENTENCE_BOUNDARY.split(text)[0::2]:
+        if len(sentence) <= limit:
+            words.append(sentence)
+            continue
+        for word in sentence.split():
+            words.extend(word[start:start + limit] for start in range(0, len(word), limit))
+
+    pieces = []
+    current = ''
+    for word in words:
+        if current and len(current) + 1 + len(word) > limit:
+            pieces.append(current)
+            current = ''
+        current = f'{current} {word}' if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def join_pieces(batch_results, piece_counts):
+    """Flatten per-batch translations and glue the pieces of each split text back together"""
+    translations = [translation for batch in batch_results for translation in batch]
+    joined = []
+    start = 0
+    for count in piece_counts:
+        joined.append(' '.join(translations[start:start + count]))
+        start += count
+    return joined
+
+
+def normalize_sentence(sentence):
+    """Normalize a sentence for lookup (unicode form, case, whitespace)"""
+    sentence = unicodedata.normalize('NFKC', sentence)
+    return WHITESPACE.sub(' ', sentence).strip().casefold()
+
+
+class TranslationMemory:
+    """
+    Bounded LRU of sentence translations with optional SQLite persistence
+    on_lookup(hit) is called for every sentence lookup (e.g. for metrics)
+    Unseen sentences go out in batches of up to max_batch_chars, `workers` at a time
+    """
+
+    def __init__(self, max_entries=5000, path=None, on_lookup=None,
+                 max_batch_chars=MAX_BATCH_CHARS, workers=4):
+        self.max_entries = max_entries
+        self.path = path
+        self.on_lookup = on_lookup
+        self.max_batch_chars = max_batch_chars
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='translate')
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if self.path:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                'src TEXT NOT NULL, dest TEXT NOT NULL, sentence TEXT NOT NULL, '
+                'translation TEXT NOT NULL, PRIMARY KEY (src, dest, sentence))'
+            )
+            self._db.commit()
+
+    def translate(self, translator, text, src='auto', dest='en'):
+        """Translate text sentence by sentence, calling the translator only for misses"""
+        sentences, separators = split_sentences(text)
+        return join_sentences(self._translate_units(translator, sentences, src, dest), separators)
+
+    async def translate_async(self, translator, text, src='auto', dest='en'):
+        """translate() with a coroutine translator (AsyncResilientTranslator)"""
+        sentences, separators = split_sentences(text)
+        return join_sentences(await self._translate_units_async(translator, sentences, src, dest), separators)
+
+    def translate_segments(self, translator, segments, src='auto', dest='en'):
+        """
+        Translate timestamped transcript segments (Whisper verbose_json) one by one
+        Returns: (full translated text, segments with an added 'translation')
+        """
+        texts = segment_texts(segments)
+        return translated_segments(segments, texts, self._translate_units(translator, texts, src, dest))
+
+    async def translate_segments_async(self, translator, segments, src='auto', dest='en'):
+        """translate_segments() with a coroutine translator"""
+        texts = segment_texts(segments)
+        return translated_segments(
+            segments, texts, await self._translate_units_async(translator, texts, src, dest)
+        )
+
+    def _translate_units(self, translator, units, src, dest):
+        """Translate a list of sentences/segments, in order, looking each one up first"""
+        src = (src or 'auto').lower()
+        translated, pending = self._lookup_units(units, src, dest)
+
+        if pending:
+            # Send each distinct unseen sentence once
+            batches, piece_counts = self._pack_batches([units[indexes[0]].strip() for indexes in pending.values()])
+            if len(batches) == 1:
+                results = [self._translate_batch(translator, batches[0], dest)]
+            else:
+                results = list(self._executor.map(
+                    lambda batch: self._translate_batch(translator, batch, dest), batches
+                ))
+            self._fill_units(translated, pending, join_pieces(results, piece_counts), src, dest)
+
+        return translated
+
+    async def _translate_units_async(self, translator, units, src, dest):
+        """_translate_units() with every batch awaited at once instead of on the thread pool"""
+        src = (src or 'auto').lower()
+        translated, pending = self._lookup_units(units, src, dest)
+
+        if pending:
+            batches, piece_counts = self._pack_batches([units[indexes[0]].strip() for indexes in pending.values()])
+            results = await asyncio.gather(
+                *(self._translate_batch_async(translator, batch, dest) for batch in batches)
+            )
+            self._fill_units(translated, pending, join_pieces(results, piece_counts), src, dest)
+
+        return translated
+
+    def _lookup_units(self, units, src, dest):
+        """
+        Look every unit up in the memory
+        Returns: (units with hits translated, normalized miss -> indexes waiting on it)
+        """
+        translated = list(units)
+        pending = OrderedDict()
+
+        for index, unit in enumerate(units):
+            normalized = normalize_sentence(unit)
+            if not normalized:
+                continue
+
+            cached = self._lookup((src, dest, normalized))
+            if self.on_lookup:
+                self.on_lookup(cached is not None)
+            if cached is not None:
+                translated[index] = cached
+            else:
+                pending.setdefault(normalized, []).append(index)
+
+        return translated, pending
+
+    def _fill_units(self, translated, pending, results, src, dest):
+        """Store fresh translations and put them in place of every unit waiting on them"""
+        for (normalized, indexes), result in zip(pending.items(), results):
+            self._store((src, dest, normalized), result)
+            for index in indexes:
+                translated[index] = result
+
+    def _pack_batches(self, texts):
+        """
+        Group texts into batches of at most max_batch_chars (joined by line breaks)
+        Longer texts are cut with split_long_text() and their pieces packed like any other
+        Returns: (batches, number of pieces per text for join_pieces())
+        """
+        batches = []
+        piece_counts = []
+        current = []
+        size = 0
+        for text in texts:
+            pieces = split_long_text(text, self.max_batch_chars)
+            piece_counts.append(len(pieces))
+            for piece in pieces:
+                if current and size + 1 + len(piece) > self.max_batch_chars:
+                    batches.append(current)
+                    current = []
+                    size = 0
+                size += len(piece) + (1 if current else 0)
+                current.append(piece)
+        batches.append(current)
+        return batches, piece_counts
+
+    def _translate_batch(self, translator, texts, dest):
+        """One translator request per batch: line breaks survive translation, so join and split"""
+        if len(texts) == 1:
+            return [translator.translate(texts[0], dest=dest).text]
+
+        lines = split_lines(translator.translate('\n'.join(texts), dest=dest).text, texts)
+        if lines is not None:
+            return lines
+
+        # The translator merged or split lines somewhere: halve the batch until they line up
+        middle = len(texts) // 2
+        return self._translate_batch(translator, texts[:middle], dest) + \
+            self._translate_batch(translator, texts[middle:], dest)
+
+    async def _translate_batch_async(self, translator, texts, dest):
+        if len(texts) == 1:
+            return [(await translator.translate(texts[0], dest=dest)).text]
+
+        lines = split_lines((await translator.translate('\n'.join(texts), dest=dest)).text, texts)
+        if lines is not None:
+            return lines
+
+        middle = len(texts) // 2
+        first, second = await asyncio.gather(
+            self._translate_batch_async(translator, texts[:middle], dest),
+            self._translate_batch_async(translator, texts[middle:], dest)
+        )
+        return first + second
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries)
+            }
+
+    def _lookup(self, key):
+        """Find a sentence in memory, then in the persistent store"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            value = None
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT translation FROM translations WHERE src = ? AND dest = ? AND sentence = ?',
+                    key
+                ).fetchone()
+                if row:
+                    value = row[0]
+
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._remember(key, value)
+            return value
+
+    def _store(self, key, value):
+        """Record a fresh translation in memory and in the persistent store"""
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO translations (src, dest, sentence, translation) '
+                        'VALUES (?, ?, ?, ?)',
+                        key + (value,)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    log('warning', 'translation memory write failed', error=str(e))
+
+    def _remember(self, key, value):
+        """Insert into the LRU and evict the oldest entries (lock held)"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
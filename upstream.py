@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Upstream Clients
+Pooled HTTP clients for Whisper and the translation service, with jittered
+exponential retries, per-call timeouts and a circuit breaker that fails fast
+when an upstream is unhealthy
+"""
+
+import asyncio
+import inspect
+import random
+import threading
+import time
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from tracing import log
+
+# HTTP status codes worth retrying
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Google's public web translation endpoint (no API key needed)
+GOOGLE_TRANSLATE_URL = 'https://translate.googleapis.com'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} is temporarily unavailable')
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_transient(error):
+    """True for timeouts, connection failures and 429/5xx responses"""
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+
+    # openai.APIStatusError and httpx.HTTPStatusError both expose the status
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status_code in TRANSIENT_STATUS_CODES:
+        return True
+
+    # openai.APIConnectionError / APITimeoutError
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker
+    Opens after failure_threshold consecutive failures, lets one trial call
+    through after reset_timeout seconds, and closes again when it succeeds
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the upstream should not be called right now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+
+            raise CircuitOpenError(self.name, max(1, int(self.reset_timeout - elapsed)))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    log('warning', 'circuit opened', upstream=self.name, failures=self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class Upstream:
+    """
+    Runs calls to one upstream through its circuit breaker with jittered retries
+    Only transient errors are retried; with trip_on_any_error every exception
+    counts against the breaker (useful when a degraded service fails in odd ways)
+    on_error(name, kind) is told about every failure: 'transient', 'error' or 'circuit_open'
+    deadline caps one call() in seconds, retries included (0 = no cap): a retry is only
+    made if it can still finish in time, assuming it takes up to attempt_timeout
+    """
+
+    def __init__(self, name, max_retries=3, base_delay=0.5, max_delay=8.0,
+                 failure_threshold=5, reset_timeout=30.0, trip_on_any_error=False,
+                 on_error=None, deadline=0.0, attempt_timeout=0.0):
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.trip_on_any_error = trip_on_any_error
+        self.on_error = on_error
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn, retrying transient failures; raises CircuitOpenError when unhealthy"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self._before_call()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt, started))
+                attempt += 1
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """call() for coroutine functions; backs off without blocking the event loop"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self._before_call()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt, started))
+                attempt += 1
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def _before_call(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._report('circuit_open')
+            raise
+
+    def _retry_delay(self, error, attempt, started):
+        """Record a failed attempt; returns the backoff delay, or re-raises when it shouldn't be retried"""
+        transient = is_transient(error)
+        self._report('transient' if transient else 'error')
+        if transient or self.trip_on_any_error:
+            self.breaker.record_failure()
+        else:
+            # Client errors (bad audio, bad key) say nothing about upstream health
+            self.breaker.record_success()
+
+        if not transient or attempt >= self.max_retries:
+            raise error
+
+        delay = self.backoff(attempt)
+        elapsed = time.monotonic() - started
+        if self.deadline and elapsed + delay + self.attempt_timeout > self.deadline:
+            # Another attempt would outlive the caller (e.g. the gunicorn worker timeout)
+            log('warning', 'upstream call failed, no time left to retry', upstream=self.name,
+                error=str(error), elapsed=round(elapsed, 2))
+            raise error
+
+        log('warning', 'upstream call failed, retrying', upstream=self.name, error=str(error),
+            retry_in=round(delay, 2))
+        return delay
+
+    def _report(self, kind):
+        if self.on_error:
+            self.on_error(self.name, kind)
+
+
+def build_http_client(timeout, pool_size=20, keepalive_expiry=30.0):
+    """Shared keep-alive connection pool for one upstream"""
+    return httpx.Client(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+
+
+def build_async_http_client(timeout, pool_size=100, keepalive_expiry=30.0):
+    """build_http_client() for the event loop (ASGI mode)"""
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+
+
+def build_openai_client(api_key, base_url=None, timeout=60.0, connect_timeout=5.0, pool_size=20):
+    """OpenAI client with a tuned pool; retries are handled by Upstream, not the SDK"""
+    http_timeout = httpx.Timeout(timeout, connect=connect_timeout)
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url or None,  # e.g. a local fake Whisper server
+        timeout=http_timeout,
+        max_retries=0,
+        http_client=build_http_client(http_timeout, pool_size)
+    )
+
+
+def build_async_openai_client(api_key, base_url=None, timeout=60.0, connect_timeout=5.0, pool_size=100):
+    """AsyncOpenAI counterpart of build_openai_client() for ASGI mode"""
+    http_timeout = httpx.Timeout(timeout, connect=connect_timeout)
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url or None,
+        timeout=http_timeout,
+        max_retries=0,
+        http_client=build_async_http_client(http_timeout, pool_size)
+    )
+
+
+class TranslatedText:
+    """Result object compatible with googletrans.models.Translated"""
+
+    def __init__(self, text, src, dest, origin):
+        self.text = text
+        self.src = src
+        self.dest = dest
+        self.origin = origin
+
+
+class DetectedLanguage:
+    """Result object compatible with googletrans.models.Detected"""
+
+    def __init__(self, lang, confidence):
+        self.lang = lang
+        self.confidence = confidence
+
+
+class LibreTranslateClient:
+    """
+    googletrans-compatible client for a LibreTranslate-style HTTP API
+    (POST /translate, POST /detect) - self-hosted, or a local fake server
+    """
+
+    def __init__(self, base_url, api_key=None, timeout=10.0, pool_size=20):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.client = build_http_client(httpx.Timeout(timeout, connect=min(timeout, 5.0)), pool_size)
+
+    def _post(self, path, payload):
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        response = self.client.post(f'{self.base_url}{path}', json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def translate(self, text, dest='en', src='auto'):
+        """Translate a string or a list of strings"""
+        data = self._post('/translate', self._translate_payload(text, dest, src))
+        return self._translated(text, data, dest, src)
+
+    def detect(self, text):
+        return self._detected(self._post('/detect', {'q': text}))
+
+    def _translate_payload(self, text, dest, src):
+        return {
+            'q': text if isinstance(text, list) else [text],
+            'source': src or 'auto',
+            'target': dest,
+            'format': 'text'
+        }
+
+    def _translated(self, text, data, dest, src):
+        """Wrap a /translate response like googletrans does (one result, or a list)"""
+        texts = text if isinstance(text, list) else [text]
+        translated = data['translatedText']
+        if not isinstance(translated, list):
+            translated = [translated]
+
+        results = [TranslatedText(t, src, dest, o) for o, t in zip(texts, translated)]
+        return results if isinstance(text, list) else results[0]
+
+    def _detected(self, data):
+        best = data[0] if data else {'language': 'unknown', 'confidence': 0}
+        return DetectedLanguage(best['language'], best.get('confidence', 0))
+
+
+class AsyncLibreTranslateClient(LibreTranslateClient):
+    """LibreTranslateClient whose translate/detect are coroutines (ASGI mode)"""
+
+    def __init__(self, base_url, api_key=None, timeout=10.0, pool_size=100):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.client = build_async_http_client(httpx.Timeout(timeout, connect=min(timeout, 5.0)), pool_size)
+
+    async def _post(self, path, payload):
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        response = await self.client.post(f'{self.base_url}{path}', json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def translate(self, text, dest='en', src='auto'):
+        data = await self._post('/translate', self._translate_payload(text, dest, src))
+        return self._translated(text, data, dest, src)
+
+    async def detect(self, text):
+        return self._detected(await self._post('/detect', {'q': text}))
+
+
+class GoogleTranslateClient:
+    """
+    Translator for Google's public web endpoint, with the googletrans interface
+    the rest of the code expects (translate() -> .text, detect() -> .lang)
+    """
+
+    def __init__(self, base_url=GOOGLE_TRANSLATE_URL, timeout=10.0, pool_size=20):
+        self.base_url = base_url.rstrip('/')
+        self.client = build_http_client(httpx.Timeout(timeout, connect=min(timeout, 5.0)), pool_size)
+
+    def _post(self, text, dest, src):
+        response = self.client.post(f'{self.base_url}/translate_a/single', **self._request(text, dest, src))
+        response.raise_for_status()
+        return response.json()
+
+    def translate(self, text, dest='en', src='auto'):
+        """Translate a string or a list of strings (one request per string)"""
+        if isinstance(text, list):
+            return [self.translate(item, dest=dest, src=src) for item in text]
+        return self._translated(text, self._post(text, dest, src), dest)
+
+    def detect(self, text):
+        return self._detected(self._post(text, 'en', 'auto'))
+
+    def _request(self, text, dest, src):
+        # The text goes in the body: long transcripts don't fit in a URL
+        return {
+            'params': {'client': 'gtx', 'sl': src or 'auto', 'tl': dest, 'dt': 't'},
+            'data': {'q': text}
+        }
+
+    def _translated(self, text, data, dest):
+        """Join the sentence pieces of a response ([[translated, original, ...], ...], _, source, ...)"""
+        translated = ''.join(piece[0] for piece in data[0] or [] if piece and piece[0])
+        return TranslatedText(translated, data[2] if len(data) > 2 else 'auto', dest, text)
+
+    def _detected(self, data):
+        confidence = data[6] if len(data) > 6 and isinstance(data[6], (int, float)) else 0
+        return DetectedLanguage(data[2] if len(data) > 2 else 'unknown', confidence)
+
+
+class AsyncGoogleTranslateClient(GoogleTranslateClient):
+    """GoogleTranslateClient whose translate/detect are coroutines (ASGI mode)"""
+
+    def __init__(self, base_url=GOOGLE_TRANSLATE_URL, timeout=10.0, pool_size=100):
+        self.base_url = base_url.rstrip('/')
+        self.client = build_async_http_client(httpx.Timeout(timeout, connect=min(timeout, 5.0)), pool_size)
+
+    async def _post(self, text, dest, src):
+        response = await self.client.post(f'{self.base_url}/translate_a/single', **self._request(text, dest, src))
+        response.raise_for_status()
+        return response.json()
+
+    async def translate(self, text, dest='en', src='auto'):
+        if isinstance(text, list):
+            return await asyncio.gather(*(self.translate(item, dest=dest, src=src) for item in text))
+        return self._translated(text, await self._post(text, dest, src), dest)
+
+    async def detect(self, text):
+        return self._detected(await self._post(text, 'en', 'auto'))
+
+
+class ResilientTranslator:
+    """Routes translate/detect calls of any googletrans-style translator through an Upstream"""
+
+    def __init__(self, translator, upstream):
+        self.translator = translator
+        self.upstream = upstream
+
+    def translate(self, text, dest='en', src='auto'):
+        return self.upstream.call(self.translator.translate, text, dest=dest, src=src)
+
+    def detect(self, text):
+        return self.upstream.call(self.translator.detect, text)
+
+
+class AsyncResilientTranslator:
+    """
+    ResilientTranslator for the event loop
+    Coroutine translators (AsyncLibreTranslateClient, AsyncGoogleTranslateClient)
+    are awaited; blocking ones run on the default thread pool
+    """
+
+    def __init__(self, translator, upstream):
+        self.translator = translator
+        self.upstream = upstream
+
+    async def translate(self, text, dest='en', src='auto'):
+        if inspect.iscoroutinefunction(self.translator.translate):
+            return await self.upstream.call_async(self.translator.translate, text, dest=dest, src=src)
+        return await asyncio.to_thread(self.upstream.call, self.translator.translate, text, dest=dest, src=src)
+
+    async def detect(self, text):
+        if inspect.iscoroutinefunction(self.translator.detect):
+            return await self.upstream.call_async(self.translator.detect, text)
+        return await asyncio.to_thread(self.upstream.call, self.translator.detect, text)
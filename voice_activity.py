@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Voice Activity Detection
+Finds speech in decoded audio from frame energy and zero-crossing rate, then
+trims leading/trailing silence and shortens long pauses before upload, so
+Whisper neither bills for dead air nor hallucinates text in it
+Whisper timestamps on the trimmed audio are mapped back to the original recording
+"""
+
+import io
+import time
+
+import numpy as np
+
+from audio_normalizer import OUTPUT_FORMATS, SPEECH_SAMPLE_RATE
+
+FRAME_MS = 20               # Analysis frame
+NOISE_PERCENTILE = 10       # The quietest frames estimate the noise floor
+ENERGY_MARGIN_DB = 12.0     # Speech is this much louder than the noise floor...
+DYNAMIC_RANGE_DB = 35.0     # ...or within this range of the loudest frames (no-silence recordings)
+ZCR_THRESHOLD = 0.25        # Fricatives (s, f, sh) are quiet but cross zero often
+PAD_MS = 250                # Kept around every stretch of speech
+MAX_GAP_MS = 1000           # Longer pauses are shortened to this
+
+
+def frame_features(samples, sample_rate):
+    """Per-frame energy (dBFS) and zero-crossing rate of normalized samples"""
+    frame = int(sample_rate * FRAME_MS / 1000)
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame)
+
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    crossings = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+    return energy, crossings
+
+
+def speech_regions(samples, sample_rate, pad_ms=PAD_MS, max_gap_ms=MAX_GAP_MS):
+    """
+    Stretches of speech as [start_ms, end_ms] pairs, padded and with pauses
+    up to max_gap_ms merged into the surrounding speech
+    """
+    energy, crossings = frame_features(samples, sample_rate)
+    if len(energy) == 0:
+        return []
+
+    floor = np.percentile(energy, NOISE_PERCENTILE)
+    threshold = min(floor + ENERGY_MARGIN_DB, energy.max() - DYNAMIC_RANGE_DB)
+    speech = (energy > threshold) | \
+        ((energy > threshold - ENERGY_MARGIN_DB / 2) & (crossings > ZCR_THRESHOLD))
+
+    # Pad speech on both sides so word onsets and endings survive
+    pad = int(pad_ms / FRAME_MS)
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1), mode='same') > 0
+
+    edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+    starts = np.nonzero(edges == 1)[0] * FRAME_MS
+    ends = np.nonzero(edges == -1)[0] * FRAME_MS
+
+    regions = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if regions and start - regions[-1][1] <= max_gap_ms:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return regions
+
+
+def trim_silence(audio, output_format='opus', max_gap_ms=MAX_GAP_MS, min_saved_seconds=1.0):
+    """
+    Cut silence from a decoded pydub AudioSegment
+    Leading/trailing silence is dropped and pauses are shortened to max_gap_ms
+    Returns: (upload, pieces, stats) - upload is a (filename, bytes) tuple of mono
+             16 kHz speech audio, or None when less than min_saved_seconds would go;
+             pieces map the trimmed timeline back to the original for restore_timestamps()
+    """
+    started = time.perf_counter()
+    audio = audio.set_channels(1).set_frame_rate(SPEECH_SAMPLE_RATE)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    samples /= float(1 << (8 * audio.sample_width - 1))
+
+    original_seconds = round(len(audio) / 1000.0, 2)
+    stats = {
+        'applied': False,
+        'original_seconds': original_seconds,
+        'submitted_seconds': original_seconds,
+        'removed_seconds': 0.0,
+        'seconds': 0.0
+    }
+
+    # Keep half of the allowed pause on each side of a long gap
+    regions = speech_regions(samples, audio.frame_rate, max_gap_ms=max_gap_ms)
+    half_gap = max_gap_ms // 2
+    pieces = []  # (start in trimmed audio, start in original, length), all ms
+    position = 0
+    for index, (start, end) in enumerate(regions):
+        start = max(0, start - (half_gap if index else 0))
+        end = min(len(audio), end + (half_gap if index < len(regions) - 1 else 0))
+        pieces.append((position, start, end - start))
+        position += end - start
+
+    removed = (len(audio) - position) / 1000.0
+    if not regions or removed < min_saved_seconds:
+        # No speech found (let Whisper decide) or not worth a re-encode
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        return None, None, stats
+
+    trimmed = audio[:0]
+    for _, start, length in pieces:
+        trimmed += audio[start:start + length]
+
+    extension, export_options = OUTPUT_FORMATS[output_format]
+    data = trimmed.export(io.BytesIO(), **export_options).getvalue()
+
+    stats.update({
+        'applied': True,
+        'submitted_seconds': round(position / 1000.0, 2),
+        'removed_seconds': round(removed, 2),
+        'seconds': round(time.perf_counter() - started, 3)
+    })
+    return (f'speech.{extension}', data), pieces, stats
+
+
+def restore_time(seconds, pieces):
+    """Map a time in the trimmed audio back to the original recording"""
+    milliseconds = seconds * 1000
+    for trimmed_start, original_start, length in reversed(pieces):
+        if milliseconds >= trimmed_start:
+            return round((original_start + min(milliseconds - trimmed_start, length)) / 1000.0, 2)
+    return round(seconds, 2)
+
+
+def restore_timestamps(segments, pieces):
+    """Segments with start/end moved back onto the original recording's timeline"""
+    return [
+        {**segment, 'start': restore_time(segment['start'], pieces), 'end': restore_time(segment['end'], pieces)}
+        for segment in segments
+    ]
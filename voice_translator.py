@@ -1,21 +1,36 @@
 #!/usr/bin/env python3
 """
 Voice Note Translator - Nigerian Pidgin & Native Languages
-Translates voice notes to English with high accuracy using OpenAI Whisper
+Translates voice notes to English (or another target language) with high accuracy using OpenAI Whisper
 """
 
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
 from openai import OpenAI
-from googletrans import Translator
 import os
+import csv
+import json
+import queue
 from pathlib import Path
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from translation_memory import TranslationMemory
+from language_id import canonical_language, resolve_language
+from languages import DISPLAY_LANGUAGES, LANGUAGE_NAMES, TARGET_LANGUAGES, whisper_language_for
+from transcription_engines import create_engine
+from upstream import GoogleTranslateClient
 
 # Load environment variables
 load_dotenv()
 
+# Batch mode: files transcribed at once (each one is a Whisper call)
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '4'))
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.ogg', '.flac')
+
+# Trust the local language identifier over Whisper's label at or above this confidence
+LANGUAGE_ID_MIN_CONFIDENCE = float(os.getenv('LANGUAGE_ID_MIN_CONFIDENCE', '0.6'))
+
 class VoiceTranslatorApp:
     def __init__(self, root):
         self.root = root
@@ -24,12 +39,21 @@ class VoiceTranslatorApp:
         self.root.configure(bg='#1a1a2e')
 
         # Initialize components
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.translator = Translator()
+        engine_name = os.getenv('TRANSCRIPTION_ENGINE', 'openai').lower()
+        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY')) if engine_name == 'openai' else None
+        self.engine = create_engine(engine_name, openai_client=self.openai_client)
+        if hasattr(self.engine, 'warm_up'):
+            self.engine.warm_up()  # Load the local model while the user picks a file
+        self.translator = GoogleTranslateClient()
+        self.translation_memory = TranslationMemory(
+            max_entries=int(os.getenv('TRANSLATION_MEMORY_SIZE', '5000')),
+            path=os.getenv('TRANSLATION_MEMORY_PATH')
+        )
         self.audio_file_path = None
+        self.batch_window = None
 
         # Check if API key is configured
-        if not os.getenv('OPENAI_API_KEY'):
+        if self.engine.remote and not os.getenv('OPENAI_API_KEY'):
             messagebox.showwarning(
                 "API Key Missing",
                 "OpenAI API key not found!\n\n"
@@ -119,6 +143,20 @@ class VoiceTranslatorApp:
             state='disabled'
         )
         self.translate_btn.pack(side='left', padx=5)
+
+        self.batch_btn = tk.Button(
+            btn_frame,
+            text="📂 Batch Mode",
+            command=self.open_batch_window,
+            font=('Arial', 12, 'bold'),
+            bg='#ff6b6b',
+            fg='#ffffff',
+            padx=20,
+            pady=10,
+            relief='flat',
+            cursor='hand2'
+        )
+        self.batch_btn.pack(side='left', padx=5)
         
         # Language selection
         lang_frame = tk.Frame(self.root, bg='#16213e')
@@ -133,14 +171,7 @@ class VoiceTranslatorApp:
         ).pack(side='left', padx=10)
         
         self.lang_var = tk.StringVar(value="Auto-detect")
-        languages = [
-            "Auto-detect",
-            "Nigerian Pidgin",
-            "Yoruba",
-            "Igbo",
-            "Hausa",
-            "Urhobo"
-        ]
+        languages = list(DISPLAY_LANGUAGES)
         
         self.lang_dropdown = ttk.Combobox(
             lang_frame,
@@ -151,6 +182,30 @@ class VoiceTranslatorApp:
             width=20
         )
         self.lang_dropdown.pack(side='left', padx=10)
+
+        tk.Label(
+            lang_frame,
+            text="Translate to:",
+            font=('Arial', 11, 'bold'),
+            bg='#16213e',
+            fg='#ffffff'
+        ).pack(side='left', padx=10)
+
+        self.target_var = tk.StringVar(value=TARGET_LANGUAGES['en'])
+
+        self.target_dropdown = ttk.Combobox(
+            lang_frame,
+            textvariable=self.target_var,
+            values=list(TARGET_LANGUAGES.values()),
+            font=('Arial', 10),
+            state='readonly',
+            width=15
+        )
+        self.target_dropdown.pack(side='left', padx=10)
+        self.target_dropdown.bind(
+            '<<ComboboxSelected>>',
+            lambda event: self.translation_label.config(text=f"🌐 {self.target_var.get()} Translation:")
+        )
         
         # Progress bar
         self.progress = ttk.Progressbar(
@@ -184,14 +239,15 @@ class VoiceTranslatorApp:
         )
         self.original_text.pack(fill='both', expand=True, pady=(0, 10))
         
-        # English translation
-        tk.Label(
+        # Translation into the selected target language
+        self.translation_label = tk.Label(
             results_frame,
             text="🌐 English Translation:",
             font=('Arial', 12, 'bold'),
             bg='#1a1a2e',
             fg='#4CAF50'
-        ).pack(anchor='w', pady=(5, 5))
+        )
+        self.translation_label.pack(anchor='w', pady=(5, 5))
         
         self.translated_text = scrolledtext.ScrolledText(
             results_frame,
@@ -295,56 +351,23 @@ class VoiceTranslatorApp:
             # Transcribe audio using Whisper
             self.root.after(0, self.update_status, "Transcribing with Whisper AI...")
 
-            # Map Nigerian languages to Whisper language codes
-            language_map = {
-                "Nigerian Pidgin": None,      # Auto-detect (Whisper handles Pidgin better)
-                "Yoruba": "yo",               # Yoruba
-                "Igbo": "ig",                 # Igbo
-                "Hausa": "ha",                # Hausa
-                "Urhobo": None,               # Auto-detect (not officially supported)
-                "Auto-detect": None           # Auto-detect
-            }
-
             # Get selected language
             selected_lang = self.lang_var.get()
-            whisper_language = language_map.get(selected_lang, None)
+            whisper_language = whisper_language_for(selected_lang)
 
-            # Transcribe using OpenAI Whisper API
+            # Transcribe with the configured engine (OpenAI Whisper API by default)
             try:
-                with open(self.audio_file_path, 'rb') as audio_file:
-                    # Prepare transcription parameters
-                    transcription_params = {
-                        'file': audio_file,
-                        'model': 'whisper-1',
-                        'response_format': 'verbose_json',
-                    }
-
-                    # Add language parameter if specified
-                    if whisper_language:
-                        transcription_params['language'] = whisper_language
-
-                    # Call Whisper API
-                    response = self.openai_client.audio.transcriptions.create(**transcription_params)
-
-                    original_text = response.text
-                    detected_language = getattr(response, 'language', 'unknown')
-
-                    # Map language codes to full names
-                    language_names = {
-                        'en': 'English',
-                        'yo': 'Yoruba',
-                        'ig': 'Igbo',
-                        'ha': 'Hausa',
-                        'pcm': 'Nigerian Pidgin'
-                    }
-
-                    detected_lang_name = language_names.get(detected_language, detected_language)
-
-                    self.root.after(
-                        0,
-                        self.update_status,
-                        f"Detected language: {detected_lang_name}"
-                    )
+                original_text, detected_language = self.transcribe_file(
+                    self.audio_file_path, whisper_language
+                )
+
+                detected_lang_name = LANGUAGE_NAMES.get(detected_language, detected_language)
+
+                self.root.after(
+                    0,
+                    self.update_status,
+                    f"Detected language: {detected_lang_name}"
+                )
 
                 if not original_text or original_text.strip() == '':
                     raise ValueError("No speech detected in audio")
@@ -378,24 +401,21 @@ class VoiceTranslatorApp:
                 self.root.after(0, self.update_status, "Transcription failed")
                 return
             
-            # Translate to English
-            self.root.after(0, self.update_status, "Translating to English...")
+            # Translate to the selected target language
+            target = self.target_language()
+            target_name = TARGET_LANGUAGES[target]
+            self.root.after(0, self.update_status, f"Translating to {target_name}...")
             
             try:
-                # Detect if text needs translation
-                detection = self.translator.detect(original_text)
-                
-                if detection.lang == 'en':
-                    # Already in English
-                    translated = original_text
+                translated, already_translated = self.translate_text(original_text, detected_language, target)
+
+                if already_translated:
+                    # Already in the target language
                     self.root.after(0, lambda: self.translated_text.insert(
                         '1.0',
-                        f"{translated}\n\n[Note: Text was already in English]"
+                        f"{translated}\n\n[Note: Text was already in {target_name}]"
                     ))
                 else:
-                    # Translate to English
-                    translation = self.translator.translate(original_text, dest='en')
-                    translated = translation.text
                     self.root.after(0, lambda: self.translated_text.insert('1.0', translated))
                     
             except Exception as e:
@@ -420,6 +440,41 @@ class VoiceTranslatorApp:
             self.root.after(0, lambda: self.translate_btn.config(state='normal'))
             self.root.after(0, self.update_status, f"Error occurred: {str(e)}")
             
+    def open_batch_window(self):
+        """Open (or focus) the batch processing window"""
+        if self.batch_window is not None and self.batch_window.winfo_exists():
+            self.batch_window.lift()
+            return
+        self.batch_window = BatchWindow(self)
+
+    def transcribe_file(self, filepath, whisper_language=None):
+        """Transcribe one audio file with the configured engine; returns (text, detected language)"""
+        with open(filepath, 'rb') as audio_file:
+            response = self.engine.transcribe((os.path.basename(filepath), audio_file), whisper_language)
+
+        return response.text, response.language
+
+    def target_language(self):
+        """Code of the language selected in the 'Translate to' dropdown"""
+        for code, name in TARGET_LANGUAGES.items():
+            if name == self.target_var.get():
+                return code
+        return 'en'
+
+    def translate_text(self, original_text, detected_language, dest='en'):
+        """Translate text into dest unless it already is in it; returns (translation, already_translated)"""
+        # Detect if text needs translation (locally, no network round trip)
+        language, _, _ = resolve_language(original_text, detected_language, LANGUAGE_ID_MIN_CONFIDENCE)
+        language = canonical_language(language)
+
+        if language == dest:
+            return original_text, True
+
+        translated = self.translation_memory.translate(
+            self.translator, original_text, src=language, dest=dest
+        )
+        return translated, False
+
     def update_status(self, message):
         """Update status bar"""
         self.status_label.config(text=message)
@@ -452,7 +507,7 @@ class VoiceTranslatorApp:
                 with open(filepath, 'w', encoding='utf-8') as f:
                     f.write("=== ORIGINAL TRANSCRIPTION ===\n\n")
                     f.write(original)
-                    f.write("\n\n=== ENGLISH TRANSLATION ===\n\n")
+                    f.write(f"\n\n=== {self.target_var.get().upper()} TRANSLATION ===\n\n")
                     f.write(translated)
                     
                 messagebox.showinfo("Saved", f"Translation saved to:\n{filepath}")
@@ -460,6 +515,319 @@ class VoiceTranslatorApp:
             except Exception as e:
                 messagebox.showerror("Error", f"Could not save file:\n{str(e)}")
 
+class BatchWindow(tk.Toplevel):
+    """
+    Translate a folder (or a selection) of voice notes on a bounded thread pool
+    Workers only put events on a queue; the Tk thread polls it, so the UI never blocks
+    """
+
+    POLL_MS = 100
+    COLUMNS = ('file', 'status', 'language', 'translation')
+
+    def __init__(self, app):
+        super().__init__(app.root)
+        self.app = app
+        self.title("Batch Processing - Voice Note Translator")
+        self.geometry("1000x600")
+        self.configure(bg='#1a1a2e')
+
+        self.files = []            # Paths in table order
+        self.results = {}          # Path -> result dict
+        self.events = queue.Queue()
+        self.executor = None
+        self.cancel_event = threading.Event()
+        self.pending = 0
+        self.poll_job = None
+
+        self.create_ui()
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def create_ui(self):
+        # File selection and controls
+        control_frame = tk.Frame(self, bg='#16213e')
+        control_frame.pack(pady=10, padx=20, fill='x')
+
+        button_style = {
+            'font': ('Arial', 10, 'bold'),
+            'padx': 12,
+            'pady': 6,
+            'relief': 'flat',
+            'cursor': 'hand2'
+        }
+
+        self.folder_btn = tk.Button(
+            control_frame, text="📁 Select Folder", command=self.select_folder,
+            bg='#00d4ff', fg='#000000', **button_style
+        )
+        self.folder_btn.pack(side='left', padx=5, pady=8)
+
+        self.files_btn = tk.Button(
+            control_frame, text="🎵 Select Files", command=self.select_files,
+            bg='#00d4ff', fg='#000000', **button_style
+        )
+        self.files_btn.pack(side='left', padx=5, pady=8)
+
+        self.start_btn = tk.Button(
+            control_frame, text="▶ Start", command=self.start,
+            bg='#4CAF50', fg='#ffffff', state='disabled', **button_style
+        )
+        self.start_btn.pack(side='left', padx=5, pady=8)
+
+        self.cancel_btn = tk.Button(
+            control_frame, text="⏹ Cancel", command=self.cancel,
+            bg='#ff6b6b', fg='#ffffff', state='disabled', **button_style
+        )
+        self.cancel_btn.pack(side='left', padx=5, pady=8)
+
+        self.export_btn = tk.Button(
+            control_frame, text="💾 Export Results", command=self.export_results,
+            bg='#ff6b6b', fg='#ffffff', state='disabled', **button_style
+        )
+        self.export_btn.pack(side='right', padx=5, pady=8)
+
+        # Progress across the whole batch
+        self.progress = ttk.Progressbar(self, mode='determinate', length=900)
+        self.progress.pack(pady=5, padx=20, fill='x')
+
+        # Results table, filled in as each file finishes
+        table_frame = tk.Frame(self, bg='#1a1a2e')
+        table_frame.pack(pady=10, padx=20, fill='both', expand=True)
+
+        self.table = ttk.Treeview(table_frame, columns=self.COLUMNS, show='headings')
+        for column, heading, width in (
+            ('file', 'File', 220),
+            ('status', 'Status', 110),
+            ('language', 'Language', 120),
+            ('translation', 'Translation', 500)
+        ):
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=width, anchor='w', stretch=(column == 'translation'))
+
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.table.yview)
+        self.table.configure(yscrollcommand=scrollbar.set)
+        self.table.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        # Status bar
+        self.status_label = tk.Label(
+            self,
+            text="Select a folder or several voice notes",
+            font=('Arial', 9),
+            bg='#16213e',
+            fg='#ffffff',
+            anchor='w',
+            padx=10,
+            pady=5
+        )
+        self.status_label.pack(side='bottom', fill='x')
+
+    def select_folder(self):
+        """Queue every audio file in a folder (including subfolders)"""
+        folder = filedialog.askdirectory(title="Select Folder of Voice Notes", parent=self)
+        if folder:
+            paths = sorted(
+                str(path) for path in Path(folder).rglob('*')
+                if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS
+            )
+            self.load_files(paths, base=folder)
+
+    def select_files(self):
+        """Queue a selection of audio files"""
+        paths = filedialog.askopenfilenames(
+            title="Select Voice Notes",
+            filetypes=[("Audio Files", "*.wav *.mp3 *.m4a *.ogg *.flac"), ("All Files", "*.*")],
+            parent=self
+        )
+        if paths:
+            self.load_files(sorted(paths))
+
+    def load_files(self, paths, base=None):
+        """Replace the table contents with a new set of files"""
+        if self.executor is not None:
+            return
+
+        self.table.delete(*self.table.get_children())
+        self.files = list(paths)
+        self.results = {}
+
+        for path in self.files:
+            name = os.path.relpath(path, base) if base else os.path.basename(path)
+            self.table.insert('', 'end', iid=path, values=(name, 'Queued', '', ''))
+
+        self.progress.config(maximum=max(len(self.files), 1), value=0)
+        self.start_btn.config(state='normal' if self.files else 'disabled')
+        self.export_btn.config(state='disabled')
+        self.status_label.config(
+            text=f"{len(self.files)} voice notes ready" if self.files else "No audio files found"
+        )
+
+    def start(self):
+        """Process all queued files on a bounded thread pool"""
+        if not self.files or self.executor is not None:
+            return
+
+        whisper_language = whisper_language_for(self.app.lang_var.get())
+        target = self.app.target_language()
+        self.cancel_event.clear()
+        self.results = {}
+        self.pending = len(self.files)
+        self.progress.config(value=0)
+
+        for path in self.files:
+            self.table.set(path, 'status', 'Queued')
+
+        for button in (self.start_btn, self.folder_btn, self.files_btn, self.export_btn):
+            button.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+        self.status_label.config(text=f"Processing {len(self.files)} voice notes...")
+
+        self.executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+        for path in self.files:
+            self.executor.submit(self.process_file, path, whisper_language, target)
+        self.poll_job = self.after(self.POLL_MS, self.poll_events)
+
+    def process_file(self, path, whisper_language, target='en'):
+        """Worker thread: transcribe and translate one file, reporting via the event queue"""
+        if self.cancel_event.is_set():
+            self.events.put((path, 'cancelled', None))
+            return
+
+        try:
+            self.events.put((path, 'transcribing', None))
+            original_text, detected_language = self.app.transcribe_file(path, whisper_language)
+            if not original_text or original_text.strip() == '':
+                raise ValueError("No speech detected in audio")
+
+            self.events.put((path, 'translating', None))
+            try:
+                translated, already_translated = self.app.translate_text(original_text, detected_language, target)
+                note = f'Text was already in {TARGET_LANGUAGES[target]}' if already_translated else ''
+            except Exception:
+                translated = original_text
+                note = 'Translation service unavailable, showing original text only'
+
+            self.events.put((path, 'done', {
+                'original_text': original_text,
+                'translated_text': translated,
+                'target_language': target,
+                'detected_language': detected_language,
+                'note': note
+            }))
+        except Exception as e:
+            self.events.put((path, 'failed', {'error': str(e)}))
+
+    def poll_events(self):
+        """Tk thread: apply worker events to the table, then check again shortly"""
+        try:
+            while True:
+                path, state, result = self.events.get_nowait()
+                self.apply_event(path, state, result)
+        except queue.Empty:
+            pass
+
+        if self.pending > 0:
+            self.poll_job = self.after(self.POLL_MS, self.poll_events)
+        else:
+            self.poll_job = None
+            self.finish()
+
+    def apply_event(self, path, state, result):
+        if not self.table.exists(path):
+            return
+
+        if state in ('transcribing', 'translating'):
+            self.table.set(path, 'status', state.capitalize() + '...')
+            return
+
+        # Terminal states: done, failed, cancelled
+        self.pending -= 1
+        self.progress.config(value=len(self.files) - self.pending)
+        result = dict(result or {}, status=state, file=path)
+        self.results[path] = result
+
+        if state == 'done':
+            language = result['detected_language']
+            self.table.item(path, values=(
+                self.table.set(path, 'file'),
+                'Done ✓',
+                LANGUAGE_NAMES.get(language, language),
+                ' '.join(result['translated_text'].split())
+            ))
+        elif state == 'failed':
+            self.table.set(path, 'status', 'Failed')
+            self.table.set(path, 'translation', result['error'])
+        else:
+            self.table.set(path, 'status', 'Cancelled')
+
+        done = len(self.files) - self.pending
+        self.status_label.config(text=f"Processed {done} of {len(self.files)} voice notes")
+
+    def cancel(self):
+        """Skip files that haven't started; files already in flight finish"""
+        self.cancel_event.set()
+        self.cancel_btn.config(state='disabled')
+        self.status_label.config(text="Cancelling - waiting for files in progress...")
+
+    def finish(self):
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+        counts = {}
+        for result in self.results.values():
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+
+        for button in (self.start_btn, self.folder_btn, self.files_btn):
+            button.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+        self.export_btn.config(state='normal' if counts.get('done') else 'disabled')
+        self.status_label.config(
+            text=f"Batch complete ✓ {counts.get('done', 0)} translated, "
+                 f"{counts.get('failed', 0)} failed, {counts.get('cancelled', 0)} cancelled"
+        )
+
+    def export_results(self):
+        """Save every result as CSV or JSON"""
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV Files", "*.csv"), ("JSON Files", "*.json")],
+            title="Export Batch Results",
+            parent=self
+        )
+        if not filepath:
+            return
+
+        fields = ['file', 'status', 'detected_language', 'original_text', 'target_language', 'translated_text',
+                  'note', 'error']
+        rows = [
+            {field: self.results[path].get(field, '') for field in fields}
+            for path in self.files if path in self.results
+        ]
+
+        try:
+            if filepath.lower().endswith('.json'):
+                with open(filepath, 'w', encoding='utf-8') as f:
+                    json.dump(rows, f, ensure_ascii=False, indent=2)
+            else:
+                with open(filepath, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=fields)
+                    writer.writeheader()
+                    writer.writerows(rows)
+
+            messagebox.showinfo("Exported", f"{len(rows)} results saved to:\n{filepath}", parent=self)
+
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save file:\n{str(e)}", parent=self)
+
+    def close(self):
+        """Stop scheduling new files and close the window"""
+        self.cancel_event.set()
+        if self.poll_job is not None:
+            self.after_cancel(self.poll_job)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.destroy()
+
 def main():
     root = tk.Tk()
     app = VoiceTranslatorApp(root)
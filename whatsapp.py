@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Cloud API
+Webhook ingestion for voice notes sent to a WhatsApp Business number
+The webhook only verifies the signature, drops redeliveries by message id and
+queues the message; worker threads stream the media download from the Graph API,
+run the usual transcription + translation pipeline and reply in the chat
+"""
+
+import hashlib
+import hmac
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import httpx
+
+from languages import TARGET_LANGUAGES
+from tracing import log
+from upstream import CircuitOpenError, build_http_client
+
+GRAPH_API_URL = 'https://graph.facebook.com/v20.0'
+MAX_REPLY_CHARS = 4096          # WhatsApp text message limit
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PURGE_EVERY = 100               # Forget old message ids after this many claims
+
+# Whisper and ffmpeg go by the file extension
+MEDIA_EXTENSIONS = {
+    'audio/ogg': 'ogg',
+    'audio/opus': 'opus',
+    'audio/mpeg': 'mp3',
+    'audio/mp4': 'm4a',
+    'audio/aac': 'm4a',
+    'audio/wav': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/webm': 'webm',
+    'audio/flac': 'flac'
+}
+
+RECEIVED_QUEUED = 'queued'
+RECEIVED_DUPLICATE = 'duplicate'
+RECEIVED_BUSY = 'busy'
+
+
+class MediaTooLarge(ValueError):
+    """The voice note is bigger than the API accepts"""
+
+
+def verify_signature(body, signature, app_secret):
+    """Check the X-Hub-Signature-256 header (HMAC-SHA256 of the raw body with the app secret)"""
+    if not app_secret or not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(app_secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+
+def audio_messages(payload):
+    """Voice notes and audio files in a webhook payload (delivery statuses and other types skipped)"""
+    messages = []
+    for entry in payload.get('entry') or []:
+        for change in entry.get('changes') or []:
+            value = change.get('value') or {}
+            phone_number_id = (value.get('metadata') or {}).get('phone_number_id')
+            for message in value.get('messages') or []:
+                if message.get('type') != 'audio' or not (message.get('audio') or {}).get('id'):
+                    continue
+                messages.append({
+                    'id': message['id'],
+                    'from': message.get('from'),
+                    'phone_number_id': phone_number_id,
+                    'media_id': message['audio']['id'],
+                    'mime_type': message['audio'].get('mime_type', 'audio/ogg'),
+                    'timestamp': message.get('timestamp')
+                })
+    return messages
+
+
+def media_filename(mime_type):
+    """Filename with an extension Whisper understands, e.g. 'audio/ogg; codecs=opus' -> voice.ogg"""
+    base_type = (mime_type or '').split(';')[0].strip().lower()
+    return f"voice.{MEDIA_EXTENSIONS.get(base_type, 'ogg')}"
+
+
+def format_reply(payload):
+    """Chat reply for a pipeline result: transcript, then the translation into each target language"""
+    if not payload.get('success'):
+        return f"Sorry, I couldn't translate this voice note. {payload.get('error', '')}".strip()
+
+    language = payload.get('detected_language_name') or payload.get('detected_language') or 'Original'
+    original_text = payload.get('original_text', '')
+    reply = f"🗣️ {language}: {original_text.strip()}"
+
+    translations = payload.get('translations') or {
+        payload.get('target_language', 'en'): {'text': payload.get('translated_text'), 'note': payload.get('note')}
+    }
+    for code, translation in translations.items():
+        name = translation.get('language_name') or TARGET_LANGUAGES.get(code, code)
+        if translation.get('text') and translation['text'] != original_text:
+            reply += f"\n\n🌍 {name}: {translation['text'].strip()}"
+        elif translation.get('note'):
+            reply += f"\n\n({translation['note']})"
+
+    if len(reply) > MAX_REPLY_CHARS:
+        reply = reply[:MAX_REPLY_CHARS - 1] + '…'
+    return reply
+
+
+class GraphClient:
+    """Minimal WhatsApp Cloud API client over a pooled httpx connection"""
+
+    def __init__(self, access_token, base_url=GRAPH_API_URL, timeout=30.0, pool_size=20):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {access_token}'}
+        self.client = build_http_client(httpx.Timeout(timeout, connect=min(timeout, 5.0)), pool_size)
+
+    def download_media(self, media_id, max_bytes, spool_size=8 * 1024 * 1024):
+        """
+        Stream a media object into a spooled temp file (memory first, disk past spool_size)
+        Returns: (file object at position 0, mime type)
+        """
+        response = self.client.get(f'{self.base_url}/{media_id}', headers=self.headers)
+        response.raise_for_status()
+        info = response.json()
+        if int(info.get('file_size') or 0) > max_bytes:
+            raise MediaTooLarge(f"Voice note is {info['file_size']} bytes, limit is {max_bytes}")
+
+        audio_file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        try:
+            received = 0
+            with self.client.stream('GET', info['url'], headers=self.headers) as download:
+                download.raise_for_status()
+                for chunk in download.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise MediaTooLarge(f'Voice note is over the {max_bytes} byte limit')
+                    audio_file.write(chunk)
+            audio_file.seek(0)
+            return audio_file, info.get('mime_type')
+        except Exception:
+            audio_file.close()
+            raise
+
+    def send_text(self, phone_number_id, to, text, reply_to=None):
+        """Send a text message, quoting the message it answers"""
+        message = {
+            'messaging_product': 'whatsapp',
+            'recipient_type': 'individual',
+            'to': to,
+            'type': 'text',
+            'text': {'body': text, 'preview_url': False}
+        }
+        if reply_to:
+            message['context'] = {'message_id': reply_to}
+
+        response = self.client.post(
+            f'{self.base_url}/{phone_number_id}/messages', headers=self.headers, json=message
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class MessageLog:
+    """
+    Message ids already accepted, in SQLite shared by every worker process on the host,
+    so a webhook Meta redelivers (to any worker) is only processed once
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._claims = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS whatsapp_messages ('
+                'id TEXT PRIMARY KEY, received_at REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS whatsapp_messages_received_at ON whatsapp_messages (received_at)')
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection (safe across threads and processes)"""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def claim(self, message_id):
+        """Record a message id; False if it was already claimed"""
+        with self._connect() as db:
+            claimed = db.execute(
+                'INSERT OR IGNORE INTO whatsapp_messages (id, received_at) VALUES (?, ?)',
+                (message_id, time.time())
+            ).rowcount == 1
+
+        with self._lock:
+            self._claims += 1
+            purge = self._claims % PURGE_EVERY == 0
+        if purge:
+            with self._connect() as db:
+                db.execute('DELETE FROM whatsapp_messages WHERE received_at < ?', (time.time() - self.ttl,))
+        return claimed
+
+    def release(self, message_id):
+        """Forget a claim (the message was not queued), so a redelivery is processed"""
+        with self._connect() as db:
+            db.execute('DELETE FROM whatsapp_messages WHERE id = ?', (message_id,))
+
+
+class WhatsAppBot:
+    """
+    Bounded queue of incoming voice notes and the threads that answer them
+    translate(audio_file, filename) runs the pipeline and returns (payload, status_code);
+    Graph API calls go through upstream (retries, circuit breaker)
+    on_result(result) is told about every message: 'queued', 'duplicate', 'busy',
+    'replied' or 'failed'; with a tracer, each message is traced under its message id
+    """
+
+    def __init__(self, graph, message_log, translate, upstream, workers=2, queue_size=64,
+                 max_bytes=25 * 1024 * 1024, spool_size=8 * 1024 * 1024, max_retry_wait=600.0,
+                 on_result=None, tracer=None):
+        self.graph = graph
+        self.message_log = message_log
+        self.translate = translate
+        self.upstream = upstream
+        self.max_bytes = max_bytes
+        self.spool_size = spool_size
+        self.max_retry_wait = max_retry_wait
+        self.on_result = on_result
+        self.tracer = tracer
+        self.counts = {}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+
+        for index in range(workers):
+            threading.Thread(target=self._work, name=f'whatsapp-{index}', daemon=True).start()
+
+    def _count(self, result):
+        with self._lock:
+            self.counts[result] = self.counts.get(result, 0) + 1
+        if self.on_result:
+            self.on_result(result)
+
+    def receive(self, message):
+        """
+        Accept a message from the webhook without blocking
+        Returns: 'queued', 'duplicate' (already seen) or 'busy' (queue full - let Meta redeliver)
+        """
+        if not self.message_log.claim(message['id']):
+            result = RECEIVED_DUPLICATE
+        else:
+            try:
+                self._queue.put_nowait((message, time.time()))
+                result = RECEIVED_QUEUED
+            except queue.Full:
+                self.message_log.release(message['id'])
+                result = RECEIVED_BUSY
+
+        self._count(result)
+        return result
+
+    def _work(self):
+        while True:
+            message, received_at = self._queue.get()
+            try:
+                with self.tracer.trace('whatsapp_message', message['id']) if self.tracer else nullcontext():
+                    self.handle(message)
+                self._count('replied')
+                log('info', 'whatsapp reply sent', message_id=message['id'],
+                    seconds_since_webhook=round(time.time() - received_at, 1))
+            except Exception as e:
+                self._count('failed')
+                log('error', 'whatsapp message failed', exc_info=True, message_id=message['id'], error=str(e))
+                self._reply_failure(message)
+            finally:
+                self._queue.task_done()
+
+    def _reply_failure(self, message):
+        """
+        Tell the sender their note failed (decode error, rejected upload, ...)
+        If even that can't be sent, forget the message so a redelivery is processed
+        """
+        try:
+            self.upstream.call(
+                self.graph.send_text, message['phone_number_id'], message['from'],
+                format_reply({'success': False, 'error': 'Something went wrong, please send it again.'}),
+                reply_to=message['id']
+            )
+        except Exception as e:
+            log('warning', 'whatsapp error reply failed', message_id=message['id'], error=str(e))
+            self.message_log.release(message['id'])
+
+    def handle(self, message):
+        """Download, translate and answer one voice note"""
+        try:
+            audio_file, mime_type = self.upstream.call(
+                self.graph.download_media, message['media_id'], self.max_bytes, self.spool_size
+            )
+        except MediaTooLarge as e:
+            payload = {'success': False, 'error': str(e)}
+        else:
+            try:
+                payload = self._translate(audio_file, media_filename(mime_type or message['mime_type']))
+            finally:
+                audio_file.close()
+
+        self.upstream.call(
+            self.graph.send_text, message['phone_number_id'], message['from'],
+            format_reply(payload), reply_to=message['id']
+        )
+
+    def _translate(self, audio_file, filename):
+        """Run the pipeline; while it sheds load or an upstream is down, wait and try again"""
+        deadline = time.monotonic() + self.max_retry_wait
+        while True:
+            try:
+                payload, _ = self.translate(audio_file, filename)
+                return payload
+            except CircuitOpenError as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    return {'success': False, 'error': 'The service is busy, please send it again later.'}
+                time.sleep(e.retry_after)
+                audio_file.seek(0)
+
+    def stats(self):
+        """Return message counters for this process"""
+        with self._lock:
+            return {
+                **self.counts,
+                'queued_now': self._queue.qsize()
+            }